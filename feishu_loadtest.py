@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Load generator for feishu_webhook.py.
+
+Replays Feishu callbacks against a webhook instance: card-action clicks,
+url_verification challenges and re-deliveries of earlier callbacks (byte-for-
+byte identical bodies, as Feishu sends them when it doesn't get a fast 200).
+Every worker thread keeps one HTTP/1.1 keep-alive connection, like Feishu's
+callback client does.
+
+Reproducibility: the request mix is a pure function of --seed and the request
+index, so two runs with the same flags send the same bodies in the same order
+(which worker sends a given index still depends on timing). With --rate the
+run is open-loop: request i is due at start + i/rate, and latency is measured
+from that due time, so a server that falls behind shows up as latency instead
+of silently lowering the offered load. --rate 0 runs closed-loop as fast as
+the workers can go.
+
+By default a private instance is started on a free port with its own
+temporary choice store, so runs don't share state; --url targets an already
+running server instead. The server-side callback/duplicate counts in the
+report come from GET /, which in pre-fork mode is answered by one worker only.
+
+Usage:
+    python3 feishu_loadtest.py                                  # 10 s, max rate, 8 connections
+    python3 feishu_loadtest.py --rate 1500 --duration 30 --dup-ratio 0.2
+    python3 feishu_loadtest.py --url http://127.0.0.1:19876 --concurrency 32 --json
+    python3 feishu_loadtest.py --rate 1000 --max-p99-ms 50 --max-error-rate 0   # CI gate
+
+Exit status is 1 when a --max-* threshold is exceeded.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+WEBHOOK_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "feishu_webhook.py")
+CHOICES = ("use_gemini", "use_qwen")
+DUP_WINDOW = 200        # a re-delivery repeats one of the last DUP_WINDOW callbacks
+STARTUP_TIMEOUT = 10
+CONNECT_TIMEOUT = 10
+
+
+# ========== Payloads ==========
+
+def _rng(seed, index):
+    return random.Random(seed * 1_000_003 + index)
+
+
+def _kind(seed, index, dup_ratio, verify_ratio):
+    roll = _rng(seed, index).random()
+    if index > 0 and roll < dup_ratio:
+        return "duplicate"
+    if roll < dup_ratio + verify_ratio:
+        return "url_verification"
+    return "card_action"
+
+
+def _original(seed, index, dup_ratio, verify_ratio):
+    """Index of the first delivery that request `index` repeats (itself if not a duplicate)."""
+    while _kind(seed, index, dup_ratio, verify_ratio) == "duplicate":
+        rng = _rng(seed, index)
+        rng.random()
+        index = rng.randrange(max(0, index - DUP_WINDOW), index)
+    return index
+
+
+def build_payload(seed, index, kind, cards):
+    """Body of the first delivery of callback `index`."""
+    rng = _rng(seed, index)
+    rng.random()
+    if kind == "url_verification":
+        return {
+            "type": "url_verification",
+            "challenge": f"challenge-{seed}-{index}",
+            "token": "loadtest-verification-token",
+        }
+    user = rng.randrange(cards * 4)
+    card = rng.randrange(cards)
+    return {
+        "open_id": f"ou_loadtest_{user:06d}",
+        "user_id": f"u{user:06d}",
+        "open_message_id": f"om_loadtest_{card:06d}",
+        "open_chat_id": "oc_loadtest",
+        "tenant_key": "loadtest",
+        "token": f"c-{seed}-{index:08d}",
+        "action": {
+            "tag": "button",
+            "value": {"action": rng.choice(CHOICES), "card_id": f"loadtest-{seed}-{card:06d}"},
+        },
+    }
+
+
+def make_request(seed, index, dup_ratio, verify_ratio, cards):
+    """(kind, body bytes, expected challenge or None) for request `index`."""
+    kind = _kind(seed, index, dup_ratio, verify_ratio)
+    origin = _original(seed, index, dup_ratio, verify_ratio)
+    origin_kind = _kind(seed, origin, dup_ratio, verify_ratio)
+    payload = build_payload(seed, origin, origin_kind, cards)
+    body = json.dumps(payload, separators=(",", ":")).encode()
+    return kind, body, payload.get("challenge")
+
+
+# ========== Target ==========
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_local_server(processes, workers):
+    """Start a private feishu_webhook.py; returns (process, url, temp dir)."""
+    port = _free_port()
+    tmp = tempfile.TemporaryDirectory(prefix="feishu_loadtest_")
+    env = dict(os.environ,
+               PORT=str(port), WEBHOOK_PORT=str(port),
+               WEBHOOK_ACCESS_LOG="0",
+               WEBHOOK_PROCESSES=str(processes),
+               WEBHOOK_WORKERS=str(workers),
+               CHOICE_DB=os.path.join(tmp.name, "choices.db"))
+    proc = subprocess.Popen([sys.executable, WEBHOOK_SCRIPT], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"webhook exited: {proc.stderr.read().decode(errors='replace')[-500:]}")
+        try:
+            fetch_status(url)
+            return proc, url, tmp
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError(f"webhook did not start within {STARTUP_TIMEOUT}s")
+
+
+def stop_local_server(proc, tmp):
+    proc.send_signal(signal.SIGTERM)
+    try:
+        proc.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+    tmp.cleanup()
+
+
+def fetch_status(url):
+    """The server's GET / status document (includes its dedup counters)."""
+    parts = urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=CONNECT_TIMEOUT)
+    try:
+        conn.request("GET", "/")
+        return json.loads(conn.getresponse().read())
+    finally:
+        conn.close()
+
+
+# ========== Run ==========
+
+class Recorder:
+    """Per-kind latencies and error counts, merged from all workers at the end."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.error_samples = []
+
+    def ok(self, kind, seconds):
+        self.latencies.setdefault(kind, []).append(seconds)
+
+    def error(self, kind, reason):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+        if len(self.error_samples) < 5:
+            self.error_samples.append(f"{kind}: {reason}")
+
+
+def run_worker(url, path, next_index, stop_at, args, started, recorder):
+    parts = urlsplit(url)
+    conn = None
+    headers = {"Content-Type": "application/json; charset=utf-8"}
+    while True:
+        index = next_index()
+        if args.requests and index >= args.requests:
+            break
+        due = started + index / args.rate if args.rate else time.perf_counter()
+        if due >= stop_at:
+            break
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+        kind, body, challenge = make_request(args.seed, index, args.dup_ratio, args.verify_ratio, args.cards)
+        sent = time.perf_counter() if not args.rate else due
+        try:
+            if conn is None:
+                conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=CONNECT_TIMEOUT)
+            conn.request("POST", path, body, headers)
+            resp = conn.getresponse()
+            data = resp.read()
+            if resp.will_close:
+                conn.close()
+                conn = None
+        except (OSError, http.client.HTTPException) as e:
+            recorder.error(kind, type(e).__name__)
+            if conn is not None:
+                conn.close()
+                conn = None
+            continue
+        elapsed = time.perf_counter() - sent
+
+        if resp.status != 200:
+            recorder.error(kind, f"HTTP {resp.status}")
+        elif challenge is not None and json.loads(data).get("challenge") != challenge:
+            recorder.error(kind, "challenge not echoed")
+        else:
+            recorder.ok(kind, elapsed)
+    if conn is not None:
+        conn.close()
+
+
+def run_load(url, args):
+    path = urlsplit(url).path or "/"
+    lock = threading.Lock()
+    counter = iter(range(1 << 62))
+
+    def next_index():
+        with lock:
+            return next(counter)
+
+    recorders = [Recorder() for _ in range(args.concurrency)]
+    started = time.perf_counter()
+    stop_at = started + args.duration if args.duration else float("inf")
+    threads = [threading.Thread(target=run_worker,
+                                args=(url, path, next_index, stop_at, args, started, recorders[i]),
+                                daemon=True)
+               for i in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return recorders, time.perf_counter() - started
+
+
+# ========== Report ==========
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def _summary(latencies, errors):
+    latencies = sorted(latencies)
+    total = len(latencies) + errors
+    return {
+        "requests": total,
+        "errors": errors,
+        "error_rate": round(errors / total, 6) if total else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+    }
+
+
+def build_report(recorders, elapsed, args, url, server_before, server_after):
+    kinds = {}
+    samples = []
+    for rec in recorders:
+        for kind, values in rec.latencies.items():
+            kinds.setdefault(kind, [[], 0])[0].extend(values)
+        for kind, count in rec.errors.items():
+            kinds.setdefault(kind, [[], 0])[1] += count
+        samples.extend(rec.error_samples)
+
+    everything = [v for values, _ in kinds.values() for v in values]
+    overall = _summary(everything, sum(e for _, e in kinds.values()))
+    report = {
+        "target": url,
+        "seed": args.seed,
+        "rate": args.rate,
+        "concurrency": args.concurrency,
+        "dup_ratio": args.dup_ratio,
+        "verify_ratio": args.verify_ratio,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(overall["requests"] / elapsed, 1) if elapsed else 0.0,
+        **overall,
+        "by_kind": {kind: _summary(values, errors) for kind, (values, errors) in sorted(kinds.items())},
+        "error_samples": samples[:5],
+    }
+    if server_before and server_after:
+        report["server"] = {
+            key: server_after.get(key, 0) - server_before.get(key, 0)
+            for key in ("callbacks", "duplicates")
+        }
+    return report
+
+
+def print_report(report):
+    mode = f"{report['rate']}/s open-loop" if report["rate"] else "closed-loop"
+    print(f"🎯 {report['target']}  ({mode}, {report['concurrency']} connections, seed {report['seed']})")
+    print(f"   {report['requests']} requests in {report['elapsed_s']:.2f}s → {report['throughput_rps']:.1f} req/s")
+    print(f"   p50 {report['p50_ms']:.2f} ms   p99 {report['p99_ms']:.2f} ms   max {report['max_ms']:.2f} ms   "
+          f"errors {report['errors']} ({report['error_rate']:.2%})")
+    print(f"   {'kind':<18}{'requests':>10}{'errors':>8}{'p50 ms':>10}{'p99 ms':>10}")
+    for kind, s in report["by_kind"].items():
+        print(f"   {kind:<18}{s['requests']:>10}{s['errors']:>8}{s['p50_ms']:>10.2f}{s['p99_ms']:>10.2f}")
+    if "server" in report:
+        print(f"   server: {report['server']['callbacks']} callbacks, "
+              f"{report['server']['duplicates']} answered from the dedup cache")
+    for sample in report["error_samples"]:
+        print(f"   ⚠️ {sample}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for feishu_webhook.py")
+    parser.add_argument("--url", help="target webhook URL (default: start a private local instance)")
+    parser.add_argument("--rate", type=float, default=0, help="offered requests/s, open-loop (default 0 = as fast as possible)")
+    parser.add_argument("--concurrency", "-c", type=int, default=8, help="keep-alive connections (default 8)")
+    parser.add_argument("--duration", "-d", type=float, default=10, help="seconds to run (default 10; 0 = until --requests)")
+    parser.add_argument("--requests", "-n", type=int, default=0, help="stop after this many requests (default unlimited)")
+    parser.add_argument("--dup-ratio", type=float, default=0.1, help="fraction of re-deliveries (default 0.1)")
+    parser.add_argument("--verify-ratio", type=float, default=0.01, help="fraction of url_verification (default 0.01)")
+    parser.add_argument("--cards", type=int, default=1000, help="distinct cards clicked (default 1000)")
+    parser.add_argument("--seed", type=int, default=1, help="payload seed (default 1)")
+    parser.add_argument("--processes", type=int, default=1, help="WEBHOOK_PROCESSES for the local instance")
+    parser.add_argument("--workers", type=int, default=64, help="WEBHOOK_WORKERS for the local instance")
+    parser.add_argument("--max-p99-ms", type=float, help="fail if overall p99 exceeds this")
+    parser.add_argument("--max-error-rate", type=float, help="fail if the error rate exceeds this (0-1)")
+    parser.add_argument("--json", action="store_true", help="JSON output")
+    args = parser.parse_args()
+
+    if not args.duration and not args.requests:
+        parser.error("need --duration or --requests")
+    if args.dup_ratio + args.verify_ratio > 1:
+        parser.error("--dup-ratio + --verify-ratio must be <= 1")
+
+    proc = tmp = None
+    url = args.url
+    if not url:
+        proc, url, tmp = start_local_server(args.processes, args.workers)
+    try:
+        try:
+            before = fetch_status(url)
+        except (OSError, ValueError):
+            before = None
+        recorders, elapsed = run_load(url, args)
+        try:
+            after = fetch_status(url)
+        except (OSError, ValueError):
+            after = None
+    finally:
+        if proc:
+            stop_local_server(proc, tmp)
+
+    report = build_report(recorders, elapsed, args, url, before, after)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+    failed = ((args.max_p99_ms is not None and report["p99_ms"] > args.max_p99_ms)
+              or (args.max_error_rate is not None and report["error_rate"] > args.max_error_rate))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,98 +2,1043 @@
 """
 Feishu Card Action Webhook Server (Zeabur Cloud Version)
 Receives button click events from Feishu interactive cards.
-Stores choices in /tmp/feishu_card_choices/ for polling.
+Stores choices in a SQLite choice store (/tmp/feishu_card_choices/choices.db),
+readable via GET /choices/{card_id} or GET /choices?open_id=...
 Returns updated card on button click.
+
+Push delivery: GET /choices/{card_id}?wait=30 long-polls until that card's
+choice is stored (200) or the wait runs out (204); GET /choices/stream is a
+Server-Sent Events feed of choices, optionally filtered with ?card_id=...
+(repeatable) or ?open_id=.... Waiters are woken straight from the callback
+that stores the choice. A parked waiter gives its worker slot back, so idle
+waiters are capped separately by WEBHOOK_MAX_WAITERS and cost one small-stack
+thread each.
+
+Duplicate suppression: Feishu re-delivers a callback when it doesn't get a
+fast 200. Callbacks are keyed on their event id (header.event_id / uuid),
+falling back to the callback token or message id + operator + action value;
+the first delivery's response bytes are kept in a bounded LRU with a TTL and
+replayed for redeliveries without touching the store. Concurrent redeliveries
+wait for the first one to finish. Counts are reported on GET /.
+
+Pre-fork mode (WEBHOOK_PROCESSES=N > 1): the parent forks N workers that each
+bind the port with SO_REUSEPORT so the kernel spreads connections across
+them, and respawns any worker that dies. Workers share state through the
+SQLite store: duplicate-callback claims and cached responses live in its
+`callbacks` table, and each worker tails `choices` rows by their `version`
+(bumped on every write, so a replaced card counts as new; checked when PRAGMA
+data_version moves, every WATCH_INTERVAL) to wake its own long-poll/SSE
+waiters for choices recorded by another worker. A dead worker is respawned
+after WEBHOOK_RESPAWN_DELAY seconds, doubling (up to a minute) while workers
+keep crashing soon after start. SIGTERM/SIGINT stops accepting, wakes parked
+waiters, lets in-flight requests finish (up to WEBHOOK_DRAIN_TIMEOUT) and
+then exits.
+
+Metrics: GET /metrics serves Prometheus text: requests by action type,
+latency histograms for the parse / store / respond stages of a callback
+(plus the whole request), in-flight requests, parked waiters, choice-store
+size and evictions, and callback/duplicate counters. Recording a sample is a
+perf_counter() pair, a bisect and one short lock. In pre-fork mode every
+series carries the worker's pid; a scrape reaches whichever worker the
+kernel picks, so scrape each worker's view over time or run one process when
+exact totals matter.
+
+Choice store: SQLite in WAL mode with one writer thread that commits every
+pending click in a single transaction (group commit), indexed by card_id and
+open_id; records expire CHOICE_TTL seconds after the click and are swept in
+the background. CHOICE_STORE=files keeps the old one-{card_id}.json-per-click
+layout (now also TTL-swept) for consumers that still read the directory.
+
+Serving model: one thread per connection (ThreadingHTTPServer) with HTTP/1.1
+keep-alive, at most WEBHOOK_WORKERS connections handled at once (further
+connections wait in the listen backlog), and WEBHOOK_REQUEST_TIMEOUT seconds
+per socket read so a slow client can't pin a worker. Throughput target on one
+core: >= 1500 card callbacks/s over 8 keep-alive connections (about 1800/s
+measured with the load generator sharing that same core);
+feishu_loadtest.py replays clicks, challenges and re-deliveries to check it.
+
+Environment:
+    WEBHOOK_PORT / PORT       listen port (default 8080)
+    WEBHOOK_WORKERS           max concurrent connections (default 64)
+    WEBHOOK_REQUEST_TIMEOUT   per-read socket timeout in seconds (default 10)
+    WEBHOOK_ACCESS_LOG        0 disables the per-request log line (default 1)
+    CHOICE_STORE              sqlite (default) or files
+    CHOICE_DB                 SQLite path (default /tmp/feishu_card_choices/choices.db)
+    CHOICE_TTL                seconds a choice is kept (default 86400)
+    WEBHOOK_MAX_WAITERS       max parked long-poll/SSE connections (default 4096)
+    DEDUP_MAX_ENTRIES         callback responses remembered (default 10000)
+    DEDUP_TTL                 seconds a callback response is remembered (default 600)
+    WEBHOOK_PROCESSES         worker processes sharing the port (default 1)
+    WEBHOOK_DRAIN_TIMEOUT     seconds to let in-flight requests finish on shutdown (default 10)
+    WEBHOOK_RESPAWN_DELAY     seconds before a crashed worker is respawned (default 1, doubles on repeat crashes)
 """
+import bisect
 import json
 import os
+import queue
+import signal
+import socket
+import sqlite3
+import sys
+import threading
 import time
-from http.server import HTTPServer, BaseHTTPRequestHandler
+import traceback
+from collections import OrderedDict
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from pathlib import Path
+from urllib.parse import parse_qs, unquote
 
 PORT = int(os.environ.get("WEBHOOK_PORT", os.environ.get("PORT", "8080")))
+WORKERS = int(os.environ.get("WEBHOOK_WORKERS", "64"))
+REQUEST_TIMEOUT = float(os.environ.get("WEBHOOK_REQUEST_TIMEOUT", "10"))
+ACCESS_LOG = os.environ.get("WEBHOOK_ACCESS_LOG", "1") != "0"
 CHOICE_DIR = Path("/tmp/feishu_card_choices")
 CHOICE_DIR.mkdir(exist_ok=True)
+CHOICE_STORE = os.environ.get("CHOICE_STORE", "sqlite")
+CHOICE_DB = Path(os.environ.get("CHOICE_DB", str(CHOICE_DIR / "choices.db")))
+CHOICE_TTL = float(os.environ.get("CHOICE_TTL", str(24 * 3600)))
+SWEEP_INTERVAL = 60
+MAX_WAITERS = int(os.environ.get("WEBHOOK_MAX_WAITERS", "4096"))
+MAX_WAIT = 60
+SSE_HEARTBEAT = 15
+THREAD_STACK_SIZE = 256 * 1024
+DEDUP_MAX_ENTRIES = int(os.environ.get("DEDUP_MAX_ENTRIES", "10000"))
+DEDUP_TTL = float(os.environ.get("DEDUP_TTL", "600"))
+PROCESSES = int(os.environ.get("WEBHOOK_PROCESSES", "1"))
+DRAIN_TIMEOUT = float(os.environ.get("WEBHOOK_DRAIN_TIMEOUT", "10"))
+RESPAWN_DELAY = float(os.environ.get("WEBHOOK_RESPAWN_DELAY", "1"))
+RESPAWN_MAX_DELAY = 60
+WATCH_INTERVAL = 0.05
+CLAIM_TIMEOUT = 30
+
+LABEL_MAP = {
+    "use_gemini": "✅ 已选择 Gemini — 正在执行...",
+    "use_qwen": "✅ 已选择千问 — 正在执行...",
+}
+
+
+class SqliteChoiceStore:
+    """Choices in SQLite (WAL), written by one group-committing writer thread."""
+
+    BATCH_MAX = 512
+
+    def __init__(self, path=CHOICE_DB, ttl=CHOICE_TTL):
+        self.path = str(path)
+        self.ttl = ttl
+        self.evictions = 0
+        self._local = threading.local()
+        self._pending = queue.Queue()
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS choices (
+                card_id    TEXT PRIMARY KEY,
+                action     TEXT NOT NULL,
+                open_id    TEXT,
+                message_id TEXT,
+                timestamp  REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                origin     INTEGER,
+                version    INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS idx_choices_open_id ON choices(open_id, timestamp);
+            CREATE INDEX IF NOT EXISTS idx_choices_expires ON choices(expires_at);
+            CREATE TABLE IF NOT EXISTS callbacks (
+                key        TEXT PRIMARY KEY,
+                status     INTEGER NOT NULL,
+                body       BLOB,
+                expires_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_callbacks_expires ON callbacks(expires_at);
+            CREATE TABLE IF NOT EXISTS counters (
+                name  TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO counters (name, value) VALUES ('choice_version', 0);
+        """)
+        # origin: pid of the worker that stored the choice, so watchers skip their own.
+        # version: write counter watchers tail on; rowid can be reused when the newest row is replaced.
+        self._add_column(conn, "origin", "INTEGER")
+        self._add_column(conn, "version", "INTEGER")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_choices_version ON choices(version)")
+        self._writer = threading.Thread(target=self._write_loop, name="choice-writer", daemon=True)
+        self._writer.start()
+
+    @staticmethod
+    def _add_column(conn, name, decl):
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(choices)")}
+        if name in columns:
+            return
+        try:
+            conn.execute(f"ALTER TABLE choices ADD COLUMN {name} {decl}")
+        except sqlite3.OperationalError as e:
+            # Pre-fork workers migrate an old store at the same time; one of them wins
+            if "duplicate column" not in str(e):
+                raise
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def put(self, card_id, choice, timeout=5):
+        """Queue a choice and wait until the batch holding it is committed."""
+        ticket = [threading.Event(), None]
+        self._pending.put((card_id, choice, ticket))
+        if not ticket[0].wait(timeout):
+            raise TimeoutError(f"choice store commit for {card_id} timed out")
+        if ticket[1]:
+            raise ticket[1]
+
+    def _write_loop(self):
+        conn = self._connect()
+        next_sweep = time.time() + SWEEP_INTERVAL
+        while True:
+            try:
+                batch = [self._pending.get(timeout=max(0.0, next_sweep - time.time()))]
+            except queue.Empty:
+                batch = []
+            # Everything that arrived while the previous commit was running
+            # rides along in this transaction.
+            while batch and len(batch) < self.BATCH_MAX:
+                try:
+                    batch.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            if batch:
+                pid = os.getpid()
+                rows = [(card_id, c["action"], c.get("open_id", ""), c.get("message_id", ""),
+                         c["timestamp"], c["timestamp"] + self.ttl, pid) for card_id, c, _ in batch]
+                error = None
+                try:
+                    conn.execute("BEGIN IMMEDIATE")
+                    conn.execute("UPDATE counters SET value = value + ? WHERE name = 'choice_version'",
+                                 (len(rows),))
+                    last = conn.execute("SELECT value FROM counters WHERE name = 'choice_version'").fetchone()[0]
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO choices"
+                        " (card_id, action, open_id, message_id, timestamp, expires_at, origin, version)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        [row + (last - len(rows) + i + 1,) for i, row in enumerate(rows)])
+                    conn.execute("COMMIT")
+                except sqlite3.Error as e:
+                    if conn.in_transaction:
+                        conn.execute("ROLLBACK")
+                    print(f"[ERR] choice store write failed: {e}", flush=True)
+                    error = e
+                for _, _, ticket in batch:
+                    ticket[1] = error
+                    ticket[0].set()
+            if time.time() >= next_sweep:
+                self.evict_expired()
+                next_sweep = time.time() + SWEEP_INTERVAL
+
+    def evict_expired(self):
+        try:
+            conn = self._connect()
+            now = time.time()
+            cur = conn.execute("DELETE FROM choices WHERE expires_at < ?", (now,))
+            conn.execute("DELETE FROM callbacks WHERE expires_at < ?", (now,))
+            self.evictions += cur.rowcount
+            return cur.rowcount
+        except sqlite3.Error as e:
+            print(f"[ERR] choice store sweep failed: {e}", flush=True)
+            return 0
+
+    def watch(self, broker, interval=WATCH_INTERVAL):
+        """Publish choices stored by other processes to this process's waiters."""
+        threading.Thread(target=self._watch_loop, args=(broker, interval),
+                         name="choice-watcher", daemon=True).start()
+
+    def _watch_loop(self, broker, interval):
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        last_version = conn.execute("SELECT value FROM counters WHERE name = 'choice_version'").fetchone()[0]
+        data_version = None
+        pid = os.getpid()
+        while True:
+            time.sleep(interval)
+            try:
+                # data_version only moves when another connection commits,
+                # so an idle store costs one pragma per interval.
+                current = conn.execute("PRAGMA data_version").fetchone()[0]
+                if current == data_version:
+                    continue
+                data_version = current
+                rows = conn.execute("SELECT * FROM choices WHERE version > ? ORDER BY version",
+                                    (last_version,)).fetchall()
+            except sqlite3.Error as e:
+                print(f"[ERR] choice watcher: {e}", flush=True)
+                continue
+            for row in rows:
+                last_version = row["version"]
+                if row["origin"] != pid:
+                    broker.publish(self._row(row))
+
+    # Shared duplicate-callback state for pre-fork workers
+
+    def claim_callback(self, key, ttl):
+        """Claim a callback key across processes: ("mine"|"done"|"busy", response)."""
+        conn = self._connect()
+        now = time.time()
+        conn.execute("DELETE FROM callbacks WHERE key = ? AND expires_at < ?", (key, now))
+        cur = conn.execute("INSERT OR IGNORE INTO callbacks (key, status, body, expires_at) VALUES (?, 0, NULL, ?)",
+                           (key, now + CLAIM_TIMEOUT))
+        if cur.rowcount == 1:
+            return "mine", None
+        response = self.get_callback(key)
+        return ("done", response) if response else ("busy", None)
+
+    def get_callback(self, key):
+        row = self._connect().execute("SELECT status, body FROM callbacks WHERE key = ? AND status != 0",
+                                      (key,)).fetchone()
+        return (row["status"], bytes(row["body"])) if row else None
+
+    def finish_callback(self, key, status, body, ttl):
+        conn = self._connect()
+        if status == 200:
+            conn.execute("UPDATE callbacks SET status = ?, body = ?, expires_at = ? WHERE key = ?",
+                         (status, body, time.time() + ttl, key))
+        else:
+            conn.execute("DELETE FROM callbacks WHERE key = ?", (key,))
+
+    @staticmethod
+    def _row(row):
+        return {k: row[k] for k in ("card_id", "action", "open_id", "message_id", "timestamp")}
+
+    def get(self, card_id):
+        row = self._connect().execute(
+            "SELECT * FROM choices WHERE card_id = ? AND expires_at >= ?", (card_id, time.time())
+        ).fetchone()
+        return self._row(row) if row else None
+
+    def find_by_open_id(self, open_id, limit=20):
+        rows = self._connect().execute(
+            "SELECT * FROM choices WHERE open_id = ? AND expires_at >= ? ORDER BY timestamp DESC LIMIT ?",
+            (open_id, time.time(), limit),
+        ).fetchall()
+        return [self._row(r) for r in rows]
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM choices").fetchone()[0]
+
+
+class FileChoiceStore:
+    """Compatibility mode: one {card_id}.json per click in CHOICE_DIR, TTL-swept."""
+
+    def __init__(self, directory=CHOICE_DIR, ttl=CHOICE_TTL):
+        self.directory = Path(directory)
+        self.ttl = ttl
+        self.evictions = 0
+        threading.Thread(target=self._sweep_loop, name="choice-sweeper", daemon=True).start()
+
+    def put(self, card_id, choice):
+        path = self.directory / f"{card_id}.json"
+        tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(choice))
+        tmp.replace(path)
+
+    def _sweep_loop(self):
+        while True:
+            time.sleep(SWEEP_INTERVAL)
+            self.evict_expired()
+
+    def evict_expired(self):
+        removed = 0
+        cutoff = time.time() - self.ttl
+        for path in self.directory.glob("*.json"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except OSError:
+                pass
+        self.evictions += removed
+        return removed
+
+    def get(self, card_id):
+        path = self.directory / f"{card_id}.json"
+        try:
+            if path.stat().st_mtime < time.time() - self.ttl:
+                return None
+            return {"card_id": card_id, **json.loads(path.read_text())}
+        except (OSError, ValueError):
+            return None
+
+    def find_by_open_id(self, open_id, limit=20):
+        found = []
+        for path in self.directory.glob("*.json"):
+            choice = self.get(path.stem)
+            if choice and choice.get("open_id") == open_id:
+                found.append(choice)
+        found.sort(key=lambda c: c["timestamp"], reverse=True)
+        return found[:limit]
+
+    def count(self):
+        return sum(1 for _ in self.directory.glob("*.json"))
+
+
+def open_choice_store(kind=CHOICE_STORE):
+    if kind == "files":
+        return FileChoiceStore()
+    if kind == "sqlite":
+        return SqliteChoiceStore()
+    raise ValueError(f"unknown CHOICE_STORE: {kind}")
+
+
+class ChoiceBroker:
+    """Fans stored choices out to waiting long-poll and SSE connections."""
+
+    ALL = "*"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, keys):
+        """Return a queue that receives every published choice matching one of `keys`."""
+        inbox = queue.SimpleQueue()
+        with self._lock:
+            for key in keys:
+                self._subscribers.setdefault(key, set()).add(inbox)
+        return inbox
+
+    def unsubscribe(self, inbox, keys):
+        with self._lock:
+            for key in keys:
+                subscribers = self._subscribers.get(key)
+                if subscribers:
+                    subscribers.discard(inbox)
+                    if not subscribers:
+                        del self._subscribers[key]
+
+    def publish(self, choice):
+        keys = (f"card:{choice['card_id']}", f"open:{choice.get('open_id', '')}", self.ALL)
+        with self._lock:
+            targets = set()
+            for key in keys:
+                targets.update(self._subscribers.get(key, ()))
+        for inbox in targets:
+            inbox.put(choice)
+
+    def close(self):
+        """Wake every waiter with None (server shutdown)."""
+        with self._lock:
+            targets = set().union(*self._subscribers.values()) if self._subscribers else set()
+        for inbox in targets:
+            inbox.put(None)
+
+
+def callback_key(data):
+    """Identity of a callback delivery, shared by all of Feishu's retries of it."""
+    header = data.get("header") or {}
+    event_id = header.get("event_id") or data.get("event_id") or data.get("uuid")
+    if event_id:
+        return f"event:{event_id}"
+    if data.get("token"):
+        return f"token:{data['token']}"
+    message_id = data.get("open_message_id")
+    if message_id:
+        value = (data.get("action") or {}).get("value") or {}
+        return f"msg:{message_id}:{data.get('open_id', '')}:{json.dumps(value, sort_keys=True)}"
+    return None
+
+
+class CallbackCache:
+    """Bounded LRU + TTL map from callback key to the response already sent for it."""
+
+    WAIT_FOR_FIRST = 5
+
+    def __init__(self, max_entries=DEDUP_MAX_ENTRIES, ttl=DEDUP_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared = None  # SqliteChoiceStore in pre-fork mode
+        self.callbacks = 0
+        self.duplicates = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._in_flight = {}
+
+    def _lookup(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < now:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def begin(self, key):
+        """Return the cached (status, body) for a duplicate, or None after claiming `key`."""
+        with self._lock:
+            self.callbacks += 1
+            response = self._lookup(key, time.time())
+            if response is None and key in self._in_flight:
+                first = self._in_flight[key]
+            else:
+                first = None
+                if response is None:
+                    self._in_flight[key] = threading.Event()
+                else:
+                    self.duplicates += 1
+        if first is None:
+            return response if response is not None else self._claim_shared(key)
+
+        # Same callback is being handled right now on another connection.
+        first.wait(self.WAIT_FOR_FIRST)
+        with self._lock:
+            response = self._lookup(key, time.time())
+            if response is not None:
+                self.duplicates += 1
+                return response
+            self._in_flight[key] = threading.Event()
+        return self._claim_shared(key)
+
+    def _claim_shared(self, key):
+        """With the local claim held, check whether another worker owns `key`."""
+        if self.shared is None:
+            return None
+        state, response = self.shared.claim_callback(key, self.ttl)
+        deadline = time.time() + self.WAIT_FOR_FIRST
+        while state == "busy" and time.time() < deadline:
+            time.sleep(0.02)
+            response = self.shared.get_callback(key)
+            state = "done" if response else "busy"
+        if response is None:
+            # Ours, or the other worker stalled past the wait: handle it here.
+            return None
+        with self._lock:
+            self.duplicates += 1
+        self.finish(key, *response, share=False)
+        return response
+
+    def finish(self, key, status, body, share=True):
+        """Record the response for `key` (only successes are replayed) and release waiters."""
+        if share and self.shared is not None:
+            try:
+                self.shared.finish_callback(key, status, body, self.ttl)
+            except sqlite3.Error as e:
+                print(f"[ERR] shared dedup: {e}", flush=True)
+        with self._lock:
+            if status == 200:
+                self._entries[key] = (time.time() + self.ttl, (status, body))
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            done = self._in_flight.pop(key, None)
+        if done:
+            done.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "callbacks": self.callbacks,
+                "duplicates": self.duplicates,
+                "cached_responses": len(self._entries),
+            }
+
+
+store = None
+broker = ChoiceBroker()
+dedup = CallbackCache()
+
+
+class Metrics:
+    """Counters and fixed-bucket histograms rendered in Prometheus text format."""
+
+    BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+    STAGES = ("parse", "store", "respond", "total")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.choices = {}
+        # per stage: one count per bucket plus +Inf, then sum
+        self.histograms = {stage: [0] * (len(self.BUCKETS) + 1) for stage in self.STAGES}
+        self.sums = {stage: 0.0 for stage in self.STAGES}
+
+    def count_request(self, action):
+        with self._lock:
+            self.requests[action] = self.requests.get(action, 0) + 1
+
+    def count_choice(self, chosen_action):
+        # Label only known actions so a stray value can't blow up cardinality.
+        label = chosen_action if chosen_action in LABEL_MAP else "other"
+        with self._lock:
+            self.choices[label] = self.choices.get(label, 0) + 1
+
+    def observe(self, stage, seconds):
+        index = bisect.bisect_left(self.BUCKETS, seconds)
+        with self._lock:
+            self.histograms[stage][index] += 1
+            self.sums[stage] += seconds
+
+    def render(self, server):
+        with self._lock:
+            requests = dict(self.requests)
+            choices = dict(self.choices)
+            histograms = {k: list(v) for k, v in self.histograms.items()}
+            sums = dict(self.sums)
+        pid = f'pid="{os.getpid()}"'
+        dedup_stats = dedup.stats()
+        lines = [
+            "# HELP feishu_webhook_requests_total HTTP requests handled, by action type.",
+            "# TYPE feishu_webhook_requests_total counter",
+        ]
+        lines += [f'feishu_webhook_requests_total{{{pid},action="{a}"}} {n}' for a, n in sorted(requests.items())]
+        lines += [
+            "# HELP feishu_webhook_choices_total Card choices stored, by chosen action.",
+            "# TYPE feishu_webhook_choices_total counter",
+        ]
+        lines += [f'feishu_webhook_choices_total{{{pid},choice="{c}"}} {n}' for c, n in sorted(choices.items())]
+        lines += [
+            "# HELP feishu_webhook_stage_seconds Callback latency by processing stage.",
+            "# TYPE feishu_webhook_stage_seconds histogram",
+        ]
+        for stage in self.STAGES:
+            cumulative = 0
+            for bound, count in zip(self.BUCKETS + ("+Inf",), histograms[stage]):
+                cumulative += count
+                lines.append(f'feishu_webhook_stage_seconds_bucket{{{pid},stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'feishu_webhook_stage_seconds_sum{{{pid},stage="{stage}"}} {sums[stage]:.6f}')
+            lines.append(f'feishu_webhook_stage_seconds_count{{{pid},stage="{stage}"}} {cumulative}')
+        lines += [
+            "# HELP feishu_webhook_in_flight_requests Requests currently being handled (incl. parked waiters).",
+            "# TYPE feishu_webhook_in_flight_requests gauge",
+            f"feishu_webhook_in_flight_requests{{{pid}}} {server.in_flight}",
+            "# HELP feishu_webhook_parked_waiters Long-poll and SSE connections waiting for a choice.",
+            "# TYPE feishu_webhook_parked_waiters gauge",
+            f"feishu_webhook_parked_waiters{{{pid}}} {server.parked_count}",
+            "# HELP feishu_choice_store_size Choices currently held by the choice store.",
+            "# TYPE feishu_choice_store_size gauge",
+            f"feishu_choice_store_size{{{pid}}} {store.count()}",
+            "# HELP feishu_choice_store_evictions_total Choices removed by TTL expiry.",
+            "# TYPE feishu_choice_store_evictions_total counter",
+            f"feishu_choice_store_evictions_total{{{pid}}} {store.evictions}",
+            "# HELP feishu_webhook_callbacks_total Card callbacks received with an identity (incl. redeliveries).",
+            "# TYPE feishu_webhook_callbacks_total counter",
+            f"feishu_webhook_callbacks_total{{{pid}}} {dedup_stats['callbacks']}",
+            "# HELP feishu_webhook_duplicate_callbacks_total Redelivered callbacks answered from the dedup cache.",
+            "# TYPE feishu_webhook_duplicate_callbacks_total counter",
+            f"feishu_webhook_duplicate_callbacks_total{{{pid}}} {dedup_stats['duplicates']}",
+            "# HELP feishu_webhook_dedup_cache_entries Callback responses held for duplicate suppression.",
+            "# TYPE feishu_webhook_dedup_cache_entries gauge",
+            f"feishu_webhook_dedup_cache_entries{{{pid}}} {dedup_stats['cached_responses']}",
+        ]
+        return ("\n".join(lines) + "\n").encode()
+
+
+metrics = Metrics()
+
+
+def render_choice_card(chosen_action):
+    """Card shown in place of the clicked one."""
+    result_text = LABEL_MAP.get(chosen_action, f"✅ 已选择: {chosen_action}")
+    return {
+        "config": {"wide_screen_mode": True},
+        "header": {
+            "title": {"content": "✅ 已确认", "tag": "plain_text"},
+            "template": "green",
+        },
+        "elements": [
+            {"tag": "div", "text": {"content": result_text, "tag": "plain_text"}},
+        ],
+    }
+
+
+def handle_callback(data):
+    """Handle one decoded Feishu callback, returning (status, response body bytes)."""
+    # Feishu URL verification challenge
+    if data.get("type") == "url_verification":
+        metrics.count_request("url_verification")
+        challenge = data.get("challenge", "")
+        print(f"[OK] Challenge: {challenge[:20]}...", flush=True)
+        return 200, json.dumps({"challenge": challenge}).encode()
+
+    # Card action callback
+    action = data.get("action") or {}
+    value = action.get("value") or {}
+    chosen_action = value.get("action", "")
+    card_id = value.get("card_id", "")
+
+    if chosen_action and card_id:
+        choice_data = {
+            "action": chosen_action,
+            "open_id": data.get("open_id", ""),
+            "message_id": data.get("open_message_id", ""),
+            "timestamp": time.time(),
+        }
+        started = time.perf_counter()
+        store.put(card_id, choice_data)
+        broker.publish({"card_id": card_id, **choice_data})
+        metrics.observe("store", time.perf_counter() - started)
+        metrics.count_request("card_action")
+        metrics.count_choice(chosen_action)
+        print(f"[OK] {chosen_action} for {card_id}", flush=True)
+        return 200, json.dumps(render_choice_card(chosen_action)).encode()
+
+    metrics.count_request("ignored")
+    return 200, b'{}'
 
 
 class FeishuCardHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections open between callbacks; every response must
+    # therefore carry Content-Length.
+    protocol_version = "HTTP/1.1"
+    timeout = REQUEST_TIMEOUT
+    # Headers and body go out in separate writes; without TCP_NODELAY every
+    # keep-alive response stalls on the client's delayed ACK (~40 ms).
+    disable_nagle_algorithm = True
+
+    def _send_json(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if self.server.draining:
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(body)
+
     def do_POST(self):
+        with self.server.busy():
+            self._handle_post()
+
+    def do_GET(self):
+        with self.server.busy():
+            self._handle_get()
+
+    def _handle_post(self):
+        started = time.perf_counter()
         content_length = int(self.headers.get("Content-Length", 0))
         body = self.rfile.read(content_length)
 
         try:
             data = json.loads(body)
         except json.JSONDecodeError:
-            self.send_response(400)
-            self.end_headers()
-            self.wfile.write(b'{"error":"bad json"}')
+            metrics.count_request("bad_json")
+            self._send_json(400, b'{"error":"bad json"}')
             return
+        metrics.observe("parse", time.perf_counter() - started)
+
+        key = callback_key(data) if data.get("type") != "url_verification" else None
+        if key:
+            cached = dedup.begin(key)
+            if cached:
+                metrics.count_request("duplicate")
+                self._respond_timed(started, *cached)
+                return
+
+        status, response = 500, b'{"error":"store unavailable"}'
+        try:
+            status, response = handle_callback(data)
+        except (sqlite3.Error, OSError) as e:
+            metrics.count_request("error")
+            print(f"[ERR] {e}", flush=True)
+        finally:
+            if key:
+                dedup.finish(key, status, response)
+        self._respond_timed(started, status, response)
 
-        # Feishu URL verification challenge
-        if data.get("type") == "url_verification":
-            challenge = data.get("challenge", "")
+    def _respond_timed(self, started, status, body):
+        sending = time.perf_counter()
+        self._send_json(status, body)
+        done = time.perf_counter()
+        metrics.observe("respond", done - sending)
+        metrics.observe("total", done - started)
+
+    def _handle_get(self):
+        path, _, query = self.path.partition("?")
+        params = parse_qs(query)
+
+        if path == "/metrics":
+            metrics.count_request("metrics")
+            body = metrics.render(self.server)
             self.send_response(200)
-            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
             self.end_headers()
-            self.wfile.write(json.dumps({"challenge": challenge}).encode())
-            print(f"[OK] Challenge: {challenge[:20]}...", flush=True)
+            self.wfile.write(body)
             return
 
-        # Card action callback
-        action = data.get("action") or {}
-        value = action.get("value") or {}
-        chosen_action = value.get("action", "")
-        card_id = value.get("card_id", "")
-
-        if chosen_action and card_id:
-            choice_file = CHOICE_DIR / f"{card_id}.json"
-            choice_data = {
-                "action": chosen_action,
-                "open_id": data.get("open_id", ""),
-                "message_id": data.get("open_message_id", ""),
-                "timestamp": time.time(),
-            }
-            choice_file.write_text(json.dumps(choice_data))
-            print(f"[OK] {chosen_action} for {card_id}", flush=True)
+        if path == "/choices/stream":
+            metrics.count_request("sse")
+            self._stream_choices(params)
+            return
 
-            label_map = {
-                "use_gemini": "✅ 已选择 Gemini — 正在执行...",
-                "use_qwen": "✅ 已选择千问 — 正在执行...",
-            }
-            result_text = label_map.get(chosen_action, f"✅ 已选择: {chosen_action}")
-
-            response_card = {
-                "config": {"wide_screen_mode": True},
-                "header": {
-                    "title": {"content": "✅ 已确认", "tag": "plain_text"},
-                    "template": "green",
-                },
-                "elements": [
-                    {"tag": "div", "text": {"content": result_text, "tag": "plain_text"}},
-                ],
-            }
+        if path.startswith("/choices/"):
+            card_id = unquote(path[len("/choices/"):])
+            try:
+                wait = min(float(params.get("wait", ["0"])[0] or 0), MAX_WAIT)
+            except ValueError:
+                metrics.count_request("bad_request")
+                self._send_json(400, b'{"error":"bad wait"}')
+                return
+            metrics.count_request("long_poll" if wait > 0 else "choice_read")
+            if wait > 0:
+                self._wait_for_choice(card_id, wait)
+                return
+            choice = store.get(card_id)
+            if choice is None:
+                self._send_json(404, b'{"error":"not found"}')
+            else:
+                self._send_json(200, json.dumps(choice).encode())
+            return
 
-            self.send_response(200)
-            self.send_header("Content-Type", "application/json")
-            self.end_headers()
-            self.wfile.write(json.dumps(response_card).encode())
+        if path == "/choices" and params.get("open_id"):
+            metrics.count_request("choice_read")
+            choices = store.find_by_open_id(params["open_id"][0])
+            self._send_json(200, json.dumps({"choices": choices}).encode())
             return
 
-        self.send_response(200)
-        self.send_header("Content-Type", "application/json")
-        self.end_headers()
-        self.wfile.write(b'{}')
+        self._send_json(200, json.dumps({"status": "ok", "port": PORT, **dedup.stats()}).encode())
 
-    def do_GET(self):
-        self.send_response(200)
-        self.send_header("Content-Type", "application/json")
-        self.end_headers()
-        self.wfile.write(json.dumps({"status": "ok", "port": PORT}).encode())
+    def _wait_for_choice(self, card_id, wait):
+        keys = [f"card:{card_id}"]
+        # Subscribe before reading the store so a choice landing in between
+        # is still delivered.
+        inbox = broker.subscribe(keys)
+        try:
+            choice = store.get(card_id)
+            if choice is None:
+                with self.server.parked() as admitted:
+                    if not admitted:
+                        self._send_json(503, b'{"error":"too many waiters"}')
+                        return
+                    try:
+                        choice = inbox.get(timeout=wait)
+                    except queue.Empty:
+                        choice = None
+        finally:
+            broker.unsubscribe(inbox, keys)
+
+        if choice is None:
+            self.send_response(204)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        else:
+            self._send_json(200, json.dumps(choice).encode())
+
+    def _stream_choices(self, params):
+        card_ids = params.get("card_id", [])
+        keys = [f"card:{c}" for c in card_ids] + [f"open:{o}" for o in params.get("open_id", [])]
+        keys = keys or [ChoiceBroker.ALL]
+        inbox = broker.subscribe(keys)
+        try:
+            with self.server.parked() as admitted:
+                if not admitted:
+                    self._send_json(503, b'{"error":"too many waiters"}')
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                self.wfile.write(b"retry: 3000\n\n")
+                # Choices stored before the client connected
+                for card_id in card_ids:
+                    choice = store.get(card_id)
+                    if choice:
+                        self._send_event(choice)
+                while True:
+                    try:
+                        choice = inbox.get(timeout=SSE_HEARTBEAT)
+                    except queue.Empty:
+                        self.wfile.write(b": ping\n\n")
+                        continue
+                    if choice is None:
+                        break
+                    self._send_event(choice)
+        except (BrokenPipeError, ConnectionResetError, TimeoutError):
+            pass
+        finally:
+            broker.unsubscribe(inbox, keys)
+
+    def _send_event(self, choice):
+        self.wfile.write(f"id: {choice['card_id']}\nevent: choice\ndata: {json.dumps(choice)}\n\n".encode())
 
     def log_message(self, format, *args):
-        print(f"[{time.strftime('%H:%M:%S')}] {format % args}", flush=True)
+        if ACCESS_LOG:
+            print(f"[{time.strftime('%H:%M:%S')}] {format % args}", flush=True)
+
+
+class BoundedThreadingHTTPServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer that runs at most `workers` handler threads at once."""
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, server_address, handler_class, workers=WORKERS, max_waiters=MAX_WAITERS,
+                 reuse_port=False):
+        self.reuse_port = reuse_port
+        super().__init__(server_address, handler_class)
+        self.slots = threading.BoundedSemaphore(workers)
+        self.waiter_slots = threading.BoundedSemaphore(max_waiters)
+        self.draining = False
+        self.parked_count = 0
+        self._busy = 0
+        self._idle = threading.Condition()
+
+    @property
+    def in_flight(self):
+        return self._busy
+
+    def server_bind(self):
+        if self.reuse_port:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+    @contextmanager
+    def busy(self):
+        """Mark a request in flight (idle keep-alive connections don't count)."""
+        with self._idle:
+            self._busy += 1
+        try:
+            yield
+        finally:
+            with self._idle:
+                self._busy -= 1
+                if not self._busy:
+                    self._idle.notify_all()
+
+    def drain(self, timeout=DRAIN_TIMEOUT):
+        """Stop accepting, wake parked waiters and wait for in-flight requests."""
+        self.draining = True
+        self.shutdown()
+        broker.close()
+        with self._idle:
+            if not self._idle.wait_for(lambda: self._busy == 0, timeout):
+                print(f"[WARN] {self._busy} request(s) still running after {timeout}s drain", flush=True)
+        self.server_close()
+
+    @contextmanager
+    def parked(self):
+        """Hand the worker slot back while a request idles waiting for a push.
+
+        Yields False (without parking) when WEBHOOK_MAX_WAITERS is reached.
+        """
+        if not self.waiter_slots.acquire(blocking=False):
+            yield False
+            return
+        self.slots.release()
+        with self._idle:
+            self.parked_count += 1
+        try:
+            yield True
+        finally:
+            with self._idle:
+                self.parked_count -= 1
+            self.slots.acquire()
+            self.waiter_slots.release()
+
+    def process_request(self, request, client_address):
+        # Blocks the accept loop while all workers are busy, which leaves new
+        # connections in the kernel backlog instead of spawning more threads.
+        self.slots.acquire()
+        try:
+            super().process_request(request, client_address)
+        except Exception:
+            self.slots.release()
+            raise
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self.slots.release()
+
+
+def serve(reuse_port=False):
+    """Run one server process until SIGTERM/SIGINT, then drain and return."""
+    global store
+    # Parked waiters are mostly idle threads; small stacks keep thousands cheap.
+    threading.stack_size(THREAD_STACK_SIZE)
+    store = open_choice_store()
+    if reuse_port and isinstance(store, SqliteChoiceStore):
+        dedup.shared = store
+        store.watch(broker)
+    server = BoundedThreadingHTTPServer(("0.0.0.0", PORT), FeishuCardHandler, reuse_port=reuse_port)
+
+    def stop(signum, frame):
+        # shutdown() blocks until serve_forever() returns, so it can't run
+        # on the thread that is inside serve_forever().
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    server.serve_forever()
+    print(f"[{os.getpid()}] draining...", flush=True)
+    server.drain()
+
+
+def prefork(processes):
+    """Fork `processes` workers sharing the port via SO_REUSEPORT; respawn on crash."""
+    if CHOICE_STORE != "sqlite":
+        print("[WARN] CHOICE_STORE=files: duplicate suppression and waiter wakeups stay per-process", flush=True)
+    children = {}  # pid -> start time
+    stopping = threading.Event()
+    delay = RESPAWN_DELAY
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            # Never return into the parent's loop; report why the worker died
+            code = 1
+            try:
+                serve(reuse_port=True)
+                code = 0
+            except BaseException:
+                traceback.print_exc()
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        children[pid] = time.monotonic()
+
+    def stop(signum, frame):
+        stopping.set()
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(processes):
+        spawn()
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = children.pop(pid, None)
+        if not stopping.is_set():
+            # A worker that ran a while resets the backoff; one that keeps
+            # crashing on start doubles it instead of forking in a tight loop.
+            if started is not None and time.monotonic() - started > RESPAWN_MAX_DELAY:
+                delay = RESPAWN_DELAY
+            print(f"[WARN] worker {pid} exited (code {os.waitstatus_to_exitcode(status)}), "
+                  f"respawning in {delay:g}s", flush=True)
+            if stopping.wait(delay):
+                continue
+            delay = min(delay * 2, RESPAWN_MAX_DELAY)
+            spawn()
 
 
 if __name__ == "__main__":
-    print(f"🚀 Feishu Webhook Server on port {PORT}", flush=True)
-    HTTPServer(("0.0.0.0", PORT), FeishuCardHandler).serve_forever()
+    print(f"🚀 Feishu Webhook Server on port {PORT} "
+          f"({PROCESSES} process(es) x {WORKERS} workers, {CHOICE_STORE} store)", flush=True)
+    if PROCESSES > 1:
+        prefork(PROCESSES)
+    else:
+        serve()
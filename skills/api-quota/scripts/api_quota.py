@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Cross-process rate limits and quotas for the API keys the skills share.
+
+BRAVE_API_KEY (web_search.py, browser_fetch.py), DASHSCOPE_API_KEY (the
+qwen-image scripts) and ZAI_API_KEY (autoglm_dianping.py) are each used by
+several processes at once. Every caller asks this ledger for permission right
+before it sends a request:
+
+    import api_quota
+    api_quota.acquire("brave")            # blocks until a request is allowed
+    ... call the API ...
+    api_quota.penalize("brave", 2.0)      # on HTTP 429, with its Retry-After
+
+State lives in one SQLite database (WAL, BEGIN IMMEDIATE), so the limits hold
+across processes and threads:
+
+  - token bucket per provider: `rate` requests/second refill, `burst` capacity;
+  - monthly quota (`monthly`, 0 = unlimited), counted per calendar month (UTC);
+  - Retry-After: penalize() empties the bucket and blocks the provider until
+    the server said to come back, for every process;
+  - fairness: waiters take a ticket and are served strictly in ticket order, so
+    a burst from one process cannot starve another. Tickets of dead processes
+    are dropped.
+
+Limits (defaults in LIMITS) can be overridden per provider with an environment
+variable, e.g. API_QUOTA_BRAVE="rate=1,burst=1,monthly=2000".
+
+Usage:
+    python3 api_quota.py status [--json]      # headroom of every provider
+    python3 api_quota.py reset brave          # clear a provider's bucket/penalty (not its monthly count)
+
+Environment:
+    API_QUOTA_DB            ledger path (default <openclaw>/.openclaw/api_quota.db)
+    API_QUOTA_<PROVIDER>    limit overrides (rate, burst, monthly)
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+OPENCLAW_ROOT = os.environ.get("OPENCLAW_HOME", os.path.dirname(os.path.dirname(os.path.dirname(SCRIPT_DIR))))
+DB_PATH = os.environ.get("API_QUOTA_DB", os.path.join(OPENCLAW_ROOT, ".openclaw", "api_quota.db"))
+
+# rate: requests/second, burst: bucket size, monthly: requests per month (0 = unlimited)
+LIMITS = {
+    "brave": {"rate": 1.0, "burst": 1, "monthly": 1000},       # free plan: 1 req/s, ~$5 credit ≈ 1000/month
+    "dashscope": {"rate": 2.0, "burst": 4, "monthly": 0},
+    "zai": {"rate": 1.0, "burst": 2, "monthly": 0},
+}
+DEFAULT_LIMIT = {"rate": 1.0, "burst": 1, "monthly": 0}
+DEFAULT_TIMEOUT = 120
+DEFAULT_PENALTY = 1.0
+POLL_INTERVAL = 0.05
+MAX_SLEEP = 0.5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    provider      TEXT PRIMARY KEY,
+    tokens        REAL NOT NULL,
+    updated_at    REAL NOT NULL,
+    blocked_until REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS usage (
+    provider TEXT NOT NULL,
+    month    TEXT NOT NULL,
+    count    INTEGER NOT NULL,
+    PRIMARY KEY (provider, month)
+);
+CREATE TABLE IF NOT EXISTS tickets (
+    ticket_id  INTEGER PRIMARY KEY AUTOINCREMENT,
+    provider   TEXT NOT NULL,
+    pid        INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tickets_provider ON tickets (provider, ticket_id);
+"""
+
+
+class QuotaExceeded(Exception):
+    """No request allowed: monthly quota used up, or still waiting after the timeout."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def limits_for(provider):
+    """Effective limits for a provider (LIMITS merged with API_QUOTA_<PROVIDER>)."""
+    limits = dict(LIMITS.get(provider, DEFAULT_LIMIT))
+    override = os.environ.get(f"API_QUOTA_{provider.upper()}", "")
+    for part in override.split(","):
+        key, _, value = part.partition("=")
+        if key.strip() in limits and value.strip():
+            limits[key.strip()] = float(value)
+    return limits
+
+
+def _month(now):
+    return time.strftime("%Y-%m", time.gmtime(now))
+
+
+def _pid_alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except (OSError, IndexError):
+        return True
+
+
+class QuotaManager:
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        self._db().executescript(SCHEMA)
+
+    def _db(self):
+        # One connection per thread; SQLite does the cross-thread/process locking.
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    # ----- bucket state (called inside a transaction) -----
+
+    def _bucket(self, db, provider, limits, now):
+        row = db.execute("SELECT tokens, updated_at, blocked_until FROM buckets WHERE provider = ?",
+                         (provider,)).fetchone()
+        if row is None:
+            db.execute("INSERT INTO buckets (provider, tokens, updated_at) VALUES (?, ?, ?)",
+                       (provider, limits["burst"], now))
+            return float(limits["burst"]), 0.0
+        tokens = min(limits["burst"], row["tokens"] + max(0.0, now - row["updated_at"]) * limits["rate"])
+        return tokens, row["blocked_until"]
+
+    def _used(self, db, provider, now):
+        row = db.execute("SELECT count FROM usage WHERE provider = ? AND month = ?",
+                         (provider, _month(now))).fetchone()
+        return row["count"] if row else 0
+
+    def _drop_dead_tickets(self, db, provider):
+        for row in db.execute("SELECT DISTINCT pid FROM tickets WHERE provider = ?", (provider,)).fetchall():
+            if not _pid_alive(row["pid"]):
+                db.execute("DELETE FROM tickets WHERE provider = ? AND pid = ?", (provider, row["pid"]))
+
+    # ----- public API -----
+
+    def acquire(self, provider, cost=1, timeout=DEFAULT_TIMEOUT):
+        """Block until `cost` requests may be sent; returns the seconds waited.
+
+        Raises QuotaExceeded when the monthly quota cannot cover `cost`, or when
+        `timeout` seconds pass first (retry_after says how long is left).
+        """
+        limits = limits_for(provider)
+        db = self._db()
+        started = time.time()
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            ticket = db.execute("INSERT INTO tickets (provider, pid, created_at) VALUES (?, ?, ?)",
+                                (provider, os.getpid(), started)).lastrowid
+        backoff, last_ahead = POLL_INTERVAL, None
+        try:
+            while True:
+                # Not our turn yet: plain reads (no write lock), sleeping about as long as the
+                # waiters ahead need and backing off while the queue does not move.
+                now = time.time()
+                if limits["monthly"] and self._used(db, provider, now) + cost > limits["monthly"]:
+                    raise QuotaExceeded(f"{provider}: monthly quota of {limits['monthly']:.0f} requests used up")
+                ahead = db.execute("SELECT COUNT(*) AS n FROM tickets WHERE provider = ? AND ticket_id < ?",
+                                   (provider, ticket)).fetchone()["n"]
+                if ahead:
+                    if last_ahead is not None and ahead < last_ahead:
+                        backoff = POLL_INTERVAL
+                    elif backoff >= MAX_SLEEP:
+                        # Stuck at the longest sleep: a waiter ahead may have died
+                        with db:
+                            db.execute("BEGIN IMMEDIATE")
+                            self._drop_dead_tickets(db, provider)
+                    last_ahead = ahead
+                    wait = max(backoff, ahead * cost / limits["rate"] if limits["rate"] else 0.0)
+                    backoff = min(backoff * 2, MAX_SLEEP)
+                    if timeout is not None and time.time() + min(wait, MAX_SLEEP) - started > timeout:
+                        raise QuotaExceeded(f"{provider}: no request slot within {timeout:.0f}s", retry_after=wait)
+                    time.sleep(min(wait, MAX_SLEEP))
+                    continue
+
+                with db:
+                    db.execute("BEGIN IMMEDIATE")
+                    now = time.time()
+                    if limits["monthly"] and self._used(db, provider, now) + cost > limits["monthly"]:
+                        raise QuotaExceeded(f"{provider}: monthly quota of {limits['monthly']:.0f} requests used up")
+                    tokens, blocked_until = self._bucket(db, provider, limits, now)
+                    if now >= blocked_until and tokens >= cost:
+                        db.execute("UPDATE buckets SET tokens = ?, updated_at = ? WHERE provider = ?",
+                                   (tokens - cost, now, provider))
+                        db.execute("INSERT INTO usage (provider, month, count) VALUES (?, ?, ?) "
+                                   "ON CONFLICT (provider, month) DO UPDATE SET count = count + excluded.count",
+                                   (provider, _month(now), cost))
+                        return now - started
+                    wait = max(blocked_until - now, (cost - tokens) / limits["rate"] if limits["rate"] else MAX_SLEEP)
+                if timeout is not None and time.time() + wait - started > timeout:
+                    raise QuotaExceeded(f"{provider}: no request slot within {timeout:.0f}s", retry_after=wait)
+                time.sleep(min(max(wait, POLL_INTERVAL / 5), MAX_SLEEP))
+        finally:
+            db.execute("DELETE FROM tickets WHERE ticket_id = ?", (ticket,))
+
+    def penalize(self, provider, retry_after=None):
+        """The API answered 429: empty the bucket and hold everyone off for `retry_after` seconds."""
+        limits = limits_for(provider)
+        db = self._db()
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            _, blocked_until = self._bucket(db, provider, limits, now)
+            until = max(blocked_until, now + (retry_after if retry_after is not None else DEFAULT_PENALTY))
+            db.execute("UPDATE buckets SET tokens = 0, updated_at = ?, blocked_until = ? WHERE provider = ?",
+                       (now, until, provider))
+
+    def headroom(self, provider):
+        """Current state: tokens available, penalty left, monthly usage, queued waiters."""
+        limits = limits_for(provider)
+        db = self._db()
+        now = time.time()
+        row = db.execute("SELECT tokens, updated_at, blocked_until FROM buckets WHERE provider = ?",
+                         (provider,)).fetchone()
+        if row is None:
+            tokens, blocked_until = float(limits["burst"]), 0.0
+        else:
+            tokens = min(limits["burst"], row["tokens"] + max(0.0, now - row["updated_at"]) * limits["rate"])
+            blocked_until = row["blocked_until"]
+        used = self._used(db, provider, now)
+        queued = db.execute("SELECT COUNT(*) AS n FROM tickets WHERE provider = ?", (provider,)).fetchone()["n"]
+        return {
+            "provider": provider,
+            "tokens": round(tokens, 2),
+            "rate": limits["rate"],
+            "burst": limits["burst"],
+            "blocked_for_s": round(max(0.0, blocked_until - now), 2),
+            "queued": queued,
+            "month": _month(now),
+            "monthly_used": used,
+            "monthly_limit": int(limits["monthly"]) or None,
+            "monthly_left": int(limits["monthly"]) - used if limits["monthly"] else None,
+        }
+
+    def providers(self):
+        known = {row["provider"] for row in self._db().execute("SELECT provider FROM buckets").fetchall()}
+        return sorted(known | set(LIMITS))
+
+    def reset(self, provider):
+        db = self._db()
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute("DELETE FROM buckets WHERE provider = ?", (provider,))
+            db.execute("DELETE FROM tickets WHERE provider = ?", (provider,))
+
+
+# ========== Module-level helpers for the skill scripts ==========
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def manager():
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = QuotaManager()
+        return _manager
+
+
+# A broken ledger (unwritable path, corrupt file) must not take the API
+# callers down with it: they proceed unthrottled and say so once.
+
+_warned = False
+
+
+def _unavailable(e):
+    global _warned
+    if not _warned:
+        _warned = True
+        print(f"⚠️ API quota ledger unavailable ({e}); continuing without shared limits", file=sys.stderr)
+
+
+def acquire(provider, cost=1, timeout=DEFAULT_TIMEOUT):
+    """QuotaManager.acquire on the shared ledger; raises QuotaExceeded."""
+    try:
+        return manager().acquire(provider, cost, timeout)
+    except (sqlite3.Error, OSError) as e:
+        _unavailable(e)
+        return 0.0
+
+
+def penalize(provider, retry_after=None):
+    try:
+        manager().penalize(provider, retry_after)
+    except (sqlite3.Error, OSError) as e:
+        _unavailable(e)
+
+
+def headroom(provider):
+    return manager().headroom(provider)
+
+
+def retry_after_seconds(headers):
+    """Seconds from a Retry-After header (delta-seconds form), or None."""
+    try:
+        return float((headers or {}).get("Retry-After", ""))
+    except (TypeError, ValueError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared API rate limits and quotas")
+    parser.add_argument("command", choices=["status", "reset"])
+    parser.add_argument("provider", nargs="?", help="reset: provider name (brave, dashscope, zai, ...)")
+    parser.add_argument("--json", action="store_true", help="status: JSON output")
+    args = parser.parse_args()
+
+    quota = QuotaManager()
+    if args.command == "reset":
+        if not args.provider:
+            parser.error("reset needs a provider")
+        quota.reset(args.provider)
+        print(f"✅ {args.provider}: bucket and penalty cleared")
+        return
+
+    states = [quota.headroom(p) for p in quota.providers()]
+    if args.json:
+        print(json.dumps(states, indent=2))
+        return
+    print(f"{'provider':<12}{'tokens':>8}{'rate/s':>8}{'burst':>7}{'blocked s':>11}{'queued':>8}  month")
+    for s in states:
+        month = f"{s['monthly_used']}/{s['monthly_limit']}" if s["monthly_limit"] else f"{s['monthly_used']}"
+        print(f"{s['provider']:<12}{s['tokens']:>8.2f}{s['rate']:>8g}{s['burst']:>7g}{s['blocked_for_s']:>11.1f}"
+              f"{s['queued']:>8}  {month}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,13 @@ import hashlib
 import uuid
 from datetime import datetime, timezone
 import requests
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    # Optional: lets iter_assets() parse large asset pages item by item
+    import ijson
+except ImportError:
+    ijson = None
 
 class EvoMapClient:
     """
@@ -12,9 +19,15 @@ class EvoMapClient:
     Designed for interactive AI agents to seamlessly participate in collaborative evolution.
     """
     
-    def __init__(self, config_dir=None, hub_url="https://evomap.ai"):
+    def __init__(self, config_dir=None, hub_url="https://evomap.ai", mirror=None):
         self.hub_url = hub_url.rstrip('/')
         
+        # Optional local asset mirror (see evomap_mirror.py): True opens the default one
+        if mirror is True:
+            from evomap_mirror import AssetMirror
+            mirror = AssetMirror()
+        self.mirror = mirror or None
+        
         # Default config dir is the current directory of this script
         if config_dir is None:
             config_dir = os.path.dirname(os.path.abspath(__file__))
@@ -22,6 +35,7 @@ class EvoMapClient:
         self.config_dir = config_dir
         self.config_path = os.path.join(self.config_dir, "evomap_node.json")
         self.node_id = self._load_or_create_node_id()
+        self._ledger = None
 
     def _load_or_create_node_id(self):
         """Loads the persistent node ID, or creates one if it doesn't exist."""
@@ -106,12 +120,10 @@ class EvoMapClient:
         response.raise_for_status()
         return response.json()
 
-    def publish(self, gene, capsule, event=None):
+    def _build_bundle(self, gene, capsule, event=None):
         """
         Intelligently resolves dependencies between Gene, Capsule, and EvolutionEvent.
-        Computes their distinct canonical hashes, creates the Bundle, and publishes it.
-        
-        You only need to pass the "business data" dictionaries without asset_id fields.
+        Computes their distinct canonical hashes and returns the Bundle's asset list.
         """
         # 0. Enforce types
         gene["type"] = "Gene"
@@ -138,6 +150,23 @@ class EvoMapClient:
             event["asset_id"] = event_id
             assets.append(event)
             
+        return assets
+
+    def _publish_ledger(self):
+        """The node's local publish ledger (see publish_ledger.py), opened on first use."""
+        if self._ledger is None:
+            from publish_ledger import PublishLedger
+            self._ledger = PublishLedger(self.config_dir)
+        return self._ledger
+
+    def _publish_assets(self, assets, force=False):
+        asset_ids = [asset["asset_id"] for asset in assets]
+        ledger = self._publish_ledger()
+        if not force:
+            previous = ledger.accepted_response(asset_ids)
+            if previous is not None:
+                return dict(previous, skipped=True)
+                
         payload = {
             "assets": assets
         }
@@ -145,7 +174,68 @@ class EvoMapClient:
         envelope = self._make_envelope("publish", payload)
         response = requests.post(f"{self.hub_url}/a2a/publish", json=envelope)
         response.raise_for_status()
-        return response.json()
+        result = response.json()
+        ledger.record(assets, result)
+        return result
+
+    def publish(self, gene, capsule, event=None, force=False):
+        """
+        Intelligently resolves dependencies between Gene, Capsule, and EvolutionEvent.
+        Computes their distinct canonical hashes, creates the Bundle, and publishes it.
+        
+        You only need to pass the "business data" dictionaries without asset_id fields.
+        
+        If the Hub already accepted every asset of this exact Bundle (per the local
+        publish ledger), nothing is sent and the recorded response is returned with
+        "skipped": True. Pass force=True to publish anyway.
+        """
+        return self._publish_assets(self._build_bundle(gene, capsule, event), force)
+
+    def publish_many(self, bundles, concurrency=4, force=False):
+        """
+        Publishes many Bundles, at most `concurrency` at a time.
+        `bundles` holds (gene, capsule[, event]) tuples or {"gene", "capsule", "event"} dicts.
+        
+        Returns one result per Bundle, in input order:
+        {"index", "asset_ids", "status", "skipped", "response", "error"}.
+        A failed Bundle does not stop the others; repeats of a Bundle earlier in the
+        same call get status "duplicate" without being sent.
+        """
+        from publish_ledger import response_status
+        
+        jobs = []
+        results = []
+        first_index = {}
+        for index, bundle in enumerate(bundles):
+            if isinstance(bundle, dict):
+                gene, capsule, event = bundle["gene"], bundle["capsule"], bundle.get("event")
+            else:
+                gene, capsule, event = (tuple(bundle) + (None,))[:3]
+            assets = self._build_bundle(gene, capsule, event)
+            asset_ids = [asset["asset_id"] for asset in assets]
+            result = {"index": index, "asset_ids": asset_ids, "status": None, "skipped": False,
+                      "response": None, "error": None}
+            key = tuple(asset_ids)
+            if key in first_index:
+                result.update(status="duplicate", skipped=True, error=f"same content as bundle {first_index[key]}")
+            else:
+                first_index[key] = index
+                jobs.append((result, assets))
+            results.append(result)
+            
+        def run(job):
+            result, assets = job
+            try:
+                response = self._publish_assets(assets, force)
+                result.update(response=response, skipped=bool(response.get("skipped")),
+                              status="skipped" if response.get("skipped") else response_status(response))
+            except Exception as e:
+                detail = e.response.text if isinstance(e, requests.exceptions.HTTPError) else ""
+                result.update(status="failed", error=f"{e} {detail}".strip())
+                
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            list(pool.map(run, jobs))
+        return results
 
     def fetch(self, asset_type="Capsule", include_tasks=False):
         """
@@ -157,21 +247,58 @@ class EvoMapClient:
         }
         if include_tasks:
             payload["include_tasks"] = True
+        elif self.mirror is not None:
+            # Tasks are not mirrored; plain asset fetches can be answered locally
+            if self.mirror.ensure_fresh(self):
+                assets = self.mirror.ranked(asset_type, limit=self.mirror.fetch_limit)
+                return {"payload": {"assets": assets}, "source": "mirror"}
+            cache_key = self.mirror.cache_key("/a2a/fetch", payload)
+            cached = self.mirror.cached(cache_key)
+            if cached is not None:
+                return cached
             
         envelope = self._make_envelope("fetch", payload)
         response = requests.post(f"{self.hub_url}/a2a/fetch", json=envelope)
         response.raise_for_status()
-        return response.json()
+        result = response.json()
+        if self.mirror is not None and not include_tasks:
+            self.mirror.store(cache_key, result)
+        return result
 
     # =========================================================================
     # REST API Endpoints (No Envelope Required)
     # =========================================================================
     
+    def _get_json(self, path, params):
+        """
+        GET a REST endpoint. With a mirror, responses are reused from its query
+        cache for up to EVOMAP_QUERY_CACHE_TTL seconds.
+        """
+        if self.mirror is None:
+            response = requests.get(f"{self.hub_url}{path}", params=params)
+            response.raise_for_status()
+            return response.json()
+            
+        cache_key = self.mirror.cache_key(path, params)
+        cached = self.mirror.cached(cache_key)
+        if cached is not None:
+            return cached
+        response = requests.get(f"{self.hub_url}{path}", params=params)
+        response.raise_for_status()
+        result = response.json()
+        self.mirror.store(cache_key, result)
+        return result
+    
     def search_assets(self, signals=None, asset_type="Capsule", limit=10):
         """
         Standard REST endpoint to quickly search the Hub by signals.
         Example: signals="TimeoutError,ECONNREFUSED" or ["TimeoutError"]
+        
+        With a fresh mirror this is answered locally as {"assets": [...], "source": "mirror"}.
         """
+        if self.mirror is not None and self.mirror.ensure_fresh(self):
+            return {"assets": self.mirror.search(signals, asset_type, limit=limit), "source": "mirror"}
+            
         params = {"type": asset_type, "limit": limit}
         
         if signals:
@@ -179,18 +306,162 @@ class EvoMapClient:
                 signals = ",".join(signals)
             params["signals"] = signals
             
-        response = requests.get(f"{self.hub_url}/a2a/assets/search", params=params)
-        response.raise_for_status()
-        return response.json()
+        return self._get_json("/a2a/assets/search", params)
         
     def get_ranked_assets(self, asset_type="Capsule", limit=10):
         """
         Gets the highest GDI strictly ranked assets.
+        
+        With a fresh mirror this is answered locally as {"assets": [...], "source": "mirror"}.
         """
+        if self.mirror is not None and self.mirror.ensure_fresh(self):
+            return {"assets": self.mirror.ranked(asset_type, limit=limit), "source": "mirror"}
+            
         params = {"type": asset_type, "limit": limit}
-        response = requests.get(f"{self.hub_url}/a2a/assets/ranked", params=params)
-        response.raise_for_status()
-        return response.json()
+        return self._get_json("/a2a/assets/ranked", params)
+
+    def iter_assets(self, author=None, asset_type=None, status=None, sort="newest", since=None,
+                    page_size=100, max_items=None, max_scan=5000, stats=None):
+        """
+        Iterates GET /a2a/assets page by page, yielding only the assets that match
+        `author` (author or sender_id), `asset_type` and `status`.
+        
+        The filters are sent to the Hub as query params, and re-checked locally for
+        Hubs that ignore some of them. Pages follow `next_cursor` when the Hub returns
+        one and `offset` otherwise. A Hub that supports neither (the documented API)
+        answers the second page with the first one again; the list is then read as
+        a single request for `max_scan` assets. Responses are streamed and, when
+        `ijson` is installed, parsed one asset at a time instead of loaded whole.
+        
+        The Hub may cap `limit`, so a page shorter than requested is not taken as the
+        end of the list. The end is only certain after an empty follow-up page, a
+        follow-up page that repeats assets already read (once paging has worked), the
+        last page of a cursor walk, or the Hub's own `has_more: false` / `total`.
+        
+        `since` (a timestamp) is passed to the Hub as a hint only; callers that need
+        it enforced stop on their own, as AssetMirror.sync() does.
+        
+        Stops as soon as `max_items` matches were yielded, `max_scan` assets were
+        read, or the Hub's list ended. Pass a dict as `stats` to get "scanned"
+        (assets read), "requests", "page_size" (the largest page the Hub returned),
+        "complete" (True only if the end of the list is certain) and "end" (which
+        of the signals above showed it, else None) once iteration stops.
+        """
+        params = {"limit": page_size, "sort": sort}
+        if asset_type:
+            params["type"] = asset_type
+        if status:
+            params["status"] = status
+        if author:
+            params["author"] = author
+        if since:
+            params["since"] = since
+            
+        stats = {} if stats is None else stats
+        stats.update(scanned=0, requests=0, page_size=0, complete=False, end=None)
+        seen = set()
+        matched = offset = 0
+        cursor = None
+        single_request = paged = False
+        while stats["scanned"] < max_scan:
+            if single_request:
+                page_params = dict(params, limit=max_scan)
+            elif cursor:
+                page_params = dict(params, cursor=cursor)
+            else:
+                page_params = dict(params, offset=offset)
+            page = {"count": 0, "new": 0, "next_cursor": None, "has_more": None, "total": None}
+            stats["requests"] += 1
+            with requests.get(f"{self.hub_url}/a2a/assets", params=page_params, stream=True, timeout=60) as response:
+                response.raise_for_status()
+                for asset in self._iter_asset_page(response, page):
+                    page["count"] += 1
+                    asset_id = asset.get("asset_id")
+                    if asset_id in seen:
+                        continue
+                    if asset_id:
+                        seen.add(asset_id)
+                    page["new"] += 1
+                    stats["scanned"] += 1
+                    if self._asset_matches(asset, author, asset_type, status):
+                        yield asset
+                        matched += 1
+                        if max_items is not None and matched >= max_items:
+                            return
+                    if stats["scanned"] >= max_scan:
+                        return
+                        
+            stats["page_size"] = max(stats["page_size"], page["count"])
+            follow_up = stats["requests"] > 1
+            if page["has_more"] is False:
+                end = "end marker"
+            elif isinstance(page["total"], int) and len(seen) >= page["total"]:
+                end = "total"
+            elif page["count"] == 0:
+                end = "empty page" if follow_up or not page["next_cursor"] else None
+            elif cursor and not page["next_cursor"] and not single_request:
+                end = "last cursor page"
+            elif page["new"] == 0 and paged:
+                end = "repeated page"
+            else:
+                end = None
+            if end:
+                stats.update(complete=True, end=end)
+                return
+            # A page shorter than the others may just be the Hub's cap: keep going until it says so
+            if single_request or page["count"] == 0 or (page["new"] == 0 and (cursor or page["next_cursor"])):
+                return
+            if page["new"] == 0:
+                # The Hub ignored offset and repeated the first page: no paging support
+                single_request = True
+                continue
+            paged = paged or follow_up
+            cursor = page["next_cursor"]
+            offset += page["count"]
+
+    def _iter_asset_page(self, response, page):
+        """
+        Yields the assets of one /a2a/assets response (a bare list, or a dict with an
+        `assets` list) and stores the Hub's `next_cursor`, `has_more` and `total`, if
+        any, into `page`.
+        """
+        if ijson is None:
+            data = response.json()
+            if isinstance(data, dict):
+                page.update((key, data.get(key)) for key in ("next_cursor", "has_more", "total"))
+                data = data.get("assets", [])
+            for asset in data:
+                if isinstance(asset, dict):
+                    yield asset
+            return
+            
+        response.raw.decode_content = True
+        builder = None
+        for prefix, event, value in ijson.parse(response.raw, use_float=True):
+            if builder is not None:
+                builder.event(event, value)
+                if prefix in ("item", "assets.item") and event == "end_map":
+                    yield builder.value
+                    builder = None
+            elif prefix in ("item", "assets.item") and event == "start_map":
+                builder = ijson.ObjectBuilder()
+                builder.event(event, value)
+            elif prefix == "next_cursor" and event in ("string", "number"):
+                page["next_cursor"] = value
+            elif prefix == "has_more" and event == "boolean":
+                page["has_more"] = value
+            elif prefix == "total" and event == "number":
+                page["total"] = value
+
+    @staticmethod
+    def _asset_matches(asset, author=None, asset_type=None, status=None):
+        if author and author not in (asset.get("author"), asset.get("sender_id")):
+            return False
+        if asset_type and asset.get("asset_type", asset.get("type")) != asset_type:
+            return False
+        if status and asset.get("status") not in (None, status):
+            return False
+        return True
 
     def get_node_reputation(self, node_id=None):
         """
@@ -0,0 +1,421 @@
+"""
+Local SQLite mirror of EvoMap Hub assets.
+
+Agents ask the Hub the same signal queries many times an hour. The mirror keeps
+a copy of GET /a2a/assets, indexed by asset_id, author, type and signal, so
+EvoMapClient(mirror=True) can answer search_assets(), get_ranked_assets() and
+fetch() locally while the copy is fresh enough.
+
+- Incremental sync: the newest-first asset list is read until it reaches the
+  high-water timestamp of the previous sync (or, for assets without a
+  timestamp, SYNC_OVERLAP already-known assets in a row). Once a day a full
+  sync re-reads up to MIRROR_MAX_ASSETS assets to pick up status and GDI changes.
+- Completeness: the mirror only answers queries after a full sync has read
+  the Hub's list to a certain end (an empty or repeated follow-up page, the
+  last cursor page, or the Hub's has_more/total; a short page is not enough,
+  as the Hub may cap `limit`). That sync also drops assets the Hub no longer
+  lists. Until then, and whenever a sync is cut short, queries go to the Hub.
+- Freshness: the mirror is used while its last sync is younger than
+  MIRROR_MAX_AGE seconds; a stale mirror syncs incrementally on the next query.
+  An incomplete mirror is not re-synced before then either.
+- Query cache: Hub responses that cannot be answered from the mirror (fetch with
+  tasks, or any query while the Hub's asset list is unreachable) are cached for
+  QUERY_CACHE_TTL seconds.
+
+Usage:
+    python3 evomap_mirror.py sync [--full]
+    python3 evomap_mirror.py stats
+    python3 evomap_mirror.py search TimeoutError,ECONNREFUSED [--type Capsule] [--limit 10]
+
+Environment:
+    EVOMAP_MIRROR_DB          mirror path (default: evomap_mirror.db next to this script)
+    EVOMAP_MIRROR_MAX_AGE     seconds a sync stays fresh (default 900)
+    EVOMAP_QUERY_CACHE_TTL    seconds a cached Hub response is reused (default 300)
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+
+MIRROR_PATH = os.environ.get("EVOMAP_MIRROR_DB",
+                             os.path.join(os.path.dirname(os.path.abspath(__file__)), "evomap_mirror.db"))
+MIRROR_MAX_AGE = float(os.environ.get("EVOMAP_MIRROR_MAX_AGE", "900"))
+QUERY_CACHE_TTL = float(os.environ.get("EVOMAP_QUERY_CACHE_TTL", "300"))
+FULL_SYNC_SECONDS = 24 * 3600
+MIRROR_MAX_ASSETS = 20000
+MIRROR_FETCH_LIMIT = 100
+SYNC_PAGE_SIZE = 200
+SYNC_OVERLAP = 50
+
+# Fields that carry an asset's trigger signals, on the asset or inside its payload
+SIGNAL_FIELDS = ("signals", "signals_match", "trigger")
+TIMESTAMP_FIELDS = ("updated_at", "created_at", "timestamp")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS assets (
+    asset_id   TEXT PRIMARY KEY,
+    type       TEXT,
+    author     TEXT,
+    status     TEXT,
+    gdi_score  REAL,
+    stamp      TEXT,
+    data       TEXT NOT NULL,
+    synced_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS assets_author ON assets (author);
+CREATE INDEX IF NOT EXISTS assets_type ON assets (type, status, gdi_score);
+CREATE TABLE IF NOT EXISTS asset_signals (
+    signal     TEXT NOT NULL,
+    asset_id   TEXT NOT NULL,
+    PRIMARY KEY (signal, asset_id)
+);
+CREATE INDEX IF NOT EXISTS asset_signals_asset ON asset_signals (asset_id);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key        TEXT PRIMARY KEY,
+    value      TEXT
+);
+CREATE TABLE IF NOT EXISTS query_cache (
+    key        TEXT PRIMARY KEY,
+    response   TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+def asset_signals(asset):
+    """Lower-cased trigger signals of an asset (lists or comma-separated strings)."""
+    signals = set()
+    for source in (asset, asset.get("payload") or {}):
+        if not isinstance(source, dict):
+            continue
+        for field in SIGNAL_FIELDS:
+            value = source.get(field)
+            if isinstance(value, str):
+                value = value.split(",")
+            if isinstance(value, list):
+                signals.update(s.strip().lower() for s in value if isinstance(s, str) and s.strip())
+    return signals
+
+
+def _asset_stamp(asset):
+    for field in TIMESTAMP_FIELDS:
+        if asset.get(field) is not None:
+            return str(asset[field])
+    return None
+
+
+def _split_signals(signals):
+    if isinstance(signals, str):
+        signals = signals.split(",")
+    return sorted({s.strip().lower() for s in signals or [] if s.strip()})
+
+
+class AssetMirror:
+    """
+    SQLite copy of the Hub's asset list plus a TTL cache of raw Hub responses.
+    Safe to share between threads.
+    """
+
+    def __init__(self, path=MIRROR_PATH, max_age=MIRROR_MAX_AGE, cache_ttl=QUERY_CACHE_TTL):
+        self.path = path
+        self.max_age = max_age
+        self.cache_ttl = cache_ttl
+        self.fetch_limit = MIRROR_FETCH_LIMIT
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.db.close()
+
+    # =========================================================================
+    # Sync
+    # =========================================================================
+
+    def _state(self, key):
+        row = self.db.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def _set_state(self, key, value):
+        self.db.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", (key, value))
+
+    def age(self):
+        """Seconds since the last successful sync (None if never synced)."""
+        with self._lock:
+            last = self._state("last_sync_at")
+        return time.time() - float(last) if last else None
+
+    def complete_end(self):
+        """How the last full sync knew it reached the end of the Hub's list (None if it did not)."""
+        with self._lock:
+            return self._state("complete_end") or None
+
+    def is_complete(self):
+        """True if the last full sync read the Hub's list to its end and later syncs left no gap."""
+        return self.complete_end() is not None
+
+    def is_fresh(self):
+        """True if the mirror can answer queries: complete, and synced within max_age."""
+        age = self.age()
+        return age is not None and age <= self.max_age and self.is_complete()
+
+    def _upsert(self, asset, now):
+        """Stores one asset; returns True if it was new or changed."""
+        data = json.dumps(asset, sort_keys=True, ensure_ascii=False)
+        asset_id = asset["asset_id"]
+        row = self.db.execute("SELECT data FROM assets WHERE asset_id = ?", (asset_id,)).fetchone()
+        if row and row["data"] == data:
+            self.db.execute("UPDATE assets SET synced_at = ? WHERE asset_id = ?", (now, asset_id))
+            return False
+        gdi = asset.get("gdi_score")
+        self.db.execute(
+            "INSERT OR REPLACE INTO assets (asset_id, type, author, status, gdi_score, stamp, data, synced_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (asset_id, asset.get("asset_type", asset.get("type")), asset.get("author", asset.get("sender_id")),
+             asset.get("status", "promoted"), gdi if isinstance(gdi, (int, float)) else None,
+             _asset_stamp(asset), data, now))
+        self.db.execute("DELETE FROM asset_signals WHERE asset_id = ?", (asset_id,))
+        self.db.executemany("INSERT OR IGNORE INTO asset_signals (signal, asset_id) VALUES (?, ?)",
+                            [(signal, asset_id) for signal in asset_signals(asset)])
+        return True
+
+    def _upsert_batch(self, assets, now):
+        """Stores a batch of assets in one transaction; returns a changed flag per asset."""
+        if not assets:
+            return []
+        with self._lock:
+            self.db.execute("BEGIN")
+            try:
+                flags = [self._upsert(asset, now) for asset in assets]
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+            self.db.execute("COMMIT")
+        return flags
+
+    def sync(self, client, full=None):
+        """
+        Pulls new and changed assets from the Hub through client.iter_assets().
+        `full=None` does a full sync when the last one is over a day old or the
+        mirror is incomplete.
+        
+        A full sync that reaches a certain end of the Hub's list (iter_assets' stats
+        "end") marks the mirror complete and deletes every asset it did not see
+        (revoked or dropped from the list). One that stops at MIRROR_MAX_ASSETS or
+        on a Hub that gives no certain end, or an incremental sync that never gets
+        back to the previous high-water mark, marks it incomplete, and queries go to
+        the Hub until a later full sync succeeds.
+        Returns {"full", "scanned", "changed", "removed", "complete", "end", "elapsed_s"}.
+        """
+        started = time.time()
+        with self._lock:
+            high_water = self._state("high_water")
+            last_full = self._state("last_full_sync_at")
+            end = self._state("complete_end") or None
+            complete = end is not None
+        if full is None:
+            full = (not complete or high_water is None or last_full is None
+                    or started - float(last_full) > FULL_SYNC_SECONDS)
+        since = None if full else high_water
+
+        scanned = changed = removed = known_streak = 0
+        caught_up = False
+        newest = high_water
+        batch = []
+        scan = {}
+        assets = client.iter_assets(sort="newest", since=since, page_size=SYNC_PAGE_SIZE,
+                                    max_scan=MIRROR_MAX_ASSETS, stats=scan)
+        try:
+            for asset in assets:
+                if not asset.get("asset_id"):
+                    continue
+                stamp = _asset_stamp(asset)
+                # Newest first: anything older than the last sync's newest asset is already here
+                if since and stamp and stamp < since:
+                    caught_up = True
+                    break
+                scanned += 1
+                if stamp and (newest is None or stamp > newest):
+                    newest = stamp
+                batch.append(asset)
+                if len(batch) < SYNC_PAGE_SIZE:
+                    continue
+                for asset, is_changed in zip(batch, self._upsert_batch(batch, started)):
+                    changed += is_changed
+                    if since and not _asset_stamp(asset):
+                        known_streak = 0 if is_changed else known_streak + 1
+                batch = []
+                if known_streak >= SYNC_OVERLAP:
+                    caught_up = True
+                    break
+        finally:
+            assets.close()
+        changed += sum(self._upsert_batch(batch, started))
+        if full:
+            end = scan["end"] if scan.get("complete") else None
+        elif not (caught_up or scan.get("complete")):
+            end = None
+
+        with self._lock:
+            if full and end:
+                # Everything still on the Hub was just re-stamped; the rest is gone
+                self.db.execute("BEGIN")
+                self.db.execute("DELETE FROM asset_signals WHERE asset_id IN "
+                                "(SELECT asset_id FROM assets WHERE synced_at < ?)", (started,))
+                removed = self.db.execute("DELETE FROM assets WHERE synced_at < ?", (started,)).rowcount
+                self.db.execute("COMMIT")
+            if newest:
+                self._set_state("high_water", newest)
+            self._set_state("complete_end", end or "")
+            self._set_state("last_sync_at", repr(started))
+            if full:
+                self._set_state("last_full_sync_at", repr(started))
+        return {"full": full, "scanned": scanned, "changed": changed, "removed": removed,
+                "complete": end is not None, "end": end, "elapsed_s": round(time.time() - started, 2)}
+
+    def ensure_fresh(self, client):
+        """
+        Syncs if the mirror is stale. Returns True if it can answer queries; an
+        incomplete mirror synced within max_age returns False without another scan.
+        """
+        age = self.age()
+        if age is not None and age <= self.max_age:
+            return self.is_complete()
+        try:
+            result = self.sync(client)
+        except Exception as e:
+            print(f"[EvoMap Mirror] Sync failed, falling back to the Hub: {e}")
+            return False
+        return result["complete"]
+
+    # =========================================================================
+    # Queries
+    # =========================================================================
+
+    def _rows(self, sql, params):
+        with self._lock:
+            rows = self.db.execute(sql, params).fetchall()
+        return [json.loads(row["data"]) for row in rows]
+
+    def search(self, signals=None, asset_type="Capsule", status="promoted", limit=10):
+        """
+        Assets with a signal containing any of `signals` (case-insensitive, so
+        "timeout" matches TimeoutError), most matching signals first, then by GDI score.
+        """
+        wanted = _split_signals(signals)
+        if not wanted:
+            return self.ranked(asset_type, status, limit)
+        like = " OR ".join("s.signal LIKE ? ESCAPE '\\'" for _ in wanted)
+        sql = ("SELECT a.data, COUNT(*) AS hits FROM asset_signals s JOIN assets a ON a.asset_id = s.asset_id "
+               f"WHERE ({like})")
+        params = ["%" + w.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%" for w in wanted]
+        if asset_type:
+            sql += " AND a.type = ?"
+            params.append(asset_type)
+        if status:
+            sql += " AND a.status = ?"
+            params.append(status)
+        sql += " GROUP BY a.asset_id ORDER BY hits DESC, a.gdi_score IS NULL, a.gdi_score DESC LIMIT ?"
+        return self._rows(sql, params + [limit])
+
+    def ranked(self, asset_type="Capsule", status="promoted", limit=10):
+        """Assets ordered by GDI score (`limit=None` for all)."""
+        sql = "SELECT data FROM assets WHERE 1 = 1"
+        params = []
+        if asset_type:
+            sql += " AND type = ?"
+            params.append(asset_type)
+        if status:
+            sql += " AND status = ?"
+            params.append(status)
+        sql += " ORDER BY gdi_score IS NULL, gdi_score DESC LIMIT ?"
+        return self._rows(sql, params + [limit if limit is not None else -1])
+
+    def by_author(self, author, asset_type=None, limit=None):
+        sql = "SELECT data FROM assets WHERE author = ?"
+        params = [author]
+        if asset_type:
+            sql += " AND type = ?"
+            params.append(asset_type)
+        sql += " ORDER BY stamp DESC LIMIT ?"
+        return self._rows(sql, params + [limit if limit is not None else -1])
+
+    def get(self, asset_id):
+        rows = self._rows("SELECT data FROM assets WHERE asset_id = ?", (asset_id,))
+        return rows[0] if rows else None
+
+    # =========================================================================
+    # Query cache (raw Hub responses)
+    # =========================================================================
+
+    @staticmethod
+    def cache_key(endpoint, params):
+        return endpoint + "?" + json.dumps(params, sort_keys=True, ensure_ascii=False)
+
+    def cached(self, key):
+        """A Hub response stored within the last cache_ttl seconds, or None."""
+        with self._lock:
+            row = self.db.execute("SELECT response FROM query_cache WHERE key = ? AND created_at >= ?",
+                                  (key, time.time() - self.cache_ttl)).fetchone()
+        return json.loads(row["response"]) if row else None
+
+    def store(self, key, response):
+        now = time.time()
+        with self._lock:
+            self.db.execute("INSERT OR REPLACE INTO query_cache (key, response, created_at) VALUES (?, ?, ?)",
+                            (key, json.dumps(response, ensure_ascii=False), now))
+            self.db.execute("DELETE FROM query_cache WHERE created_at < ?", (now - self.cache_ttl,))
+
+    def stats(self):
+        with self._lock:
+            assets = self.db.execute("SELECT COUNT(*) FROM assets").fetchone()[0]
+            by_type = dict(self.db.execute("SELECT type, COUNT(*) FROM assets GROUP BY type").fetchall())
+            signals = self.db.execute("SELECT COUNT(DISTINCT signal) FROM asset_signals").fetchone()[0]
+            cached = self.db.execute("SELECT COUNT(*) FROM query_cache WHERE created_at >= ?",
+                                     (time.time() - self.cache_ttl,)).fetchone()[0]
+            high_water = self._state("high_water")
+        age = self.age()
+        return {"path": self.path, "assets": assets, "by_type": by_type, "signals": signals,
+                "cached_queries": cached, "high_water": high_water, "complete": self.is_complete(),
+                "complete_end": self.complete_end(),
+                "age_s": round(age, 1) if age is not None else None, "fresh": self.is_fresh()}
+
+
+def main():
+    from evomap_client import EvoMapClient
+
+    parser = argparse.ArgumentParser(description="Local mirror of EvoMap Hub assets")
+    parser.add_argument("command", choices=["sync", "stats", "search"])
+    parser.add_argument("signals", nargs="?", help="search: comma-separated signals")
+    parser.add_argument("--full", action="store_true", help="sync: re-read the whole asset list")
+    parser.add_argument("--type", default="Capsule", help="search: asset type (default Capsule)")
+    parser.add_argument("--limit", type=int, default=10, help="search: max results")
+    parser.add_argument("--hub-url", default="https://evomap.ai")
+    args = parser.parse_args()
+
+    mirror = AssetMirror()
+    if args.command == "sync":
+        client = EvoMapClient(hub_url=args.hub_url)
+        result = mirror.sync(client, full=True if args.full else None)
+        kind = "Full" if result["full"] else "Incremental"
+        print(f"[EvoMap Mirror] {kind} sync: {result['scanned']} assets read, "
+              f"{result['changed']} new or changed, {result['removed']} removed ({result['elapsed_s']}s)")
+        if not result["complete"]:
+            print("[EvoMap Mirror] The Hub's list was not read to its end; queries will go to the Hub.")
+    elif args.command == "stats":
+        print(json.dumps(mirror.stats(), indent=2, ensure_ascii=False))
+    else:
+        client = EvoMapClient(hub_url=args.hub_url, mirror=mirror)
+        print(json.dumps(client.search_assets(args.signals, asset_type=args.type, limit=args.limit),
+                         indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Local ledger of bundles this node has published to the EvoMap Hub.
+
+Asset IDs are canonical content hashes, so a bundle whose Gene, Capsule and
+EvolutionEvent hash to the same IDs as a bundle the Hub already accepted is
+unchanged content. Entries are keyed by the bundle's sorted asset IDs, so two
+bundles sharing a Gene keep separate responses.
+
+EvoMapClient.publish() checks this ledger first and returns the recorded Hub
+response instead of sending the bundle again (unless force=True).
+
+The ledger lives next to the node identity (evomap_publish_ledger.db in the
+client's config_dir), so each node profile keeps its own history.
+
+Usage:
+    python3 publish_ledger.py [--config-dir DIR] [--limit 20]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+
+LEDGER_FILENAME = "evomap_publish_ledger.db"
+
+# Hub publish statuses that mean the bundle was taken in. Anything else (rejected,
+# quarantined, pending, unknown or missing) is re-sent on the next publish.
+ACCEPTED = {"accepted", "candidate", "promoted", "published"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bundles (
+    bundle_key   TEXT PRIMARY KEY,
+    asset_ids    TEXT NOT NULL,
+    asset_types  TEXT NOT NULL,
+    status       TEXT,
+    response     TEXT NOT NULL,
+    published_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS bundles_published_at ON bundles (published_at);
+"""
+
+
+def response_status(response):
+    """The Hub's status for a publish response (payload.status, or a top-level status)."""
+    if not isinstance(response, dict):
+        return None
+    payload = response.get("payload")
+    if isinstance(payload, dict) and payload.get("status"):
+        return payload["status"]
+    return response.get("status")
+
+
+def bundle_key(asset_ids):
+    return json.dumps(sorted(asset_ids))
+
+
+class PublishLedger:
+    """Published bundles and the Hub's responses. Safe to share between threads."""
+
+    def __init__(self, config_dir):
+        self.path = os.path.join(config_dir, LEDGER_FILENAME)
+        os.makedirs(config_dir, exist_ok=True)
+        self.db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.db.close()
+
+    def accepted_response(self, asset_ids):
+        """The recorded Hub response if this exact bundle was accepted before, otherwise None."""
+        with self._lock:
+            row = self.db.execute("SELECT status, response FROM bundles WHERE bundle_key = ?",
+                                  (bundle_key(asset_ids),)).fetchone()
+        if row is None or row["status"] not in ACCEPTED:
+            return None
+        return json.loads(row["response"])
+
+    def record(self, assets, response):
+        """Stores the Hub's response to a published bundle."""
+        asset_ids = [asset["asset_id"] for asset in assets]
+        with self._lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO bundles (bundle_key, asset_ids, asset_types, status, response, published_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (bundle_key(asset_ids), json.dumps(asset_ids), json.dumps([asset.get("type") for asset in assets]),
+                 response_status(response), json.dumps(response, ensure_ascii=False), time.time()))
+
+    def recent(self, limit=20):
+        with self._lock:
+            rows = self.db.execute(
+                "SELECT asset_ids, asset_types, status, published_at FROM bundles "
+                "ORDER BY published_at DESC LIMIT ?", (limit,)).fetchall()
+        return [dict(row, asset_ids=json.loads(row["asset_ids"]), asset_types=json.loads(row["asset_types"]))
+                for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List bundles this node has published")
+    parser.add_argument("--config-dir", default=os.path.dirname(os.path.abspath(__file__)),
+                        help="Node profile directory (default: this script's directory)")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    ledger = PublishLedger(args.config_dir)
+    for row in ledger.recent(args.limit):
+        when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(row["published_at"]))
+        print(f"{when}  {row['status'] or '-':<10}")
+        for asset_type, asset_id in zip(row["asset_types"], row["asset_ids"]):
+            print(f"    {asset_type or '-':<15} {asset_id}")
+
+
+if __name__ == "__main__":
+    main()
@@ -47,7 +47,11 @@ def main():
 
     try:
         response = client.publish(gene, capsule, event)
-        print("\n🎉 资产发布(Publish)请求完成！服务器返回状态:")
+        if response.get("skipped"):
+            # 内容哈希与上次被 Hub 接受的版本完全一致，本地账本直接返回上次的结果
+            print("\n⏭️ 资产内容未变化，Hub 已接受过该 Bundle，跳过重复发布。上次的返回状态:")
+        else:
+            print("\n🎉 资产发布(Publish)请求完成！服务器返回状态:")
         # 打印服务器针对该 Bundle 的入库响应
         payload = response.get("payload", {})
         print(f"[{payload.get('status')}] Bundle ID: {payload.get('bundle_id')}")
@@ -44,7 +44,11 @@ def main():
 
     try:
         response = client.publish(gene, capsule, event)
-        print("\n🎉 EvoMap 工具包资产发布完成！")
+        if response.get("skipped"):
+            # 内容哈希与上次被 Hub 接受的版本完全一致，本地账本直接返回上次的结果
+            print("\n⏭️ 资产内容未变化，Hub 已接受过该 Bundle，跳过重复发布。")
+        else:
+            print("\n🎉 EvoMap 工具包资产发布完成！")
         payload = response.get("payload", {})
         print(f"[{payload.get('status')}] Bundle ID: {payload.get('bundle_id')}")
     except Exception as e:
@@ -8,7 +8,7 @@ from urllib.parse import urljoin
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from evomap_client import EvoMapClient
 
-def query_node_details(node_id, hub_url="https://evomap.ai"):
+def query_node_details(node_id, hub_url="https://evomap.ai", limit=20, max_scan=5000):
     print(f"🔍 正在查询节点 {node_id} 的详情...\n")
     
     # 1. 组合网页专属直达链接
@@ -38,61 +38,58 @@ def query_node_details(node_id, hub_url="https://evomap.ai"):
     # 3. 遍历查询该节点名下发布的具体资产详情
     try:
         print(f"🗃️ 节点近期发布的资产详情:")
-        # 获取全网大量最新资产进行本地筛选
-        assets_res = requests.get(f"{hub_url}/a2a/assets", params={"limit": 5000})
-        if assets_res.status_code == 200:
-            data = assets_res.json()
-            # 兼容不同的数据格式，有的直接返回列表，有的包在 assets 字段里
-            assets_list = data.get("assets", []) if isinstance(data, dict) else data
-            
-            # 本地过滤出该 Node 的资产
-            node_assets = [a for a in assets_list if a.get("author") == node_id or a.get("sender_id") == node_id]
-            
-            if not node_assets:
-                # 可能是因为 Hub 还没刷新缓存，或者这个节点没有发过 Promoted 的资产
-                print("   (在最新的 100 条全网动态中未发现该节点的 promoted 资产)")
-            else:
-                for idx, asset in enumerate(node_assets, 1):
-                    asset_type = asset.get("asset_type", asset.get("type", "Unknown"))
-                    gdi = asset.get("gdi_score", "N/A")
-                    payload = asset.get("payload", {})
-                    summary = payload.get("summary", asset.get("nl_summary", "无摘要信息"))
-                    a_id = asset.get("asset_id", "Unknown")
-                    status = asset.get("status", "promoted")
-                    
-                    print(f"   [{idx}] 类型: {asset_type} (状态: {status} | GDI评分: {gdi})")
-                    print(f"       🔗 ID: {a_id}")
-                    # 显示完整摘要
-                    import textwrap
-                    wrapped_summary = "\n              ".join(textwrap.wrap(summary, width=65))
-                    print(f"       📝 摘要: {wrapped_summary}")
-                    
-                    # 针对不同类型的资产，展示里面最核心的实质内容文字
-                    if asset_type == "Gene":
-                        signals = payload.get("signals_match", [])
-                        cmds = payload.get("validation", [])
-                        print(f"       ⚡ 触发信号: {', '.join(signals)}")
-                        print(f"       🛡️ 验证指令: {', '.join(cmds)}")
-                    elif asset_type == "Capsule":
-                        triggers = payload.get("trigger", [])
-                        radius = payload.get("blast_radius", {})
-                        print(f"       ⚡ 触发器: {', '.join(triggers)}")
-                        print(f"       � 影响半径: 影响了 {radius.get('files', 0)} 个文件中的 {radius.get('lines', 0)} 行代码")
-                    elif asset_type == "EvolutionEvent":
-                        intent = payload.get("intent", "Unknown")
-                        outcome = payload.get("outcome", {})
-                        print(f"       🎯 进化意图: {intent}")
-                        print(f"       🏆 验证结果: {outcome.get('status')} (验证分: {outcome.get('score')})")
-                    
-                    print()
+        # 按作者分页拉取（Hub 支持时服务端过滤），凑够 limit 条就停止，不再一次下载全网 5000 条
+        client = EvoMapClient(hub_url=hub_url)
+        scan = {}
+        node_assets = list(client.iter_assets(author=node_id, max_items=limit, max_scan=max_scan, stats=scan))
+        if not node_assets:
+            # 可能是因为 Hub 还没刷新缓存，或者这个节点没有发过 Promoted 的资产
+            scope = f"全部 {scan['scanned']} 条" if scan["complete"] else f"最新的 {scan['scanned']} 条"
+            print(f"   (在{scope}全网资产中未发现该节点的资产)")
         else:
-            print(f"⚠️ 无法获取全网资产列表 (Status: {assets_res.status_code})")
+            for idx, asset in enumerate(node_assets, 1):
+                asset_type = asset.get("asset_type", asset.get("type", "Unknown"))
+                gdi = asset.get("gdi_score", "N/A")
+                payload = asset.get("payload", {})
+                summary = payload.get("summary", asset.get("nl_summary", "无摘要信息"))
+                a_id = asset.get("asset_id", "Unknown")
+                status = asset.get("status", "promoted")
+                
+                print(f"   [{idx}] 类型: {asset_type} (状态: {status} | GDI评分: {gdi})")
+                print(f"       🔗 ID: {a_id}")
+                # 显示完整摘要
+                import textwrap
+                wrapped_summary = "\n              ".join(textwrap.wrap(summary, width=65))
+                print(f"       📝 摘要: {wrapped_summary}")
+                
+                # 针对不同类型的资产，展示里面最核心的实质内容文字
+                if asset_type == "Gene":
+                    signals = payload.get("signals_match", [])
+                    cmds = payload.get("validation", [])
+                    print(f"       ⚡ 触发信号: {', '.join(signals)}")
+                    print(f"       🛡️ 验证指令: {', '.join(cmds)}")
+                elif asset_type == "Capsule":
+                    triggers = payload.get("trigger", [])
+                    radius = payload.get("blast_radius", {})
+                    print(f"       ⚡ 触发器: {', '.join(triggers)}")
+                    print(f"       � 影响半径: 影响了 {radius.get('files', 0)} 个文件中的 {radius.get('lines', 0)} 行代码")
+                elif asset_type == "EvolutionEvent":
+                    intent = payload.get("intent", "Unknown")
+                    outcome = payload.get("outcome", {})
+                    print(f"       🎯 进化意图: {intent}")
+                    print(f"       🏆 验证结果: {outcome.get('status')} (验证分: {outcome.get('score')})")
+                
+                print()
+    except requests.exceptions.HTTPError as e:
+        print(f"⚠️ 无法获取全网资产列表 (Status: {e.response.status_code})")
     except Exception as e:
         print(f"查询资产列表时出错: {e}")
 
 def main():
     parser = argparse.ArgumentParser(description="查询 EvoMap 上特定节点的资产和声望详情。")
     parser.add_argument("node_id", nargs="?", help="要查询的 Node ID (例如 node_68fbee77258f4c6c)。如果不传，则默认查询本地当前节点。")
+    parser.add_argument("--limit", type=int, default=20, help="最多展示该节点的多少条资产 (默认 20)")
+    parser.add_argument("--max-scan", type=int, default=5000, help="最多翻阅多少条全网资产后停止 (默认 5000)")
     args = parser.parse_args()
 
     target_node = args.node_id
@@ -108,7 +105,7 @@ def main():
             print("用法: python3 query_node.py <node_id>")
             sys.exit(1)
 
-    query_node_details(target_node)
+    query_node_details(target_node, limit=args.limit, max_scan=args.max_scan)
 
 if __name__ == "__main__":
     main()
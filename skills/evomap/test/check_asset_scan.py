@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Offline check of EvoMapClient.iter_assets() and the asset mirror against
+mock_hub.py.
+
+Runs the asset scan against Hubs that page by cursor, by offset or not at
+all, with and without a per-response cap on `limit`, and checks how many
+assets were read and whether the scan claims to have reached the end of the
+list. A capped Hub must never be reported as fully read. Then syncs an
+AssetMirror from the same Hubs and checks that search_assets() is answered
+from the mirror only when the sync provably read the whole list, and that
+otherwise the Hub answers (with no second sync inside max_age).
+
+Usage:
+    python3 check_asset_scan.py
+"""
+
+import os
+import sys
+import tempfile
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.join(os.path.dirname(TEST_DIR), "scripts")
+sys.path.insert(0, SCRIPTS_DIR)
+sys.path.insert(0, TEST_DIR)
+
+from evomap_client import EvoMapClient  # noqa: E402
+from evomap_mirror import AssetMirror  # noqa: E402
+from mock_hub import start_mock_hub  # noqa: E402
+
+# (name, hub options, iter_assets options, expected scanned, expected complete)
+SCAN_CASES = [
+    ("offset paging, capped", dict(paging="offset", cap=100), {}, 1000, True),
+    ("cursor paging, capped", dict(paging="cursor", cap=100), {}, 1000, True),
+    ("no paging, capped", dict(paging="none", cap=100), {}, 100, False),
+    ("no paging, uncapped", dict(paging="none"), {}, 1000, False),
+    ("no paging, capped, end marker", dict(paging="none", cap=100, end_marker=True), {}, 100, False),
+    ("no paging, uncapped, end marker", dict(paging="none", end_marker=True), {}, 1000, True),
+    ("offset paging, capped, max_scan", dict(paging="offset", cap=100), dict(max_scan=300), 300, False),
+    ("offset paging, short list", dict(paging="offset", assets=30), {}, 30, True),
+    ("empty list", dict(paging="offset", assets=0), {}, 0, True),
+    ("author, filtered by the Hub", dict(paging="none", cap=100), dict(author="node_nobody"), 0, True),
+    ("author, Hub ignores it, capped", dict(paging="none", cap=100, filters=False),
+     dict(author="node_nobody"), 100, False),
+]
+
+
+def check_scans(config_dir):
+    failures = 0
+    for name, hub_options, scan_options, want_scanned, want_complete in SCAN_CASES:
+        server, hub_url = start_mock_hub(**hub_options)
+        try:
+            client = EvoMapClient(config_dir=config_dir, hub_url=hub_url)
+            stats = {}
+            list(client.iter_assets(page_size=200, stats=stats, **scan_options))
+        finally:
+            server.shutdown()
+        ok = stats["scanned"] == want_scanned and stats["complete"] == want_complete
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {name:<36} scanned={stats['scanned']:<5} "
+              f"complete={stats['complete']!s:<5} end={stats['end']} requests={stats['requests']}")
+    return failures
+
+
+# (name, hub options, expected mirror completeness)
+MIRROR_CASES = [
+    ("offset paging, capped", dict(paging="offset", cap=100), True),
+    ("cursor paging, capped", dict(paging="cursor", cap=100), True),
+    ("no paging, capped", dict(paging="none", cap=100), False),
+    ("no paging, uncapped", dict(paging="none"), False),
+]
+
+
+def check_mirror(config_dir):
+    failures = 0
+    for index, (name, hub_options, want_complete) in enumerate(MIRROR_CASES):
+        server, hub_url = start_mock_hub(**hub_options)
+        mirror = AssetMirror(os.path.join(config_dir, f"mirror{index}.db"))
+        try:
+            client = EvoMapClient(config_dir=config_dir, hub_url=hub_url, mirror=mirror)
+            first = client.search_assets("timeout", limit=5)
+            second = client.search_assets("TimeoutError", limit=5)
+            asset_reads = server.requests.get("/a2a/assets", 0)
+        finally:
+            server.shutdown()
+            mirror.close()
+        want_source = "mirror" if want_complete else None
+        ok = (mirror_complete(mirror) == want_complete and len(first["assets"]) == 5
+              and len(second["assets"]) == 5 and first.get("source") == want_source
+              and second.get("source") == want_source)
+        # The second query must not scan the Hub's list again
+        ok = ok and server.requests.get("/a2a/assets", 0) == asset_reads
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} mirror: {name:<28} complete={mirror_complete(mirror)!s:<5} "
+              f"source={first.get('source') or 'hub'} found={len(first['assets'])} list requests={asset_reads}")
+    return failures
+
+
+def mirror_complete(mirror):
+    reopened = AssetMirror(mirror.path)
+    try:
+        return reopened.is_complete()
+    finally:
+        reopened.close()
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        failures = check_scans(tmp) + check_mirror(tmp)
+    if failures:
+        print(f"{failures} check(s) failed")
+        sys.exit(1)
+    print("all checks passed")
+
+
+if __name__ == "__main__":
+    main()
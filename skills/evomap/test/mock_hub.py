@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the EvoMap Hub's asset list (GET /a2a/assets), plus
+GET /a2a/assets/search (?signals=, substring match) and /a2a/assets/ranked
+(by GDI score) over the same assets.
+
+Serves a fixed list of --assets Capsules, newest first, with the paging
+behaviour of the Hub under test:
+    --paging cursor   {"assets": [...], "next_cursor": ...} (no cursor on the last page)
+    --paging offset   a bare list, honouring ?offset=
+    --paging none     {"assets": [...]} ignoring offset and cursor (the documented API)
+--cap clamps ?limit= to at most that many assets per response, as the public
+Hub does, --end-marker adds "has_more" and "total" to dict responses, and
+--no-filters ignores ?author= like a Hub without server-side filtering.
+Every 10th asset carries the signal "TimeoutError"; every 50th is authored by
+node_target. GET /_stats returns the request counts by path.
+
+Usage:
+    python3 mock_hub.py --port 8791 --paging none --cap 100
+
+In code:
+    server, hub_url = start_mock_hub(paging="offset", cap=100)
+    ...
+    server.shutdown()
+"""
+
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def make_assets(count):
+    return [{
+        "asset_id": f"sha256:{i:064x}",
+        "type": "Capsule",
+        "author": "node_target" if i % 50 == 7 else f"node_{i % 13}",
+        "status": "promoted",
+        "gdi_score": round(0.3 + (i % 70) / 100, 2),
+        "created_at": f"2026-01-01T00:00:00.{999999 - i:06d}Z",
+        "payload": {"summary": f"asset {i}",
+                    "trigger": ["TimeoutError"] if i % 10 == 3 else [f"signal_{i % 7}"]},
+    } for i in range(count)]
+
+
+class MockHub(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, assets=1000, paging="offset", cap=None, end_marker=False,
+                 filters=True):
+        super().__init__(address, HubHandler)
+        self.assets = make_assets(assets)
+        self.paging = paging
+        self.cap = cap
+        self.end_marker = end_marker
+        self.filters = filters
+        self.requests = {}
+        self.lock = threading.Lock()
+
+    def page(self, query):
+        items = self.assets
+        if self.filters and query.get("author"):
+            items = [a for a in items if a["author"] == query["author"]]
+        limit = int(query.get("limit", 100))
+        if self.cap:
+            limit = min(limit, self.cap)
+        start = 0
+        if self.paging == "cursor":
+            start = int(query.get("cursor") or 0)
+        elif self.paging == "offset":
+            start = int(query.get("offset") or 0)
+        chunk = items[start:start + limit]
+        if self.paging == "offset":
+            return chunk
+        body = {"assets": chunk}
+        more = start + limit < len(items)
+        if self.paging == "cursor":
+            body["next_cursor"] = str(start + limit) if more else None
+        if self.end_marker:
+            body["has_more"] = more
+            body["total"] = len(items)
+        return body
+
+    def search(self, query):
+        limit = int(query.get("limit", 10))
+        wanted = [s.strip().lower() for s in query.get("signals", "").split(",") if s.strip()]
+        found = [a for a in self.assets
+                 if a["type"] == query.get("type", "Capsule")
+                 and any(w in t.lower() for w in wanted for t in a["payload"]["trigger"])]
+        return {"assets": found[:limit]}
+
+    def ranked(self, query):
+        limit = int(query.get("limit", 10))
+        found = [a for a in self.assets if a["type"] == query.get("type", "Capsule")]
+        return {"assets": sorted(found, key=lambda a: -a["gdi_score"])[:limit]}
+
+
+class HubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/_stats":
+            return self._send({"requests": self.server.requests})
+        routes = {"/a2a/assets": self.server.page, "/a2a/assets/search": self.server.search,
+                  "/a2a/assets/ranked": self.server.ranked}
+        if url.path not in routes:
+            return self._send({"error": "not found"}, 404)
+        with self.server.lock:
+            self.server.requests[url.path] = self.server.requests.get(url.path, 0) + 1
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        self._send(routes[url.path](query))
+
+    def _send(self, body, status=200):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_mock_hub(port=0, **options):
+    """Starts a MockHub on a background thread; returns (server, hub_url)."""
+    server = MockHub(("127.0.0.1", port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local EvoMap Hub asset list")
+    parser.add_argument("--port", type=int, default=8791)
+    parser.add_argument("--assets", type=int, default=1000)
+    parser.add_argument("--paging", choices=("cursor", "offset", "none"), default="offset")
+    parser.add_argument("--cap", type=int, default=None, help="Max assets per response")
+    parser.add_argument("--end-marker", action="store_true", help="Add has_more/total to responses")
+    parser.add_argument("--no-filters", action="store_true", help="Ignore ?author=")
+    args = parser.parse_args()
+
+    server = MockHub(("127.0.0.1", args.port), args.assets, args.paging, args.cap, args.end_marker,
+                     not args.no_filters)
+    print(f"Mock Hub on http://127.0.0.1:{args.port} ({args.assets} assets, paging={args.paging}, "
+          f"cap={args.cap or 'none'})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.10"
+# dependencies = [
+#     "requests>=2.31.0",
+# ]
+# ///
+"""
+DashScope async tasks: submit many image/video jobs, poll them all from one loop.
+
+Jobs are submitted in async-task mode (X-DashScope-Async: enable), which
+returns a task ID immediately. A single TaskScheduler thread then polls every
+outstanding task via GET /api/v1/tasks/{task_id}. Instead of a fixed interval
+each task's next poll is planned from the running average (EWMA) of how long
+tasks of the same kind and model actually took: a task is left alone for the
+first half of its expected run time, polled more often as it approaches the
+expected finish, and backed off geometrically once it is overdue. Results are
+handed back the moment a poll sees them finish, so N concurrent tasks cost one
+process and far fewer status requests than N fixed-interval pollers.
+
+Usage:
+    python3 dashscope_tasks.py --jobs jobs.jsonl [--timeout 600]
+
+    {"kind": "video", "prompt": "...", "img_url": "https://...", "model": "wan2.6-i2v-flash", "duration": 5}
+    {"kind": "image", "prompt": "...", "model": "qwen-image-plus", "size": "1328*1328"}
+
+    Prints one JSON result line per job as it finishes, followed by MEDIA_URL:.
+
+In code:
+    scheduler = TaskScheduler(api_key)
+    for job in jobs:
+        scheduler.add(submit_video_task(scheduler.session, api_key, job["prompt"], job["img_url"]),
+                      kind="video", model="wan2.6-i2v-flash", meta=job)
+    for result in scheduler.as_completed():
+        print(result["task_id"], result["status"], result["url"])
+
+Environment:
+    DASHSCOPE_API_KEY    API key
+    DASHSCOPE_BASE_URL   API base URL (default https://dashscope.aliyuncs.com)
+"""
+
+import argparse
+import heapq
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Shared cross-process rate limit for DASHSCOPE_API_KEY (optional: skills/api-quota)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "api-quota", "scripts"))
+try:
+    import api_quota
+except ImportError:
+    api_quota = None
+
+DASHSCOPE_BASE_URL = os.environ.get("DASHSCOPE_BASE_URL", "https://dashscope.aliyuncs.com").rstrip("/")
+IMAGE_SYNTHESIS_URL = f"{DASHSCOPE_BASE_URL}/api/v1/services/aigc/text2image/image-synthesis"
+VIDEO_SYNTHESIS_URL = f"{DASHSCOPE_BASE_URL}/api/v1/services/aigc/video-generation/video-synthesis"
+TASK_URL = f"{DASHSCOPE_BASE_URL}/api/v1/tasks/{{task_id}}"
+
+SUBMIT_TIMEOUT = 30
+RATE_LIMIT_RETRIES = 3
+POLL_TIMEOUT = 15
+MIN_POLL_INTERVAL = 1.0
+MAX_POLL_INTERVAL = 15.0
+OVERDUE_BACKOFF = 1.5
+EWMA_ALPHA = 0.3
+# Starting guesses for the expected run time until real completions are observed
+INITIAL_ESTIMATE = {"image": 15.0, "video": 120.0}
+
+FINAL_STATUSES = {"SUCCEEDED", "FAILED", "CANCELED", "UNKNOWN"}
+
+
+class TaskError(Exception):
+    """Submitting or polling a task failed (HTTP error, API error code, bad response)."""
+
+    def __init__(self, message, retry_after=None, status=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status = status
+
+
+def create_session(pool_size=10):
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _headers(api_key, async_task=False):
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {api_key}"
+    }
+    if async_task:
+        headers["X-DashScope-Async"] = "enable"
+    return headers
+
+
+def _retry_after(response):
+    try:
+        return float(response.headers.get("Retry-After", ""))
+    except ValueError:
+        return None
+
+
+def _request(session, method, url, api_key, timeout, **kwargs):
+    """One API call; returns the decoded body or raises TaskError."""
+    import requests
+
+    try:
+        response = session.request(method, url, headers=_headers(api_key, method == "POST"),
+                                   timeout=timeout, **kwargs)
+    except requests.exceptions.RequestException as e:
+        raise TaskError(f"{type(e).__name__}: {e}")
+    try:
+        body = response.json()
+    except ValueError:
+        body = {}
+    if response.status_code != 200:
+        message = body.get("message") or response.text[:200]
+        raise TaskError(f"HTTP {response.status_code}: {message}", _retry_after(response), response.status_code)
+    if body.get("code") and not body.get("output"):
+        raise TaskError(f"API Error: {body.get('code')} - {body.get('message', 'Unknown error')}")
+    return body
+
+
+def submit_task(session, api_key, url, payload):
+    """Submit one async task and return its task ID.
+
+    Submissions go through the shared api_quota ledger when it is installed; a
+    429 blocks every process for its Retry-After and the submit is retried.
+    """
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        if api_quota is not None:
+            try:
+                api_quota.acquire("dashscope")
+            except api_quota.QuotaExceeded as e:
+                raise TaskError(str(e), e.retry_after)
+        try:
+            body = _request(session, "POST", url, api_key, SUBMIT_TIMEOUT, json=payload)
+            break
+        except TaskError as e:
+            if e.status != 429 or attempt == RATE_LIMIT_RETRIES:
+                raise
+            if api_quota is not None:
+                api_quota.penalize("dashscope", e.retry_after)
+            else:
+                time.sleep(e.retry_after or 2 ** attempt)
+    task_id = (body.get("output") or {}).get("task_id")
+    if not task_id:
+        raise TaskError(f"No task_id in response: {json.dumps(body, ensure_ascii=False)[:200]}")
+    return task_id
+
+
+def submit_image_task(session, api_key, prompt, model="qwen-image-plus", size="1328*1328",
+                      negative_prompt=None, prompt_extend=True, watermark=False):
+    parameters = {"size": size, "n": 1, "prompt_extend": prompt_extend, "watermark": watermark}
+    payload = {"model": model, "input": {"prompt": prompt}, "parameters": parameters}
+    if negative_prompt:
+        payload["input"]["negative_prompt"] = negative_prompt
+    return submit_task(session, api_key, IMAGE_SYNTHESIS_URL, payload)
+
+
+def submit_video_task(session, api_key, prompt, img_url=None, model="wan2.6-i2v-flash", duration=5):
+    payload = {"model": model, "input": {"prompt": prompt}, "parameters": {"duration": duration}}
+    if img_url:
+        payload["input"]["img_url"] = img_url
+    return submit_task(session, api_key, VIDEO_SYNTHESIS_URL, payload)
+
+
+def fetch_task(session, api_key, task_id):
+    """Current task output: task_status plus, once finished, video_url/results or code/message."""
+    body = _request(session, "GET", TASK_URL.format(task_id=task_id), api_key, POLL_TIMEOUT)
+    output = body.get("output") or {}
+    if body.get("usage"):
+        output["usage"] = body["usage"]
+    return output
+
+
+def result_url(output):
+    """Media URL of a finished task (video_url for video, first results[].url for images)."""
+    if output.get("video_url"):
+        return output["video_url"]
+    for item in output.get("results") or []:
+        if item.get("url"):
+            return item["url"]
+    return None
+
+
+# ========== Scheduler ==========
+
+class _Task:
+    __slots__ = ("task_id", "kind", "model", "meta", "submitted", "deadline",
+                 "polls", "overdue_polls", "status", "done", "result")
+
+    def __init__(self, task_id, kind, model, meta, submitted, deadline):
+        self.task_id = task_id
+        self.kind = kind
+        self.model = model
+        self.meta = meta
+        self.submitted = submitted
+        self.deadline = deadline
+        self.polls = 0
+        self.overdue_polls = 0
+        self.status = "PENDING"
+        self.done = threading.Event()
+        self.result = None
+
+
+class TaskScheduler:
+    """Polls many DashScope tasks from one thread with completion-time-aware backoff.
+
+    Thread-safe: add() and wait() may be called from any thread while the loop
+    runs. Finished tasks come out of as_completed() in completion order.
+    """
+
+    def __init__(self, api_key, session=None, poll_workers=4, timeout=600,
+                 min_interval=MIN_POLL_INTERVAL, max_interval=MAX_POLL_INTERVAL, estimates=None):
+        """`estimates` seeds expected run times: {(kind, model): seconds}."""
+        self.api_key = api_key
+        self.session = session or create_session(pool_size=poll_workers + 4)
+        self.timeout = timeout
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.polls = 0
+        self._estimates = dict(estimates or {})
+        self._tasks = {}
+        self._heap = []  # (next poll time, seq, task_id)
+        self._seq = 0
+        self._outstanding = 0
+        self._finished = queue.SimpleQueue()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._pool = ThreadPoolExecutor(max_workers=poll_workers, thread_name_prefix="dashscope-poll")
+        self._thread = threading.Thread(target=self._loop, name="dashscope-scheduler", daemon=True)
+        self._thread.start()
+
+    # ----- estimates -----
+
+    def expected_duration(self, kind, model):
+        """EWMA of observed submit-to-finish seconds for this kind/model."""
+        with self._cond:
+            return self._estimates.get((kind, model), INITIAL_ESTIMATE.get(kind, 30.0))
+
+    def _observe(self, kind, model, seconds):
+        key = (kind, model)
+        with self._cond:
+            previous = self._estimates.get(key)
+            self._estimates[key] = seconds if previous is None else (
+                EWMA_ALPHA * seconds + (1 - EWMA_ALPHA) * previous)
+
+    def _next_delay(self, task, now):
+        expected = self._estimates.get((task.kind, task.model), INITIAL_ESTIMATE.get(task.kind, 30.0))
+        remaining = task.submitted + expected - now
+        if remaining > 0:
+            # Converge on the expected finish: sleep half the remaining time.
+            delay = remaining / 2
+        else:
+            delay = expected * 0.1 * OVERDUE_BACKOFF ** task.overdue_polls
+            task.overdue_polls += 1
+        return min(self.max_interval, max(self.min_interval, delay))
+
+    # ----- public API -----
+
+    def add(self, task_id, kind="video", model="", meta=None, timeout=None, age=0.0):
+        """Start tracking a submitted task (`age`: seconds since it was submitted, for re-attached tasks)."""
+        now = time.monotonic()
+        task = _Task(task_id, kind, model, meta, now - age, now + (timeout or self.timeout))
+        with self._cond:
+            self._tasks[task_id] = task
+            self._outstanding += 1
+            self._schedule(task, now + self._next_delay(task, now))
+            self._cond.notify()
+        return task_id
+
+    def wait(self, task_id, timeout=None):
+        """Block until `task_id` finishes and return its result dict (None on timeout)."""
+        with self._cond:
+            task = self._tasks[task_id]
+        task.done.wait(timeout)
+        return task.result
+
+    def as_completed(self, timeout=None):
+        """Yield result dicts as tasks finish, until every added task has been yielded."""
+        end = time.monotonic() + timeout if timeout else None
+        while True:
+            with self._cond:
+                if self._outstanding == 0 and self._finished.empty():
+                    return
+            try:
+                remaining = None if end is None else max(0.0, end - time.monotonic())
+                result = self._finished.get(timeout=remaining)
+            except queue.Empty:
+                return
+            with self._cond:
+                self._outstanding -= 1
+            yield result
+
+    def stats(self):
+        with self._cond:
+            return {
+                "tracked": len(self._tasks),
+                "outstanding": self._outstanding,
+                "polls": self.polls,
+                "estimates": {f"{k}/{m}": round(v, 1) for (k, m), v in self._estimates.items()},
+            }
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self._pool.shutdown(wait=True)
+
+    # ----- loop -----
+
+    def _schedule(self, task, when):
+        self._seq += 1
+        heapq.heappush(self._heap, (when, self._seq, task.task_id))
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._closed and (not self._heap or self._heap[0][0] > time.monotonic()):
+                    self._cond.wait(None if not self._heap else self._heap[0][0] - time.monotonic())
+                if self._closed:
+                    return
+                now = time.monotonic()
+                due = []
+                while self._heap and self._heap[0][0] <= now:
+                    due.append(self._tasks[heapq.heappop(self._heap)[2]])
+            for task in due:
+                self._pool.submit(self._poll, task)
+
+    def _poll(self, task):
+        now = time.monotonic()
+        if now >= task.deadline:
+            self._finish(task, "TIMEOUT", {"message": f"no result after {self.timeout}s"})
+            return
+        try:
+            output = fetch_task(self.session, self.api_key, task.task_id)
+        except TaskError as e:
+            with self._cond:
+                self.polls += 1
+                task.polls += 1
+            if e.status and 400 <= e.status < 500 and e.status != 429:
+                # 401/403/404 won't change on retry: fail now instead of at the deadline
+                self._finish(task, "FAILED", {"code": "PollError", "message": str(e)})
+                return
+            with self._cond:
+                delay = e.retry_after or min(self.max_interval, self.min_interval * 2 ** min(task.polls, 4))
+                self._schedule(task, time.monotonic() + delay)
+                self._cond.notify()
+            return
+
+        status = output.get("task_status", "UNKNOWN")
+        with self._cond:
+            self.polls += 1
+            task.polls += 1
+            task.status = status
+        if status in FINAL_STATUSES:
+            if status == "SUCCEEDED":
+                self._observe(task.kind, task.model, time.monotonic() - task.submitted)
+            self._finish(task, status, output)
+            return
+        with self._cond:
+            now = time.monotonic()
+            self._schedule(task, now + self._next_delay(task, now))
+            self._cond.notify()
+
+    def _finish(self, task, status, output):
+        task.status = status
+        task.result = {
+            "task_id": task.task_id,
+            "kind": task.kind,
+            "model": task.model,
+            "status": status,
+            "url": result_url(output) if status == "SUCCEEDED" else None,
+            "error": None if status == "SUCCEEDED" else (
+                f"{output.get('code', status)}: {output.get('message', '')}".strip(": ")),
+            "elapsed_s": round(time.monotonic() - task.submitted, 2),
+            "polls": task.polls,
+            "output": output,
+            "meta": task.meta,
+        }
+        task.done.set()
+        self._finished.put(task.result)
+
+
+# ========== CLI ==========
+
+def submit_job(session, api_key, job):
+    """Submit one job dict from a --jobs file; returns (task_id, kind, model)."""
+    kind = job.get("kind", "video")
+    if kind == "image":
+        model = job.get("model", "qwen-image-plus")
+        task_id = submit_image_task(session, api_key, job["prompt"], model, job.get("size", "1328*1328"),
+                                    job.get("negative_prompt"), job.get("prompt_extend", True),
+                                    job.get("watermark", False))
+    elif kind == "video":
+        model = job.get("model", "wan2.6-i2v-flash")
+        task_id = submit_video_task(session, api_key, job["prompt"], job.get("img_url"),
+                                    model, job.get("duration", 5))
+    else:
+        raise TaskError(f"unknown kind: {kind}")
+    return task_id, kind, model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Submit and poll DashScope async tasks")
+    parser.add_argument("--jobs", "-j", required=True, help="JSONL file, one job per line")
+    parser.add_argument("--timeout", "-t", type=float, default=600, help="Per-task timeout in seconds (default: 600)")
+    parser.add_argument("--api-key", "-k", help="DashScope API key (overrides DASHSCOPE_API_KEY env var)")
+    args = parser.parse_args()
+
+    api_key = args.api_key or os.environ.get("DASHSCOPE_API_KEY")
+    if not api_key:
+        print("Error: DASHSCOPE_API_KEY environment variable not set", file=sys.stderr)
+        sys.exit(1)
+
+    with open(args.jobs, encoding="utf-8") as f:
+        jobs = [json.loads(line) for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+    scheduler = TaskScheduler(api_key, timeout=args.timeout)
+    failed = 0
+    started = time.monotonic()
+    for index, job in enumerate(jobs):
+        try:
+            task_id, kind, model = submit_job(scheduler.session, api_key, job)
+        except (TaskError, KeyError) as e:
+            failed += 1
+            print(json.dumps({"index": index, "status": "SUBMIT_FAILED", "error": str(e)}, ensure_ascii=False), flush=True)
+            continue
+        scheduler.add(task_id, kind, model, meta={"index": index, **job})
+    print(f"Submitted {len(jobs) - failed}/{len(jobs)} tasks", file=sys.stderr)
+
+    for result in scheduler.as_completed():
+        record = {k: v for k, v in result.items() if k != "output"}
+        print(json.dumps(record, ensure_ascii=False), flush=True)
+        if result["url"]:
+            print(f"MEDIA_URL: {result['url']}", flush=True)
+        else:
+            failed += 1
+
+    stats = scheduler.stats()
+    scheduler.close()
+    print(f"Done in {time.monotonic() - started:.1f}s: {len(jobs) - failed} succeeded, {failed} failed, "
+          f"{stats['polls']} status requests", file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Content-addressed cache for generated media, with cross-process single-flight.
+
+A generation is identified by the SHA-256 of its canonical request parameters
+(model, prompt, size, negative prompt, flags...: JSON with sorted keys, strings
+NFC-normalized and stripped), so re-running a script with the same request is
+answered from disk instead of paying for a new generation.
+
+Layout under CACHE_DIR:
+    ab/abcdef.../output.png   the generated file (absent for URL-only entries)
+    ab/abcdef.../meta.json    params, source URL, size, sha256, created
+    locks/abcdef....lock      flock()ed while that key is being generated
+
+Entries with a file are served until evicted (least recently used first once
+the cache exceeds QWEN_MEDIA_CACHE_MB). DashScope result URLs expire after
+about a day, so an entry's "url" is only handed out for URL_TTL seconds; after
+that get() returns it with url=None and url_expired=True (file entries), or
+not at all (URL-only entries).
+
+Single-flight: a caller that misses takes an exclusive flock on the key's lock
+file before generating; an identical request in another process (or thread)
+blocks on the same lock and then finds the finished entry instead of starting
+a duplicate generation. On platforms without fcntl the lock is skipped.
+
+Usage:
+    python3 gen_cache.py stats
+    python3 gen_cache.py clear
+
+Environment:
+    QWEN_MEDIA_CACHE_DIR   cache directory (default <openclaw>/.openclaw/media_cache)
+    QWEN_MEDIA_CACHE_MB    size cap in MB (default 1024)
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import unicodedata
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process single-flight
+    fcntl = None
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+OPENCLAW_ROOT = os.environ.get("OPENCLAW_HOME", os.path.dirname(os.path.dirname(os.path.dirname(SCRIPT_DIR))))
+CACHE_DIR = Path(os.environ.get("QWEN_MEDIA_CACHE_DIR", os.path.join(OPENCLAW_ROOT, ".openclaw", "media_cache")))
+CACHE_MAX_BYTES = int(os.environ.get("QWEN_MEDIA_CACHE_MB", "1024")) * 1024 * 1024
+URL_TTL = 20 * 3600
+
+
+def _canonical(value):
+    if isinstance(value, str):
+        return unicodedata.normalize("NFC", value).strip()
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items() if v is not None}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    return value
+
+
+def cache_key(params):
+    """SHA-256 hex digest of the canonical JSON form of `params`."""
+    canonical = json.dumps(_canonical(params), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class GenerationCache:
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+
+    def _entry_dir(self, key):
+        return self.directory / key[:2] / key
+
+    # ----- lookup -----
+
+    def get(self, key, need_file=True, need_url=False):
+        """
+        Cached entry for `key` (meta dict with "path" if a file is stored), or None.
+        "url" is None once the DashScope URL is past URL_TTL; need_url skips such entries.
+        """
+        entry_dir = self._entry_dir(key)
+        meta_path = entry_dir / "meta.json"
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get("url") and time.time() - meta.get("created", 0) > URL_TTL:
+            meta.update(url=None, url_expired=True)
+        name = meta.get("file")
+        if name:
+            path = entry_dir / name
+            try:
+                if path.stat().st_size != meta.get("size"):
+                    return None
+            except OSError:
+                return None
+            meta["path"] = str(path)
+        elif need_file or not meta.get("url"):
+            return None
+        if need_url and not meta.get("url"):
+            return None
+        try:
+            os.utime(meta_path)  # LRU
+        except OSError:
+            pass
+        return meta
+
+    # ----- store -----
+
+    def put(self, key, params, url=None, source=None, extra=None):
+        """Record a generation; `source` (a file) is moved into the cache. Returns the entry."""
+        entry_dir = self._entry_dir(key)
+        entry_dir.mkdir(parents=True, exist_ok=True)
+        meta = {"key": key, "params": params, "url": url, "created": time.time(), **(extra or {})}
+        if source:
+            source = Path(source)
+            name = "output" + (source.suffix or ".bin")
+            target = entry_dir / name
+            os.replace(source, target)
+            meta.update(file=name, size=target.stat().st_size, sha256=_file_sha256(target))
+        fd, tmp = tempfile.mkstemp(dir=entry_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, entry_dir / "meta.json")
+        if source:
+            meta["path"] = str(entry_dir / meta["file"])
+            self._evict()
+        return meta
+
+    def staging_path(self, key, suffix):
+        """A temp path on the cache's filesystem to download into before put()."""
+        entry_dir = self._entry_dir(key)
+        entry_dir.mkdir(parents=True, exist_ok=True)
+        return entry_dir / f"incoming-{os.getpid()}-{time.monotonic_ns()}{suffix}"
+
+    def materialize(self, entry, dest):
+        """Copy a cached file to `dest` atomically and return the resolved path."""
+        dest = Path(dest)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=dest.parent, prefix=f".{dest.name}.", suffix=".tmp")
+        os.close(fd)
+        shutil.copyfile(entry["path"], tmp)
+        os.replace(tmp, dest)
+        return dest.resolve()
+
+    # ----- single-flight -----
+
+    def acquire(self, key):
+        """Take the key's generation lock (blocks while another caller holds it); returns a handle."""
+        if fcntl is None:
+            return None
+        lock_dir = self.directory / "locks"
+        lock_dir.mkdir(parents=True, exist_ok=True)
+        handle = open(lock_dir / f"{key}.lock", "a+")
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        return handle
+
+    def release(self, handle):
+        if handle is not None:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+            handle.close()
+
+    @contextmanager
+    def single_flight(self, key):
+        handle = self.acquire(key)
+        try:
+            yield
+        finally:
+            self.release(handle)
+
+    # ----- maintenance -----
+
+    def _entries(self):
+        if not self.directory.exists():
+            return []
+        entries = []
+        for meta_path in self.directory.glob("??/*/meta.json"):
+            try:
+                size = sum(p.stat().st_size for p in meta_path.parent.iterdir())
+                entries.append((meta_path.stat().st_mtime, size, meta_path.parent))
+            except OSError:
+                continue
+        return entries
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits max_bytes."""
+        entries = sorted(self._entries(), reverse=True)
+        total = 0
+        for _, size, entry_dir in entries:
+            total += size
+            if total > self.max_bytes:
+                shutil.rmtree(entry_dir, ignore_errors=True)
+
+    def stats(self):
+        entries = self._entries()
+        return {"directory": str(self.directory), "entries": len(entries),
+                "bytes": sum(size for _, size, _ in entries), "max_bytes": self.max_bytes}
+
+    def clear(self):
+        for child in self.directory.glob("??"):
+            shutil.rmtree(child, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generated media cache")
+    parser.add_argument("command", choices=["stats", "clear"])
+    args = parser.parse_args()
+
+    cache = GenerationCache()
+    if args.command == "clear":
+        cache.clear()
+        print(f"Cleared {cache.directory}")
+    else:
+        print(json.dumps(cache.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,33 @@ Generate images using Qwen Image API (Alibaba Cloud DashScope).
 
 Usage:
     uv run generate_image.py --prompt "your image description" --filename "output.png" [--model qwen-image-max|qwen-image-turbo] [--size 1664*928|1024*1024|720*1280|1280*720] [--api-key KEY]
+
+Batch mode (one JSON object per line; keys override the command-line defaults):
+    uv run generate_image.py --batch prompts.jsonl --out-dir /tmp/campaign --concurrency 4
+
+    {"prompt": "...", "id": "hero", "size": "1024*1024"}
+    {"prompt": "...", "filename": "/tmp/campaign/banner.png", "model": "qwen-image-turbo"}
+
+    Per-item keys: prompt (required), id, filename, model, size, negative_prompt,
+    prompt_extend, watermark. Generations run on --concurrency workers over one
+    shared HTTP session; downloads run on a separate pool so a slow download
+    never holds up the next submission. Each item prints one JSON result line
+    (in completion order, failures included) followed by its MEDIA:/MEDIA_URL:
+    line. Exit status is 1 if any item failed.
+
+Cache: results are kept in a content-addressed cache (gen_cache.py) keyed by
+the full request (model, prompt, size, negative prompt, flags), so repeating a
+request reuses the earlier image instead of generating a new one; identical
+requests running at the same time wait for a single generation. --fresh
+skips the lookup and always generates (the new result replaces the entry).
+
+Model choice: every generation's latency and outcome is recorded in the model
+ledger (model_ledger.py). --model auto picks the best model whose recent p95
+latency fits --deadline SECONDS (or simply the best healthy model without one).
+
+--variants additionally renders delivery-sized WebP/JPEG previews and a
+thumbnail of every saved image (media_variants.py, needs ffmpeg), each printed
+as its own MEDIA: line.
 """
 
 import argparse
@@ -17,8 +44,41 @@ import os
 import sys
 import json
 import base64
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import media_download
+import media_variants
+from gen_cache import GenerationCache, cache_key
+from model_ledger import ModelLedger, describe_choice
+
+# Shared cross-process rate limit for DASHSCOPE_API_KEY (optional: skills/api-quota)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "api-quota", "scripts"))
+try:
+    import api_quota
+except ImportError:
+    api_quota = None
+
+DASHSCOPE_BASE_URL = os.environ.get("DASHSCOPE_BASE_URL", "https://dashscope.aliyuncs.com").rstrip("/")
+GENERATION_URL = f"{DASHSCOPE_BASE_URL}/api/v1/services/aigc/multimodal-generation/generation"
+GENERATION_TIMEOUT = 120
+DOWNLOAD_TIMEOUT = 30
+RATE_LIMIT_RETRIES = 3
+
+MODELS = ["qwen-image-max", "qwen-image-turbo", "qwen-image-plus-2026-01-09"]
+SIZES = ["1664*928", "1024*1024", "720*1280", "1280*720"]
+DEFAULT_NEGATIVE_PROMPT = "低分辨率，低画质，肢体畸形，手指畸形，画面过饱和，蜡像感，人脸无细节，过度光滑，画面具有AI感。构图混乱。文字模糊，扭曲。"
+
+
+class GenerationError(Exception):
+    """The API answered, but not with an image (error code, or no image URL)."""
+
+    def __init__(self, message, result=None):
+        super().__init__(message)
+        self.result = result
+
 
 def get_api_key(provided_key: str | None) -> str | None:
     """Get API key from argument first, then environment."""
@@ -27,34 +87,377 @@ def get_api_key(provided_key: str | None) -> str | None:
     return os.environ.get("DASHSCOPE_API_KEY")
 
 
+def create_session(pool_size=10):
+    """One requests.Session for all API calls and downloads, with a pool large enough to share."""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def build_payload(prompt, model="qwen-image-max", size="1664*928",
+                  negative_prompt=DEFAULT_NEGATIVE_PROMPT, prompt_extend=True, watermark=False):
+    """Request body for the multimodal-generation endpoint."""
+    return {
+        "model": model,
+        "input": {
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "text": prompt
+                        }
+                    ]
+                }
+            ]
+        },
+        "parameters": {
+            "negative_prompt": negative_prompt,
+            "prompt_extend": prompt_extend,
+            "watermark": watermark,
+            "size": size
+        }
+    }
+
+
+def generate_one(session, api_key, payload, timeout=GENERATION_TIMEOUT, ledger=None):
+    """Run one synchronous generation and return the image URL.
+
+    Raises requests.exceptions.RequestException for transport/HTTP errors and
+    GenerationError when the response carries no image. With a `ledger`
+    (model_ledger.ModelLedger) the outcome and latency are recorded.
+
+    Calls are paced by the shared api_quota ledger when it is installed; a 429
+    blocks every process for its Retry-After and the call is retried.
+    """
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        if api_quota is not None:
+            api_quota.acquire("dashscope")
+        started = time.monotonic()
+        try:
+            image_url = _generate(session, api_key, payload, timeout)
+        except Exception as e:
+            response = getattr(e, "response", None)
+            if getattr(response, "status_code", None) == 429 and attempt < RATE_LIMIT_RETRIES:
+                retry_after = _retry_after(response)
+                if api_quota is not None:
+                    api_quota.penalize("dashscope", retry_after)
+                else:
+                    time.sleep(retry_after or 2 ** attempt)
+                continue
+            if ledger is not None and getattr(response, "status_code", None) != 429:
+                ledger.record(payload["model"], "image", "failed", time.monotonic() - started,
+                              error=str(e)[:200])
+            raise
+        if ledger is not None:
+            ledger.record(payload["model"], "image", "ok", time.monotonic() - started, url=image_url)
+        return image_url
+
+
+def _retry_after(response):
+    try:
+        return float(response.headers.get("Retry-After", ""))
+    except ValueError:
+        return None
+
+
+def _generate(session, api_key, payload, timeout):
+    response = session.post(
+        GENERATION_URL,
+        headers={
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}"
+        },
+        json=payload,
+        timeout=timeout,
+        verify=True
+    )
+    response.raise_for_status()
+    result = response.json()
+
+    # Check for errors
+    if result.get("code"):
+        raise GenerationError(f"API Error: {result.get('message', 'Unknown error')}", result)
+
+    # Extract image URL from first choice
+    choices = result.get("output", {}).get("choices", [])
+    if not choices:
+        raise GenerationError("Error: No choices in response", result)
+
+    content = choices[0].get("message", {}).get("content", [])
+    if not content or not content[0].get("image"):
+        raise GenerationError("Error: No image URL in response", result)
+
+    return content[0]["image"]
+
+
+def download(session, url, output_path, verify=True, timeout=DOWNLOAD_TIMEOUT):
+    """Download `url` to `output_path` (streamed, resumable, atomic) and return the resolved path."""
+    return media_download.download(url, output_path, session=session, verify=verify,
+                                   timeout=(10, timeout))
+
+
+def cache_params(payload):
+    """Everything that determines the output image (the cache key input)."""
+    return {"endpoint": "multimodal-generation", **payload}
+
+
+def cache_lookup(cache, key, need_file, fresh):
+    return None if fresh else cache.get(key, need_file=need_file)
+
+
+def generate_cached(session, api_key, payload, cache, filename=None, verify=True, fresh=False, ledger=None):
+    """
+    generate_one + download through the cache. Returns (image URL, saved path or None, cache hit).
+    Without `filename`, a hit whose URL has expired returns (None, the cached file's path, True).
+    """
+    params = cache_params(payload)
+    key = cache_key(params)
+    need_file = bool(filename)
+    entry = cache_lookup(cache, key, need_file, fresh)
+    hit = entry is not None
+    if not hit:
+        lock = cache.acquire(key)
+        try:
+            # An identical request may have finished while we waited for the lock.
+            entry = cache_lookup(cache, key, need_file, fresh)
+            hit = entry is not None
+            if not hit:
+                image_url = generate_one(session, api_key, payload, ledger=ledger)
+                staging = None
+                if need_file:
+                    staging = cache.staging_path(key, Path(filename).suffix or ".png")
+                    download(session, image_url, staging, verify=verify)
+                    if ledger is not None:
+                        ledger.record_output(image_url, staging.stat().st_size)
+                entry = cache.put(key, params, url=image_url, source=staging)
+        finally:
+            cache.release(lock)
+    if need_file:
+        path = cache.materialize(entry, filename)
+    else:
+        path = None if entry["url"] else entry["path"]
+    return entry["url"], path, hit
+
+
+# ========== Batch mode ==========
+
+def load_batch(path, args):
+    """Read the JSONL batch file into item dicts with command-line defaults filled in."""
+    items = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                spec = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_no}: invalid JSON ({e})")
+            if not isinstance(spec, dict) or not spec.get("prompt"):
+                raise ValueError(f"{path}:{line_no}: each line needs a \"prompt\"")
+            index = len(items)
+            item = {
+                "index": index,
+                "id": str(spec.get("id", index)),
+                "prompt": spec["prompt"],
+                "model": spec.get("model", args.model),
+                "size": spec.get("size", args.size),
+                "negative_prompt": spec.get("negative_prompt", args.negative_prompt),
+                "prompt_extend": spec.get("prompt_extend", not args.no_prompt_extend),
+                "watermark": spec.get("watermark", args.watermark),
+                "filename": spec.get("filename"),
+            }
+            if item["model"] == "auto":
+                item["model"] = args.auto_model
+            if item["model"] not in MODELS or item["size"] not in SIZES:
+                raise ValueError(f"{path}:{line_no}: unsupported model or size")
+            if not item["filename"] and args.out_dir:
+                safe_id = "".join(c if c.isalnum() or c in "-_." else "_" for c in item["id"])
+                item["filename"] = os.path.join(args.out_dir, f"{index:03d}-{safe_id}.png")
+            items.append(item)
+    return items
+
+
+def _describe_error(e):
+    import requests
+
+    if isinstance(e, requests.exceptions.HTTPError) and e.response is not None:
+        try:
+            detail = e.response.json()
+            return f"HTTP {e.response.status_code}: {detail.get('message') or detail}"
+        except ValueError:
+            return f"HTTP {e.response.status_code}: {e.response.text[:200]}"
+    return str(e) or type(e).__name__
+
+
+def run_batch(items, api_key, concurrency, verify_ssl, cache, fresh=False, ledger=None, variants=None):
+    """Generate every item; print one JSON line + MEDIA line per item as it finishes.
+
+    With `variants` (a media_variants.VariantPool) each saved image's variants
+    are rendered while later items are still generating and downloading; each
+    prints its own JSON line + MEDIA line. Returns the number of failed items.
+    """
+    concurrency = max(1, concurrency)
+    session = create_session(pool_size=concurrency * 3)
+    print_lock = threading.Lock()
+    failures = [0]
+
+    def emit(item, started, url=None, path=None, error=None, cached=False):
+        record = {
+            "index": item["index"],
+            "id": item["id"],
+            "status": "error" if error else "ok",
+            "model": item["model"],
+            "size": item["size"],
+            "url": url,
+            "path": str(path) if path else None,
+            "cached": cached,
+            "elapsed_s": round(time.monotonic() - started, 2),
+        }
+        if error:
+            record["error"] = error
+        with print_lock:
+            print(json.dumps(record, ensure_ascii=False), flush=True)
+            if path:
+                print(f"MEDIA: {path}", flush=True)
+            elif url:
+                print(f"MEDIA_URL: {url}", flush=True)
+            if error:
+                failures[0] += 1
+        if path and variants is not None:
+            variants.submit(path, "image", on_done=lambda result: emit_variant(item, result))
+
+    def emit_variant(item, result):
+        record = {"index": item["index"], "id": item["id"], "variant": result["variant"],
+                  "status": "error" if result["error"] else "ok", "path": result["path"],
+                  "bytes": result["bytes"], "elapsed_s": result["elapsed_s"]}
+        if result["error"]:
+            record["error"] = result["error"]
+        with print_lock:
+            print(json.dumps(record, ensure_ascii=False), flush=True)
+            if result["path"]:
+                print(f"MEDIA: {result['path']}", flush=True)
+
+    def fetch(item, started, url, key, params, lock):
+        # Runs on the download pool; the key's single-flight lock is held
+        # until the file is in the cache.
+        try:
+            staging = cache.staging_path(key, Path(item["filename"]).suffix or ".png")
+            download(session, url, staging, verify=verify_ssl)
+            if ledger is not None:
+                ledger.record_output(url, staging.stat().st_size)
+            entry = cache.put(key, params, url=url, source=staging)
+            path = cache.materialize(entry, item["filename"])
+        except Exception as e:
+            emit(item, started, url=url, error=f"download failed: {_describe_error(e)}")
+            return
+        finally:
+            cache.release(lock)
+        emit(item, started, url=url, path=path)
+
+    def serve_hit(item, started, entry):
+        try:
+            if item["filename"]:
+                path = cache.materialize(entry, item["filename"])
+            else:
+                path = None if entry["url"] else entry["path"]  # URL expired: hand out the cached file
+        except OSError as e:
+            emit(item, started, url=entry["url"], error=f"cache copy failed: {e}")
+            return
+        emit(item, started, url=entry["url"], path=path, cached=True)
+
+    # Generations and downloads get separate pools: a slow download must not
+    # occupy a generation slot.
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="download") as downloads:
+        def generate(item):
+            started = time.monotonic()
+            payload = build_payload(item["prompt"], item["model"], item["size"],
+                                    item["negative_prompt"], item["prompt_extend"], item["watermark"])
+            params = cache_params(payload)
+            key = cache_key(params)
+            need_file = bool(item["filename"])
+            entry = cache_lookup(cache, key, need_file, fresh)
+            if entry:
+                serve_hit(item, started, entry)
+                return
+            lock = cache.acquire(key)
+            entry = cache_lookup(cache, key, need_file, fresh)
+            if entry:
+                cache.release(lock)
+                serve_hit(item, started, entry)
+                return
+            try:
+                url = generate_one(session, api_key, payload, ledger=ledger)
+            except Exception as e:
+                cache.release(lock)
+                emit(item, started, error=_describe_error(e))
+                return
+            if need_file:
+                downloads.submit(fetch, item, started, url, key, params, lock)
+            else:
+                cache.put(key, params, url=url)
+                cache.release(lock)
+                emit(item, started, url=url)
+
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="generate") as generations:
+            list(generations.map(generate, items))
+
+    session.close()
+    return failures[0]
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Generate images using Qwen Image API"
     )
     parser.add_argument(
         "--prompt", "-p",
-        required=True,
         help="Image description/prompt"
     )
+    parser.add_argument(
+        "--batch", "-b",
+        help="JSONL file of prompts and per-item parameters (batch mode)"
+    )
+    parser.add_argument(
+        "--concurrency", "-c",
+        type=int,
+        default=4,
+        help="Batch mode: generations in flight at once (default: 4)"
+    )
+    parser.add_argument(
+        "--out-dir",
+        help="Batch mode: save items without a filename here (otherwise only URLs are returned)"
+    )
     parser.add_argument(
         "--filename", "-f",
         help="Output filename (optional, if not provided will only return URL)"
     )
     parser.add_argument(
         "--model", "-m",
-        choices=["qwen-image-max", "qwen-image-turbo", "qwen-image-plus-2026-01-09"],
+        choices=MODELS + ["auto"],
         default="qwen-image-max",
-        help="Model to use: qwen-image-max (default) or qwen-image-turbo"
+        help="Model to use: qwen-image-max (default), qwen-image-turbo, or auto (pick by recent latency, see --deadline)"
+    )
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        help="With --model auto: seconds the generation should finish within"
     )
     parser.add_argument(
         "--size", "-s",
-        choices=["1664*928", "1024*1024", "720*1280", "1280*720"],
+        choices=SIZES,
         default="1664*928",
         help="Output size (default: 1664*928 for 16:9 ratio)"
     )
     parser.add_argument(
         "--negative-prompt", "-n",
-        default="低分辨率，低画质，肢体畸形，手指畸形，画面过饱和，蜡像感，人脸无细节，过度光滑，画面具有AI感。构图混乱。文字模糊，扭曲。",
+        default=DEFAULT_NEGATIVE_PROMPT,
         help="Negative prompt to avoid unwanted elements"
     )
     parser.add_argument(
@@ -71,6 +474,16 @@ def main():
         "--api-key", "-k",
         help="DashScope API key (overrides DASHSCOPE_API_KEY env var)"
     )
+    parser.add_argument(
+        "--fresh",
+        action="store_true",
+        help="Ignore cached results and always generate a new image"
+    )
+    parser.add_argument(
+        "--variants",
+        action="store_true",
+        help="Also render WebP/JPEG previews and a thumbnail of saved images (needs ffmpeg)"
+    )
     parser.add_argument(
         "--no-verify-ssl",
         action="store_true",
@@ -78,6 +491,8 @@ def main():
     )
 
     args = parser.parse_args()
+    if not args.prompt and not args.batch:
+        parser.error("one of --prompt or --batch is required")
 
     # Get API key
     api_key = get_api_key(args.api_key)
@@ -91,106 +506,75 @@ def main():
     # Import here after checking API key
     import requests
 
-    # Set up output path
+    ledger = ModelLedger()
+    auto = ledger.choose("image", args.deadline)
+    args.auto_model = auto["model"]
+    if args.model == "auto":
+        args.model = auto["model"]
+        print(describe_choice(auto, args.deadline), file=sys.stderr)
+
+    if args.batch:
+        try:
+            items = load_batch(args.batch, args)
+        except (OSError, ValueError) as e:
+            print(f"Error reading batch file: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(f"Generating {len(items)} images with up to {args.concurrency} in flight...", file=sys.stderr)
+        variants = media_variants.open_pool() if args.variants else None
+        failed = run_batch(items, api_key, args.concurrency, not args.no_verify_ssl,
+                           GenerationCache(), fresh=args.fresh, ledger=ledger, variants=variants)
+        if variants is not None:
+            variants.close()
+        print(f"Done: {len(items) - failed} succeeded, {failed} failed", file=sys.stderr)
+        sys.exit(1 if failed else 0)
 
     # Build request payload
-    payload = {
-        "model": args.model,
-        "input": {
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "text": args.prompt
-                        }
-                    ]
-                }
-            ]
-        },
-        "parameters": {
-            "negative_prompt": args.negative_prompt,
-            "prompt_extend": not args.no_prompt_extend,
-            "watermark": args.watermark,
-            "size": args.size
-        }
-    }
+    payload = build_payload(args.prompt, args.model, args.size, args.negative_prompt,
+                            not args.no_prompt_extend, args.watermark)
 
     print(f"Generating image with {args.model}...")
     print(f"Size: {args.size}")
     print(f"Prompt: {args.prompt}")
 
+    session = create_session()
     try:
-        # Make API request
-        response = requests.post(
-            "https://dashscope.aliyuncs.com/api/v1/services/aigc/multimodal-generation/generation",
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {api_key}"
-            },
-            json=payload,
-            timeout=120,
-            verify=True
-        )
-
-        response.raise_for_status()
-        result = response.json()
-
-        # Check for errors
-        if result.get("code"):
-            error_msg = result.get("message", "Unknown error")
-            print(f"API Error: {error_msg}", file=sys.stderr)
-            sys.exit(1)
-
-        # Extract image URL from response
-        output_data = result.get("output", {})
-        choices = output_data.get("choices", [])
-        
-        if not choices:
-            print("Error: No choices in response", file=sys.stderr)
-            print(f"Response: {json.dumps(result, indent=2, ensure_ascii=False)}", file=sys.stderr)
-            sys.exit(1)
+        image_url, full_path, hit = generate_cached(session, api_key, payload, GenerationCache(),
+                                                    args.filename, verify=not args.no_verify_ssl,
+                                                    fresh=args.fresh, ledger=ledger)
+        if hit:
+            print("Cache hit: reusing an earlier identical generation (--fresh to regenerate)")
+        if image_url:
+            print(f"\nImage URL: {image_url}")
 
-        # Get image URL from first choice
-        message = choices[0].get("message", {})
-        content = message.get("content", [])
-        
-        if not content or not content[0].get("image"):
-            print("Error: No image URL in response", file=sys.stderr)
-            print(f"Response: {json.dumps(result, indent=2, ensure_ascii=False)}", file=sys.stderr)
-            sys.exit(1)
-
-        image_url = content[0]["image"]
-        print(f"\nImage URL: {image_url}")
-
-        # If filename is provided, download and save the image
+        # If filename is provided, the image has been downloaded and saved
         if args.filename:
-            output_path = Path(args.filename)
-            output_path.parent.mkdir(parents=True, exist_ok=True)
-            
-            print("Downloading image...")
-            img_response = requests.get(image_url, timeout=30, verify=not args.no_verify_ssl)
-            img_response.raise_for_status()
-
-            # Save the image
-            with open(output_path, "wb") as f:
-                f.write(img_response.content)
-
-            full_path = output_path.resolve()
             print(f"Image saved: {full_path}")
             # Clawdbot parses MEDIA tokens and will attach the file on supported providers.
             print(f"MEDIA: {full_path}")
-        else:
+            variants = media_variants.open_pool() if args.variants else None
+            if variants is not None:
+                variants.submit(full_path, "image", on_done=media_variants.report)
+                variants.close()
+        elif image_url:
             # Just return the URL for Clawdbot to display
             print(f"MEDIA_URL: {image_url}")
+        else:
+            # The cached generation's URL has expired; its file is still here
+            print(f"\nImage URL expired, using the cached file: {full_path}")
+            print(f"MEDIA: {full_path}")
 
+    except GenerationError as e:
+        print(str(e), file=sys.stderr)
+        if e.result is not None and not e.result.get("code"):
+            print(f"Response: {json.dumps(e.result, indent=2, ensure_ascii=False)}", file=sys.stderr)
+        sys.exit(1)
     except requests.exceptions.HTTPError as e:
         print(f"HTTP Error: {e}", file=sys.stderr)
         try:
-            error_detail = response.json()
+            error_detail = e.response.json()
             print(f"Error details: {json.dumps(error_detail, indent=2, ensure_ascii=False)}", file=sys.stderr)
         except:
-            print(f"Response text: {response.text}", file=sys.stderr)
+            print(f"Response text: {e.response.text}", file=sys.stderr)
         sys.exit(1)
     except requests.exceptions.RequestException as e:
         print(f"Error making API request: {e}", file=sys.stderr)
@@ -4,32 +4,186 @@ Generate videos using Alibaba Cloud DashScope (通义万相视频生成)
 
 Usage:
     python3 generate_video.py --prompt "描述内容" --img_url "图片URL" --out video.mp4
+    python3 generate_video.py --prompt "描述内容" --img_url "图片URL" --out video.mp4 --detach
+    python3 generate_video.py resume [--task-id ID]     # re-attach to unfinished tasks and wait
+    python3 generate_video.py collect [--detach]        # same, for a background collector
+    python3 generate_video.py list                      # recent journal entries
+
+The task is submitted in DashScope async-task mode and polled by the shared
+TaskScheduler (dashscope_tasks.py), which spaces status requests by how long
+this model's tasks have been taking instead of every fixed 5 s.
+
+Every submission is journaled (video_jobs.py) before it is sent, so a killed
+process loses nothing: `resume` (foreground) or `collect` (background, exits
+when no unfinished tasks remain) re-attach to every unfinished task, poll them
+together and download finished videos to their original --out paths. Running
+the same generate command again re-attaches to the earlier task instead of
+paying for a second one (--fresh submits anew). --detach submits, starts a
+background collector and returns at once.
+
+Each finished task's latency, queue time and outcome go to the model ledger
+(model_ledger.py), which also seeds the scheduler's expected run times.
+--model auto picks the best model whose recent p95 fits --deadline SECONDS.
+
+--variants also renders a poster frame, a thumbnail and a compact re-encode of
+the downloaded video (media_variants.py, needs ffmpeg), each as a MEDIA: line.
 
 Environment variable:
     DASHSCOPE_API_KEY - Your DashScope API key
+    DASHSCOPE_BASE_URL - API base URL (default: https://dashscope.aliyuncs.com)
+    QWEN_VIDEO_JOURNAL - job journal path (default: <openclaw>/.openclaw/video_jobs.db)
+    QWEN_MODEL_LEDGER - model telemetry path (default: <openclaw>/.openclaw/model_ledger.db)
 """
 
 import argparse
+import json
 import os
+import subprocess
 import sys
 import time
 
-try:
-    import dashscope
-    from dashscope import VideoSynthesis
-except ImportError:
-    print("Error: dashscope package not installed")
-    print("Run: pip install dashscope")
-    sys.exit(1)
+from dashscope_tasks import TaskError, TaskScheduler, create_session, submit_video_task
+import media_variants
+from media_download import DownloadError, download
+from model_ledger import ModelLedger, describe_choice
+from video_jobs import JOURNAL_PATH, VideoJournal
+
+COLLECTOR_LOG = os.path.join(os.path.dirname(JOURNAL_PATH), "video_collector.log")
+RESCAN_INTERVAL = 10
+VIDEO_MODELS = ["wan2.6-i2v-flash", "wan2.6-i2v", "wan2.5-i2v-preview", "wan2.2-i2v-plus"]
+
+
+def video_params(args):
+    """The request as journaled (and matched when the same command is re-run)."""
+    return {"model": args.model, "prompt": args.prompt, "img_url": args.img_url, "duration": args.duration}
+
+
+def spawn_collector(timeout):
+    """Start `collect` as a detached background process; returns its pid."""
+    os.makedirs(os.path.dirname(COLLECTOR_LOG), exist_ok=True)
+    with open(COLLECTOR_LOG, "a") as log:
+        proc = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "collect", "--timeout", str(timeout)],
+            stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+            start_new_session=True)
+    return proc.pid
+
+
+def finish_job(journal, session, job, result, quiet=False, ledger=None):
+    """Record a scheduler result for a journaled job and download the video. Returns True on success."""
+    job_id = job["job_id"]
+    if ledger is not None:
+        ledger.record_task(result)
+    if result["status"] == "TIMEOUT":
+        # Still running on DashScope: leave it active for the next resume/collect.
+        journal.release(job_id)
+        print(f"[{job['task_id']}] still running after {result['elapsed_s']:.0f}s; "
+              f"run `generate_video.py resume` later", flush=True)
+        return False
+    if result["status"] != "SUCCEEDED" or not result["url"]:
+        journal.update(job_id, "FAILED", error=result["error"])
+        print(f"[{job['task_id']}] Error: Video generation failed: {result['error']}", flush=True)
+        return False
+    return download_job(journal, session, job, result["url"], quiet, ledger)
+
+
+def download_job(journal, session, job, video_url, quiet=False, ledger=None):
+    journal.update(job["job_id"], "SUCCEEDED", video_url=video_url)
+    if not quiet:
+        print()
+        print("Video generated successfully!")
+        print(f"VIDEO_URL: {video_url}")
+        print()
+    if job["out_path"]:
+        print(f"Downloading to {job['out_path']}...", flush=True)
+        # Download video (streamed to a .part file, resumed on failure)
+        try:
+            saved = download(video_url, job["out_path"], session=session)
+        except DownloadError as e:
+            journal.update(job["job_id"], "SUCCEEDED", error=f"download failed: {e}")
+            journal.release(job["job_id"])
+            print(f"Error downloading video: {e}")
+            print("MEDIA_URL:", video_url, flush=True)
+            return False
+        print(f"Saved to: {saved}")
+        if ledger is not None:
+            ledger.record_output(video_url, os.path.getsize(saved))
+        print()
+    journal.update(job["job_id"], "DOWNLOADED")
+    journal.release(job["job_id"])
+    print("MEDIA_URL:", video_url, flush=True)
+    return True
+
+
+def reattach(journal, api_key, timeout, task_id=None, rescan=False, ledger=None):
+    """Poll every unfinished journaled job (or just `task_id`) together; returns the failure count.
+
+    With `rescan` (the background collector) the journal is re-read every
+    RESCAN_INTERVAL seconds, so tasks orphaned meanwhile are picked up too;
+    it returns once nothing is left to collect.
+    """
+    scheduler = TaskScheduler(api_key, timeout=timeout, estimates=ledger.estimates("video") if ledger else None)
+    tracked = set()
+    failed = 0
+    while True:
+        jobs = [job for job in journal.unfinished()
+                if job["job_id"] not in tracked and (not task_id or job["task_id"] == task_id)]
+        jobs = [job for job in jobs if journal.claim(job["job_id"])]
+        if jobs:
+            print(f"Re-attaching to {len(jobs)} unfinished video task(s)...", flush=True)
+        for job in jobs:
+            tracked.add(job["job_id"])
+            if job["state"] == "SUCCEEDED" and job["video_url"]:
+                # Finished earlier, download didn't complete.
+                failed += not download_job(journal, scheduler.session, job, job["video_url"], quiet=True,
+                                           ledger=ledger)
+                continue
+            age = time.time() - (job["submitted_at"] or job["created_at"])
+            scheduler.add(job["task_id"], kind="video", model=job["model"], meta=job, age=age)
+            print(f"  {job['task_id']}  {job['model']}  submitted {age / 60:.0f} min ago  → {job['out_path']}")
+
+        if scheduler.stats()["outstanding"] == 0 and not jobs:
+            break
+        for result in scheduler.as_completed(timeout=RESCAN_INTERVAL if rescan else None):
+            job = result["meta"]
+            print(f"[{job['task_id']}] {result['status']} ({result['polls']} status checks)", flush=True)
+            failed += not finish_job(journal, scheduler.session, job, result, quiet=True, ledger=ledger)
+    scheduler.close()
+    if not tracked:
+        print("No unfinished video tasks to collect.")
+    return failed
+
+
+def render_variants(path):
+    variants = media_variants.open_pool() if path else None
+    if variants is None:
+        return
+    variants.submit(path, "video", on_done=media_variants.report)
+    variants.close()
+
+
+def list_jobs(journal):
+    for job in journal.recent():
+        params = json.loads(job["params"])
+        print(f"{job['job_id']:>4}  {job['state']:<10}  {job['task_id'] or '-':<38}  {job['model']:<18}  "
+              f"{(params.get('prompt') or '')[:30]:<30}  {job['out_path'] or ''}")
+        if job["error"]:
+            print(f"      {job['error']}")
 
 
 def main():
     parser = argparse.ArgumentParser(
         description="Generate videos using Alibaba Cloud DashScope"
     )
+    parser.add_argument(
+        "command",
+        nargs="?",
+        default="generate",
+        choices=["generate", "resume", "collect", "list"],
+        help="generate (default), resume / collect unfinished journaled tasks, or list the journal"
+    )
     parser.add_argument(
         "--prompt", "-p",
-        required=True,
         help="Text prompt for video generation"
     )
     parser.add_argument(
@@ -50,11 +204,48 @@ def main():
     parser.add_argument(
         "--model", "-m",
         default="wan2.6-i2v-flash",
-        choices=["wan2.6-i2v-flash", "wan2.6-i2v", "wan2.5-i2v-preview", "wan2.2-i2v-plus"],
-        help="Model to use (default: wan2.6-i2v-flash)"
+        choices=VIDEO_MODELS + ["auto"],
+        help="Model to use (default: wan2.6-i2v-flash; auto: pick by recent latency, see --deadline)"
+    )
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        help="With --model auto: seconds the video should be ready within"
+    )
+    parser.add_argument(
+        "--timeout", "-t",
+        type=float,
+        default=300,
+        help="Seconds to wait for the task to finish (default: 300)"
+    )
+    parser.add_argument(
+        "--task-id",
+        help="resume: only this task"
+    )
+    parser.add_argument(
+        "--detach",
+        action="store_true",
+        help="Return right away and let a background collector wait and download"
+    )
+    parser.add_argument(
+        "--fresh",
+        action="store_true",
+        help="Submit a new task even if the same request is already running"
+    )
+    parser.add_argument(
+        "--variants",
+        action="store_true",
+        help="Also render a poster frame, thumbnail and compact re-encode of the video (needs ffmpeg)"
     )
 
     args = parser.parse_args()
+    journal = VideoJournal()
+
+    if args.command == "list":
+        list_jobs(journal)
+        return
+    if args.command == "generate" and not args.prompt:
+        parser.error("--prompt is required")
 
     # Get API key
     api_key = os.environ.get("DASHSCOPE_API_KEY")
@@ -62,7 +253,20 @@ def main():
         print("Error: DASHSCOPE_API_KEY environment variable not set")
         sys.exit(1)
 
-    dashscope.api_key = api_key
+    if args.command in ("resume", "collect"):
+        if args.detach:
+            pid = spawn_collector(args.timeout)
+            print(f"Background collector started (PID: {pid}, log: {COLLECTOR_LOG})")
+            return
+        failed = reattach(journal, api_key, args.timeout, args.task_id, rescan=args.command == "collect",
+                          ledger=ModelLedger())
+        sys.exit(1 if failed else 0)
+
+    ledger = ModelLedger()
+    if args.model == "auto":
+        choice = ledger.choose("video", args.deadline)
+        args.model = choice["model"]
+        print(describe_choice(choice, args.deadline))
 
     print(f"Generating video with DashScope...")
     print(f"Model: {args.model}")
@@ -72,84 +276,67 @@ def main():
         print(f"Image URL: {args.img_url[:50]}...")
     print()
 
-    # Submit video generation task
-    try:
-        result = VideoSynthesis.call(
-            model=args.model,
-            prompt=args.prompt,
-            img_url=args.img_url,
-            duration=args.duration
-        )
-    except Exception as e:
-        print(f"Error submitting task: {e}")
+    params = video_params(args)
+    job, how = journal.open_job(args.model, params, args.out, fresh=args.fresh)
+    if how == "busy":
+        print(f"The same request is already being handled by PID {job['owner_pid']} "
+              f"(task {job['task_id'] or 'pending'}); use `generate_video.py list` to follow it")
         sys.exit(1)
+    if how == "reattach":
+        print(f"Re-attaching to task {job['task_id']} submitted earlier for the same request (--fresh to resubmit)")
+    else:
+        if how == "resubmit":
+            print(f"Submitting job {job['job_id']}, left unsubmitted by PID {job['owner_pid']} (no longer running)")
+        job_id = job["job_id"]
+        # Submit video generation task (journaled first, so a crash can't lose it)
+        try:
+            task_id = submit_video_task(create_session(pool_size=2), api_key, args.prompt, args.img_url,
+                                        args.model, args.duration)
+        except TaskError as e:
+            journal.update(job_id, "FAILED", error=f"submit: {e}")
+            print(f"Error submitting task: {e}")
+            sys.exit(1)
+        journal.submitted(job_id, task_id)
+        job = journal.get(job_id)
 
-    if result.status_code != 200:
-        print(f"Error: {result.code} - {result.message}")
-        sys.exit(1)
+    print(f"Task ID: {job['task_id']}")
 
-    task_id = result.output.task_id
-    print(f"Task ID: {task_id}")
-    print(f"Status: {result.output.task_status}")
-
-    # Wait for completion
-    if result.output.task_status in ["PENDING", "RUNNING"]:
-        print("Waiting for video generation...")
-        max_attempts = 60
-        for attempt in range(1, max_attempts + 1):
-            time.sleep(5)
-            status = VideoSynthesis.fetch(task=task_id)
-            print(f"  Attempt {attempt}/{max_attempts}: {status.output.task_status}")
-
-            if status.output.task_status == "SUCCEEDED":
-                video_url = status.output.video_url
-                print()
-                print("Video generated successfully!")
-                print(f"VIDEO_URL: {video_url}")
-                print()
-                print(f"Downloading to {args.out}...")
-
-                # Download video
-                import requests
-                resp = requests.get(video_url)
-                with open(args.out, "wb") as f:
-                    f.write(resp.content)
-
-                print(f"Saved to: {args.out}")
-                print()
-                print("MEDIA_URL:", video_url)
-                return
-
-            elif status.output.task_status == "FAILED":
-                print(f"Error: Video generation failed")
-                if hasattr(status.output, 'message'):
-                    print(f"Message: {status.output.message}")
-                sys.exit(1)
+    if args.detach:
+        journal.release(job["job_id"])
+        pid = spawn_collector(args.timeout)
+        print(f"Background collector started (PID: {pid}); the video will be saved to {args.out}")
+        print(f"Check progress with: generate_video.py list  (log: {COLLECTOR_LOG})")
+        return
 
-        print("Error: Timeout waiting for video generation")
-        sys.exit(1)
+    scheduler = TaskScheduler(api_key, poll_workers=1, timeout=args.timeout, estimates=ledger.estimates("video"))
+    if job["state"] == "SUCCEEDED" and job["video_url"]:
+        ok = download_job(journal, scheduler.session, job, job["video_url"], ledger=ledger)
+        scheduler.close()
+        if ok and args.variants:
+            render_variants(job["out_path"])
+        sys.exit(0 if ok else 1)
 
-    elif result.output.task_status == "SUCCEEDED":
-        video_url = result.output.video_url
-        print()
-        print("Video generated successfully!")
-        print(f"VIDEO_URL: {video_url}")
-        print()
-        print("MEDIA_URL:", video_url)
-
-        # Download video
-        if args.out:
-            import requests
-            print(f"Downloading to {args.out}...")
-            resp = requests.get(video_url)
-            with open(args.out, "wb") as f:
-                f.write(resp.content)
-            print(f"Saved to: {args.out}")
+    print("Waiting for video generation...")
+    age = time.time() - (job["submitted_at"] or job["created_at"])
+    scheduler.add(job["task_id"], kind="video", model=args.model, age=age)
+    result = scheduler.wait(job["task_id"])
+    print(f"  {result['status']} after {result['elapsed_s']:.0f}s ({result['polls']} status checks)")
 
-    else:
-        print(f"Unexpected status: {result.output.task_status}")
+    if result["status"] == "TIMEOUT":
+        ledger.record_task(result)
+        journal.release(job["job_id"])
+        scheduler.close()
+        print("Error: Timeout waiting for video generation")
+        print(f"Task ID (still running on DashScope): {job['task_id']}")
+        print("Run `generate_video.py resume` (or `collect --detach`) to pick it up later")
         sys.exit(1)
 
+    ok = finish_job(journal, scheduler.session, job, result, ledger=ledger)
+    scheduler.close()
+    if ok and args.variants:
+        render_variants(job["out_path"])
+    sys.exit(0 if ok else 1)
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.10"
+# dependencies = [
+#     "requests>=2.31.0",
+# ]
+# ///
+"""
+Prompt → image → video chains in one process, pipelined.
+
+Usage:
+    python3 image_to_video.py --prompt "图片描述" --video-prompt "镜头缓慢推进" --out video.mp4 [--image-out image.png]
+    python3 image_to_video.py --chains chains.jsonl --out-dir /tmp/clips --concurrency 4
+
+    {"prompt": "...", "video_prompt": "...", "id": "intro"}
+    {"prompt": "...", "image_model": "qwen-image-turbo", "video_model": "wan2.6-i2v", "duration": 10,
+     "image_out": "/tmp/a.png", "out": "/tmp/a.mp4"}
+
+    Per-chain keys: prompt (required), video_prompt (default: prompt), id, size,
+    image_model, video_model, duration, negative_prompt, image_out, out.
+
+Running generate_image.py and then generate_video.py --img_url waits for the
+image download before the video is even submitted. Here each chain moves on as
+soon as its image URL exists:
+
+    image generation  ──URL──►  video task submitted  ──►  TaskScheduler poll  ──►  video download
+                        └──►  image download (download pool, overlaps everything after it)
+
+Image generations run on --concurrency workers, every video task of the run is
+polled by one TaskScheduler, and image and video downloads share a separate
+download pool, so chains at different stages overlap freely. Image results go
+through the generation cache (gen_cache.py) and video tasks through the video
+journal (video_jobs.py) exactly as in the standalone scripts: a killed run is
+picked up by `generate_video.py resume`, and re-running it re-attaches instead
+of paying twice (--fresh to regenerate).
+
+Each stage prints one JSON line as it finishes ({"id", "stage": "image"|"video",
+"status", ...}) followed by MEDIA: (saved file) or MEDIA_URL:. With --variants
+every saved file is also handed to the ffmpeg pool (media_variants.py) and each
+preview / thumbnail / poster / compact re-encode gets its own "stage": "variant"
+line and MEDIA: line. Exit status is 1 if any chain failed.
+
+Environment variable:
+    DASHSCOPE_API_KEY - Your DashScope API key
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import media_download
+import media_variants
+from dashscope_tasks import TaskError, TaskScheduler, submit_video_task
+from gen_cache import GenerationCache, cache_key
+from generate_image import (DEFAULT_NEGATIVE_PROMPT, MODELS, SIZES, _describe_error, build_payload,
+                            cache_params, create_session, generate_one)
+from generate_video import VIDEO_MODELS
+from model_ledger import ModelLedger
+from video_jobs import VideoJournal
+
+DEFAULT_IMAGE_MODEL = "qwen-image-max"
+DEFAULT_VIDEO_MODEL = "wan2.6-i2v-flash"
+DEFAULT_SIZE = "1280*720"
+
+
+def load_chains(path, args):
+    """Read the JSONL chain file into chain dicts with command-line defaults filled in."""
+    chains = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                spec = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_no}: invalid JSON ({e})")
+            if not isinstance(spec, dict) or not spec.get("prompt"):
+                raise ValueError(f"{path}:{line_no}: each line needs a \"prompt\"")
+            try:
+                chains.append(make_chain(len(chains), spec, args))
+            except ValueError as e:
+                raise ValueError(f"{path}:{line_no}: {e}")
+    return chains
+
+
+def make_chain(index, spec, args):
+    chain = {
+        "index": index,
+        "id": str(spec.get("id", index)),
+        "prompt": spec["prompt"],
+        "video_prompt": spec.get("video_prompt") or args.video_prompt or spec["prompt"],
+        "size": spec.get("size", args.size),
+        "image_model": spec.get("image_model", args.image_model),
+        "video_model": spec.get("video_model", args.video_model),
+        "duration": int(spec.get("duration", args.duration)),
+        "negative_prompt": spec.get("negative_prompt", args.negative_prompt),
+        "image_out": spec.get("image_out"),
+        "out": spec.get("out"),
+    }
+    if chain["image_model"] not in MODELS or chain["size"] not in SIZES or chain["video_model"] not in VIDEO_MODELS:
+        raise ValueError("unsupported image model, size or video model")
+    if args.out_dir:
+        safe_id = "".join(c if c.isalnum() or c in "-_." else "_" for c in chain["id"])
+        stem = os.path.join(args.out_dir, f"{index:03d}-{safe_id}")
+        chain["image_out"] = chain["image_out"] or f"{stem}.png"
+        chain["out"] = chain["out"] or f"{stem}.mp4"
+    return chain
+
+
+class Pipeline:
+    """Runs chains through generate → submit → poll → download with every stage overlapping."""
+
+    def __init__(self, api_key, concurrency=4, timeout=600, fresh=False, cache=None, journal=None, ledger=None,
+                 variants=None):
+        self.api_key = api_key
+        self.concurrency = max(1, concurrency)
+        self.fresh = fresh
+        self.cache = cache or GenerationCache()
+        self.journal = journal or VideoJournal()
+        self.ledger = ledger or ModelLedger()
+        self.variants = variants
+        self.session = create_session(pool_size=self.concurrency * 3 + 4)
+        self.scheduler = TaskScheduler(api_key, session=self.session, timeout=timeout,
+                                       estimates=self.ledger.estimates("video"))
+        self.downloads = ThreadPoolExecutor(max_workers=self.concurrency * 2, thread_name_prefix="download")
+        self.failed = set()
+        self._print_lock = threading.Lock()
+        # One sqlite3 connection shared by the worker threads: serialize access.
+        self._journal_lock = threading.Lock()
+        self._pending = []
+
+    # ----- output -----
+
+    def emit(self, chain, stage, started, url=None, path=None, error=None, **extra):
+        record = {
+            "index": chain["index"],
+            "id": chain["id"],
+            "stage": stage,
+            "status": "error" if error else "ok",
+            "url": url,
+            "path": str(path) if path else None,
+            "elapsed_s": round(time.monotonic() - started, 2),
+            **extra,
+        }
+        if error:
+            record["error"] = error
+        with self._print_lock:
+            print(json.dumps(record, ensure_ascii=False), flush=True)
+            if path:
+                print(f"MEDIA: {path}", flush=True)
+            elif url:
+                print(f"MEDIA_URL: {url}", flush=True)
+            if error:
+                self.failed.add(chain["index"])
+        if path and self.variants is not None:
+            self.variants.submit(path, stage, on_done=lambda result: self.emit_variant(chain, result))
+
+    def emit_variant(self, chain, result):
+        record = {"index": chain["index"], "id": chain["id"], "stage": "variant", "variant": result["variant"],
+                  "status": "error" if result["error"] else "ok", "path": result["path"],
+                  "bytes": result["bytes"], "elapsed_s": result["elapsed_s"]}
+        if result["error"]:
+            record["error"] = result["error"]
+        with self._print_lock:
+            print(json.dumps(record, ensure_ascii=False), flush=True)
+            if result["path"]:
+                print(f"MEDIA: {result['path']}", flush=True)
+
+    def _defer(self, fn, *args):
+        self._pending.append(self.downloads.submit(fn, *args))
+
+    # ----- stage 1: image -----
+
+    def _cached_url(self, key):
+        """A cached generation whose image URL is still valid for DashScope to fetch."""
+        if self.fresh:
+            return None
+        return self.cache.get(key, need_file=False, need_url=True)
+
+    def generate_image(self, chain):
+        started = time.monotonic()
+        payload = build_payload(chain["prompt"], chain["image_model"], chain["size"],
+                                chain["negative_prompt"], True, False)
+        params = cache_params(payload)
+        key = cache_key(params)
+        entry = self._cached_url(key)
+        lock = None
+        if entry is None:
+            lock = self.cache.acquire(key)
+            entry = self._cached_url(key)
+        if entry is not None:
+            self.cache.release(lock)
+            url, cached = entry["url"], True
+        else:
+            try:
+                url = generate_one(self.session, self.api_key, payload, ledger=self.ledger)
+            except Exception as e:
+                self.cache.release(lock)
+                self.emit(chain, "image", started, error=_describe_error(e))
+                return
+            cached = False
+            if not chain["image_out"]:
+                self.cache.put(key, params, url=url)
+                self.cache.release(lock)
+
+        # The video only needs the URL: submit it before touching the image file.
+        self.submit_video(chain, url)
+
+        if chain["image_out"]:
+            if cached:
+                self._defer(self.save_cached_image, chain, started, entry)
+            else:
+                self._defer(self.download_image, chain, started, url, key, params, lock)
+        else:
+            self.emit(chain, "image", started, url=url, cached=cached)
+
+    def download_image(self, chain, started, url, key, params, lock):
+        # The key's single-flight lock is held until the file is in the cache.
+        try:
+            staging = self.cache.staging_path(key, Path(chain["image_out"]).suffix or ".png")
+            media_download.download(url, staging, session=self.session)
+            self.ledger.record_output(url, staging.stat().st_size)
+            entry = self.cache.put(key, params, url=url, source=staging)
+            path = self.cache.materialize(entry, chain["image_out"])
+        except Exception as e:
+            self.emit(chain, "image", started, url=url, error=f"download failed: {_describe_error(e)}")
+            return
+        finally:
+            self.cache.release(lock)
+        self.emit(chain, "image", started, url=url, path=path, cached=False)
+
+    def save_cached_image(self, chain, started, entry):
+        try:
+            if entry.get("path"):
+                path = self.cache.materialize(entry, chain["image_out"])
+            else:
+                path = media_download.download(entry["url"], chain["image_out"], session=self.session)
+        except Exception as e:
+            self.emit(chain, "image", started, url=entry["url"], error=f"download failed: {_describe_error(e)}")
+            return
+        self.emit(chain, "image", started, url=entry["url"], path=path, cached=True)
+
+    # ----- stage 2: video -----
+
+    def submit_video(self, chain, img_url):
+        started = time.monotonic()
+        # Same shape as generate_video.video_params, so the journal matches across scripts.
+        params = {"model": chain["video_model"], "prompt": chain["video_prompt"],
+                  "img_url": img_url, "duration": chain["duration"]}
+        with self._journal_lock:
+            job, how = self.journal.open_job(chain["video_model"], params, chain["out"], fresh=self.fresh)
+        meta = {"chain": chain, "started": started}
+
+        if how == "busy":
+            self.emit(chain, "video", started, error=f"the same request is already being handled by "
+                      f"PID {job['owner_pid']} (task {job['task_id'] or 'pending'})")
+            return
+        if how == "reattach":
+            meta["job"] = job
+            if job["state"] == "SUCCEEDED" and job["video_url"]:
+                self._defer(self.download_video, meta, job["video_url"])
+                return
+            age = time.time() - (job["submitted_at"] or job["created_at"])
+            self.scheduler.add(job["task_id"], kind="video", model=chain["video_model"], meta=meta, age=age)
+            return
+
+        # "new", or "resubmit": a NEW row left by a process that died before submitting
+        job_id = job["job_id"]
+        try:
+            task_id = submit_video_task(self.session, self.api_key, chain["video_prompt"], img_url,
+                                        chain["video_model"], chain["duration"])
+        except TaskError as e:
+            with self._journal_lock:
+                self.journal.update(job_id, "FAILED", error=f"submit: {e}")
+            self.emit(chain, "video", started, error=f"submit: {e}")
+            return
+        with self._journal_lock:
+            self.journal.submitted(job_id, task_id)
+            meta["job"] = self.journal.get(job_id)
+        self.scheduler.add(task_id, kind="video", model=chain["video_model"], meta=meta)
+
+    def finish_video(self, result):
+        meta = result["meta"]
+        chain, job = meta["chain"], meta["job"]
+        self.ledger.record_task(result)
+        if result["status"] == "TIMEOUT":
+            with self._journal_lock:
+                self.journal.release(job["job_id"])
+            self.emit(chain, "video", meta["started"], task_id=job["task_id"],
+                      error=f"still running after {result['elapsed_s']:.0f}s; run `generate_video.py resume` later")
+            return
+        if result["status"] != "SUCCEEDED" or not result["url"]:
+            with self._journal_lock:
+                self.journal.update(job["job_id"], "FAILED", error=result["error"])
+            self.emit(chain, "video", meta["started"], task_id=job["task_id"], error=result["error"])
+            return
+        with self._journal_lock:
+            self.journal.update(job["job_id"], "SUCCEEDED", video_url=result["url"])
+        self._defer(self.download_video, meta, result["url"])
+
+    def download_video(self, meta, video_url):
+        chain, job = meta["chain"], meta["job"]
+        path = None
+        if chain["out"]:
+            try:
+                path = media_download.download(video_url, chain["out"], session=self.session)
+                self.ledger.record_output(video_url, path.stat().st_size)
+            except media_download.DownloadError as e:
+                with self._journal_lock:
+                    self.journal.update(job["job_id"], "SUCCEEDED", error=f"download failed: {e}")
+                    self.journal.release(job["job_id"])
+                self.emit(chain, "video", meta["started"], url=video_url, task_id=job["task_id"],
+                          error=f"download failed: {e}")
+                return
+        with self._journal_lock:
+            self.journal.update(job["job_id"], "DOWNLOADED")
+            self.journal.release(job["job_id"])
+        self.emit(chain, "video", meta["started"], url=video_url, path=path, task_id=job["task_id"])
+
+    # ----- run -----
+
+    def run(self, chains):
+        """Run every chain; returns the number of chains with a failed stage."""
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="generate") as generations:
+            pending = {generations.submit(self.generate_image, chain) for chain in chains}
+            while pending or self.scheduler.stats()["outstanding"]:
+                if pending:
+                    done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                # Videos finish while later images are still generating.
+                for result in self.scheduler.as_completed(timeout=0.5 if pending else None):
+                    self.finish_video(result)
+        while self._pending:
+            self._pending.pop().result()
+        return len(self.failed)
+
+    def close(self):
+        self.scheduler.close()
+        self.downloads.shutdown(wait=True)
+        if self.variants is not None:
+            self.variants.close()
+        self.session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pipelined prompt → image → video generation")
+    parser.add_argument("--prompt", "-p", help="Image prompt (single chain)")
+    parser.add_argument("--video-prompt", help="Video prompt (default: the image prompt)")
+    parser.add_argument("--chains", "-b", help="JSONL file, one chain per line")
+    parser.add_argument("--out", "-o", help="Video output path (single chain)")
+    parser.add_argument("--image-out", help="Also save the image here (single chain)")
+    parser.add_argument("--out-dir", help="Chains: directory for <index>-<id>.png/.mp4 when no paths are given")
+    parser.add_argument("--image-model", default=DEFAULT_IMAGE_MODEL, choices=MODELS,
+                        help=f"Image model (default: {DEFAULT_IMAGE_MODEL})")
+    parser.add_argument("--size", "-s", default=DEFAULT_SIZE, choices=SIZES, help=f"Image size (default: {DEFAULT_SIZE})")
+    parser.add_argument("--negative-prompt", "-n", default=DEFAULT_NEGATIVE_PROMPT, help="Image negative prompt")
+    parser.add_argument("--video-model", "-m", default=DEFAULT_VIDEO_MODEL, choices=VIDEO_MODELS,
+                        help=f"Video model (default: {DEFAULT_VIDEO_MODEL})")
+    parser.add_argument("--duration", "-d", type=int, default=5, help="Video duration in seconds (default: 5)")
+    parser.add_argument("--concurrency", "-c", type=int, default=4, help="Parallel image generations (default: 4)")
+    parser.add_argument("--timeout", "-t", type=float, default=600, help="Per-video wait in seconds (default: 600)")
+    parser.add_argument("--fresh", action="store_true", help="Ignore the image cache and the video journal")
+    parser.add_argument("--variants", action="store_true",
+                        help="Also render previews/thumbnails/poster/compact video of saved files (needs ffmpeg)")
+    parser.add_argument("--api-key", "-k", help="DashScope API key (overrides DASHSCOPE_API_KEY env var)")
+    args = parser.parse_args()
+
+    if bool(args.prompt) == bool(args.chains):
+        parser.error("give either --prompt or --chains")
+
+    api_key = args.api_key or os.environ.get("DASHSCOPE_API_KEY")
+    if not api_key:
+        print("Error: DASHSCOPE_API_KEY environment variable not set", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        if args.chains:
+            chains = load_chains(args.chains, args)
+        else:
+            chains = [make_chain(0, {"prompt": args.prompt, "image_out": args.image_out,
+                                     "out": args.out or "output.mp4"}, args)]
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    if not chains:
+        print("Error: no chains to run", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"Running {len(chains)} image → video chain(s), {args.concurrency} image generations at a time...",
+          file=sys.stderr)
+    started = time.monotonic()
+    pipeline = Pipeline(api_key, args.concurrency, args.timeout, args.fresh,
+                        variants=media_variants.open_pool() if args.variants else None)
+    try:
+        failed = pipeline.run(chains)
+    finally:
+        polls = pipeline.scheduler.stats()["polls"]
+        pipeline.close()
+    print(f"Done in {time.monotonic() - started:.1f}s: {len(chains) - failed} succeeded, {failed} failed, "
+          f"{polls} status requests", file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.10"
+# dependencies = [
+#     "requests>=2.31.0",
+# ]
+# ///
+"""
+Streaming, resumable media downloads for generated images and videos.
+
+The response body is streamed in chunks into `<dest>.part` and renamed onto
+`dest` only after its length matches the server's Content-Length, so a reader
+never sees a half-written file and memory use stays flat for large MP4s.
+
+- Resume: when a transfer breaks, the download continues from the bytes
+  already on disk with an HTTP Range request (guarded by If-Range, so a changed
+  file restarts from zero) instead of starting over. A `.part` left behind by a
+  killed process is resumed the same way on the next call.
+- No extra probe round trip: the first GET's headers decide between streaming
+  it directly and switching to parallel ranges.
+- Range-parallel: files of at least SEGMENT_THRESHOLD bytes from servers that
+  advertise Accept-Ranges are fetched as `segments` concurrent byte ranges
+  into a preallocated `.part`; each segment resumes independently, and segment
+  progress is kept in `<dest>.part.json` so a restart only re-fetches what's
+  missing.
+- Every request has a connect/read timeout.
+
+Usage:
+    python3 media_download.py URL DEST [--segments 4]
+
+In code:
+    from media_download import download
+    path = download(url, "/tmp/out.mp4", session=session)
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+CHUNK_SIZE = 256 * 1024
+TIMEOUT = (10, 60)              # (connect, read) seconds
+RETRIES = 5
+SEGMENTS = 4
+SEGMENT_THRESHOLD = 8 * 1024 * 1024
+MIN_SEGMENT = 2 * 1024 * 1024
+
+
+class DownloadError(Exception):
+    """Download failed after all retries, or the result didn't match the expected length."""
+
+
+def _session(session):
+    if session is not None:
+        return session
+    import requests
+    return requests.Session()
+
+
+def _backoff(attempt):
+    time.sleep(min(8.0, 0.5 * 2 ** attempt))
+
+
+def _describe(response):
+    """(total length or None, server accepts ranges, validator for If-Range) from a response."""
+    validator = response.headers.get("ETag") or response.headers.get("Last-Modified")
+    if response.status_code == 206:
+        total = response.headers.get("Content-Range", "").rsplit("/", 1)[-1]
+        return (int(total) if total.isdigit() else None), True, validator
+    length = response.headers.get("Content-Length")
+    accepts_ranges = response.headers.get("Accept-Ranges", "").lower() == "bytes"
+    return (int(length) if length and length.isdigit() else None), accepts_ranges, validator
+
+
+def _open(session, url, have, validator, verify, timeout):
+    headers = {}
+    if have:
+        headers["Range"] = f"bytes={have}-"
+        if validator:
+            headers["If-Range"] = validator
+    response = session.get(url, headers=headers, stream=True, timeout=timeout, verify=verify)
+    if response.status_code == 416:
+        # The .part is already complete or longer than the file: start over.
+        response.close()
+        return None
+    response.raise_for_status()
+    return response
+
+
+# ========== Single stream ==========
+
+def _stream(session, url, part, response, verify, timeout, retries):
+    """Write `response` into `part`, re-requesting the missing tail on failure.
+
+    Returns the expected total length (None if the server never said).
+    """
+    import requests
+
+    total, accepts_ranges, validator = _describe(response) if response is not None else (None, False, None)
+    for attempt in range(retries + 1):
+        try:
+            if response is None:
+                have = part.stat().st_size if part.exists() else 0
+                if total is not None and have >= total:
+                    if have == total:
+                        return total
+                    have = 0
+                response = _open(session, url, have if accepts_ranges else 0, validator, verify, timeout)
+                if response is None:
+                    part.unlink(missing_ok=True)
+                    raise DownloadError("range not satisfiable")
+            with response:
+                if response.status_code == 206:
+                    mode = "ab"
+                    total = _describe(response)[0] or total
+                else:
+                    # Full body (no range support, or If-Range saw a new file): start over.
+                    mode = "wb"
+                    total, accepts_ranges, validator = _describe(response)
+                with open(part, mode) as f:
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        f.write(chunk)
+            response = None
+            if total is None or part.stat().st_size == total:
+                return total
+        except requests.exceptions.HTTPError as e:
+            status = e.response.status_code if e.response is not None else 0
+            if 400 <= status < 500 and status not in (408, 429):
+                raise DownloadError(f"HTTP {status} for {url}")
+        except (requests.exceptions.RequestException, DownloadError, OSError):
+            pass
+        response = None
+        if attempt < retries:
+            _backoff(attempt)
+    raise DownloadError(f"gave up on {url} after {retries + 1} attempts")
+
+
+# ========== Range-parallel ==========
+
+def _load_progress(state_path, total, validator, count):
+    try:
+        with open(state_path) as f:
+            state = json.load(f)
+        if state.get("total") == total and state.get("validator") == validator:
+            return [tuple(seg) for seg in state["segments"]]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    size = -(-total // count)
+    # [start, end inclusive, next byte to fetch]
+    return [(start, min(start + size, total) - 1, start) for start in range(0, total, size)]
+
+
+def _segmented(session, url, part, total, validator, count, verify, timeout, retries):
+    import requests
+
+    state_path = part.with_name(part.name + ".json")
+    segments = [list(seg) for seg in _load_progress(state_path, total, validator, count)]
+    if not part.exists() or part.stat().st_size != total:
+        with open(part, "wb") as f:
+            f.truncate(total)
+        segments = [[start, end, start] for start, end, _ in segments]
+    lock = threading.Lock()
+    errors = []
+
+    def save_progress():
+        with lock:
+            tmp = state_path.with_suffix(".tmp")
+            with open(tmp, "w") as f:
+                json.dump({"total": total, "validator": validator, "segments": segments}, f)
+            os.replace(tmp, state_path)
+
+    def fetch(segment):
+        start, end, _ = segment
+        for attempt in range(retries + 1):
+            offset = segment[2]
+            if offset > end:
+                return
+            headers = {"Range": f"bytes={offset}-{end}"}
+            if validator:
+                headers["If-Range"] = validator
+            try:
+                with session.get(url, headers=headers, stream=True, timeout=timeout, verify=verify) as response:
+                    if response.status_code != 206:
+                        raise DownloadError(f"server ignored Range (HTTP {response.status_code})")
+                    with open(part, "r+b") as f:
+                        f.seek(offset)
+                        for chunk in response.iter_content(CHUNK_SIZE):
+                            chunk = chunk[:end + 1 - segment[2]]
+                            f.write(chunk)
+                            segment[2] += len(chunk)
+                            if segment[2] > end:
+                                break
+                if segment[2] > end:
+                    save_progress()
+                    return
+            except DownloadError as e:
+                errors.append(e)
+                return
+            except (requests.exceptions.RequestException, OSError):
+                pass
+            save_progress()
+            if attempt < retries:
+                _backoff(attempt)
+        errors.append(DownloadError(f"segment {start}-{end} gave up after {retries + 1} attempts"))
+
+    threads = [threading.Thread(target=fetch, args=(seg,), daemon=True) for seg in segments if seg[2] <= seg[1]]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if errors:
+        raise errors[0]
+    state_path.unlink(missing_ok=True)
+
+
+# ========== Entry point ==========
+
+def download(url, dest, session=None, segments=SEGMENTS, verify=True, timeout=TIMEOUT, retries=RETRIES):
+    """Download `url` to `dest` (streamed, resumable, verified, atomic) and return the resolved path."""
+    import requests
+
+    session = _session(session)
+    dest = Path(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    part = dest.with_name(dest.name + ".part")
+    state_path = part.with_name(part.name + ".json")
+
+    # The first request doubles as the probe: small files are streamed from it
+    # directly, large range-capable ones are handed to the segmented path.
+    have = part.stat().st_size if part.exists() and not state_path.exists() else 0
+    response = None
+    for attempt in range(retries + 1):
+        try:
+            response = _open(session, url, have, None, verify, timeout)
+            if response is None:
+                part.unlink(missing_ok=True)
+                have = 0
+                continue
+            break
+        except requests.exceptions.HTTPError as e:
+            status = e.response.status_code if e.response is not None else 0
+            if 400 <= status < 500 and status not in (408, 429):
+                raise DownloadError(f"HTTP {status} for {url}")
+        except requests.exceptions.RequestException:
+            pass
+        if attempt < retries:
+            _backoff(attempt)
+    if response is None:
+        raise DownloadError(f"gave up on {url} after {retries + 1} attempts")
+
+    total, accepts_ranges, validator = _describe(response)
+    segment_count = min(segments, total // MIN_SEGMENT) if total else 1
+    if (response.status_code == 200 and accepts_ranges and total and total >= SEGMENT_THRESHOLD
+            and segment_count > 1):
+        response.close()
+        try:
+            _segmented(session, url, part, total, validator, segment_count, verify, timeout, retries)
+        except DownloadError:
+            # e.g. a CDN node that ignores Range after all: fall back to one stream
+            part.unlink(missing_ok=True)
+            state_path.unlink(missing_ok=True)
+            response = _open(session, url, 0, None, verify, timeout)
+            total = _stream(session, url, part, response, verify, timeout, retries)
+    else:
+        total = _stream(session, url, part, response, verify, timeout, retries)
+
+    size = part.stat().st_size
+    if total is not None and size != total:
+        raise DownloadError(f"length mismatch for {url}: got {size} bytes, expected {total}")
+    os.replace(part, dest)
+    return dest.resolve()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming, resumable media download")
+    parser.add_argument("url")
+    parser.add_argument("dest")
+    parser.add_argument("--segments", type=int, default=SEGMENTS, help=f"Parallel ranges for large files (default: {SEGMENTS})")
+    parser.add_argument("--no-verify-ssl", action="store_true", help="Disable SSL certificate verification")
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    try:
+        path = download(args.url, args.dest, segments=args.segments, verify=not args.no_verify_ssl)
+    except DownloadError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    size = path.stat().st_size
+    elapsed = time.monotonic() - started
+    print(f"Saved {size} bytes in {elapsed:.2f}s ({size / max(elapsed, 1e-6) / 1e6:.1f} MB/s): {path}")
+    print(f"MEDIA: {path}")
+
+
+if __name__ == "__main__":
+    main()
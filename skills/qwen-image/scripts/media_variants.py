@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Delivery-sized variants of generated media, rendered by a pool of ffmpeg processes.
+
+Full-size PNGs and MP4s are slow to upload to chat channels and slow to
+preview. For each file this renders, next to the original:
+
+    image:  <stem>.preview.webp   ≤1280 px wide, WebP q80
+            <stem>.preview.jpg    ≤1280 px wide, JPEG (for channels without WebP)
+            <stem>.thumb.jpg      ≤320 px wide
+    video:  <stem>.poster.jpg     representative frame, ≤1280 px wide
+            <stem>.poster-thumb.jpg  ≤320 px wide
+            <stem>.compact.mp4    H.264 CRF 28, ≤720 p, faststart (dropped if not smaller)
+
+Each variant is one ffmpeg subprocess, started from a small thread pool, so
+variants of files that are already downloaded render while later downloads
+are still running. ffmpeg is the separate process; the pool threads only wait
+on it (no fork of the multi-threaded caller, whose download, scheduler and
+SQLite threads may hold locks). Output is written to a temp name and renamed, so a
+half-written variant is never visible.
+
+Usage:
+    python3 media_variants.py output.png video.mp4 [--workers 4]
+
+    Prints a MEDIA: line per variant. The generation scripts do the same with
+    --variants.
+
+Environment:
+    QWEN_VARIANT_WORKERS   ffmpeg processes at once (default: half the CPUs)
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+VARIANT_WORKERS = int(os.environ.get("QWEN_VARIANT_WORKERS", "0")) or max(1, (os.cpu_count() or 2) // 2)
+FFMPEG_THREADS = 2
+FFMPEG_TIMEOUT = 300
+VIDEO_SUFFIXES = {".mp4", ".mov", ".webm", ".mkv"}
+
+PREVIEW_WIDTH = 1280
+THUMB_WIDTH = 320
+COMPACT_HEIGHT = 720
+
+
+def _scale(width):
+    return f"scale='min({width},iw)':-2"
+
+
+# variant name (also the file suffix) → ffmpeg output arguments
+IMAGE_VARIANTS = {
+    "preview.webp": ["-vf", _scale(PREVIEW_WIDTH), "-c:v", "libwebp", "-quality", "80"],
+    "preview.jpg": ["-vf", _scale(PREVIEW_WIDTH), "-q:v", "3"],
+    "thumb.jpg": ["-vf", _scale(THUMB_WIDTH), "-q:v", "5"],
+}
+VIDEO_VARIANTS = {
+    "poster.jpg": ["-vf", f"thumbnail=60,{_scale(PREVIEW_WIDTH)}", "-frames:v", "1", "-q:v", "3"],
+    "poster-thumb.jpg": ["-vf", f"thumbnail=60,{_scale(THUMB_WIDTH)}", "-frames:v", "1", "-q:v", "5"],
+    "compact.mp4": ["-map", "0:v:0", "-map", "0:a?", "-vf", f"scale=-2:'min({COMPACT_HEIGHT},ih)'",
+                    "-c:v", "libx264", "-preset", "veryfast", "-crf", "28", "-pix_fmt", "yuv420p",
+                    "-c:a", "aac", "-b:a", "96k", "-movflags", "+faststart"],
+}
+# A re-encode that is not smaller than the original is pointless to send.
+MUST_SHRINK = {"compact.mp4"}
+
+
+def available():
+    return shutil.which("ffmpeg") is not None
+
+
+def media_kind(path):
+    return "video" if Path(path).suffix.lower() in VIDEO_SUFFIXES else "image"
+
+
+def plan(source, kind=None):
+    """The variants to render for `source`: [{"source", "variant", "path", "args"}]."""
+    source = Path(source)
+    variants = VIDEO_VARIANTS if (kind or media_kind(source)) == "video" else IMAGE_VARIANTS
+    return [{"source": str(source), "variant": name, "path": str(source.with_name(f"{source.stem}.{name}")),
+             "args": args} for name, args in variants.items()]
+
+
+def render(job):
+    """Run ffmpeg for one planned variant (on a pool thread). Returns a result dict."""
+    started = time.monotonic()
+    dest = Path(job["path"])
+    tmp = dest.with_name(f".{dest.stem}.{os.getpid()}-{threading.get_ident()}.tmp{dest.suffix}")
+    result = {"source": job["source"], "variant": job["variant"], "path": None, "bytes": None, "error": None}
+    command = ["ffmpeg", "-y", "-v", "error", "-threads", str(FFMPEG_THREADS), "-i", job["source"],
+               *job["args"], str(tmp)]
+    try:
+        proc = subprocess.run(command, capture_output=True, text=True, timeout=FFMPEG_TIMEOUT)
+        if proc.returncode != 0:
+            raise RuntimeError((proc.stderr.strip().splitlines() or [f"exit {proc.returncode}"])[-1])
+        size = tmp.stat().st_size
+        if job["variant"] in MUST_SHRINK and size >= os.path.getsize(job["source"]):
+            result["error"] = "skipped: not smaller than the original"
+        else:
+            os.replace(tmp, dest)
+            result.update(path=str(dest), bytes=size)
+    except (OSError, RuntimeError, subprocess.TimeoutExpired) as e:
+        result["error"] = str(e) or type(e).__name__
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    result["elapsed_s"] = round(time.monotonic() - started, 2)
+    return result
+
+
+class VariantPool:
+    """ffmpeg workers that take files as they become ready; results arrive via callbacks."""
+
+    def __init__(self, workers=VARIANT_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ffmpeg")
+
+    def submit(self, source, kind=None, on_done=None):
+        """Queue every variant of `source`; `on_done(result)` is called as each one finishes."""
+        futures = []
+        for job in plan(source, kind):
+            future = self._pool.submit(render, job)
+            if on_done is not None:
+                future.add_done_callback(lambda f, job=job: on_done(_result(f, job)))
+            futures.append(future)
+        return futures
+
+    def close(self):
+        """Wait for every queued variant."""
+        self._pool.shutdown(wait=True)
+
+
+def open_pool(workers=VARIANT_WORKERS):
+    """A VariantPool for the scripts' --variants flag, or None (with a warning) without ffmpeg."""
+    if not available():
+        print("Warning: ffmpeg not found on PATH; skipping --variants", file=sys.stderr)
+        return None
+    return VariantPool(workers)
+
+
+def _result(future, job):
+    try:
+        return future.result()
+    except Exception as e:  # unexpected error outside render()'s own handling
+        return {"source": job["source"], "variant": job["variant"], "path": None, "bytes": None,
+                "error": f"{type(e).__name__}: {e}", "elapsed_s": None}
+
+
+def describe(result):
+    """One human-readable line for a variant result."""
+    if result["error"]:
+        return f"Variant {result['variant']}: {result['error']}"
+    return f"Variant {result['variant']}: {result['path']} ({result['bytes'] / 1024:.0f} KB)"
+
+
+def report(result):
+    """Print a variant result the way the generation scripts print their outputs."""
+    print(describe(result), flush=True)
+    if result["path"]:
+        print(f"MEDIA: {result['path']}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render delivery-sized variants of images and videos")
+    parser.add_argument("files", nargs="+", help="Images and/or videos")
+    parser.add_argument("--workers", "-w", type=int, default=VARIANT_WORKERS,
+                        help=f"ffmpeg processes at once (default: {VARIANT_WORKERS})")
+    args = parser.parse_args()
+
+    if not available():
+        print("Error: ffmpeg not found on PATH", file=sys.stderr)
+        sys.exit(1)
+
+    failed = []
+
+    def on_done(result):
+        report(result)
+        if result["error"] and not result["error"].startswith("skipped"):
+            failed.append(result)
+
+    pool = VariantPool(args.workers)
+    for path in args.files:
+        pool.submit(path, on_done=on_done)
+    pool.close()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Per-model telemetry for DashScope generations, and latency-aware model choice.
+
+Every image/video generation made by the qwen-image scripts is recorded in a
+local SQLite ledger: model, kind, submit-to-complete latency, queue time (for
+async tasks: DashScope's scheduled_time - submit_time), outcome and, once the
+file is downloaded, output size. Rate-limit rejections (HTTP 429) are not
+counted against a model.
+
+`--model auto [--deadline SECONDS]` in generate_image.py / generate_video.py
+asks choose() for the highest-quality model (QUALITY_ORDER) whose p95 latency
+over its last WINDOW_SAMPLES runs fits the deadline, skipping models that
+failed more than MAX_FAILURE_RATE of recent runs. Until a model has
+MIN_SAMPLES runs, PRIOR_P95 (a conservative guess) stands in for its p95. If
+no model fits, the fastest one is used.
+
+Usage:
+    python3 model_ledger.py stats [--kind image|video]
+    python3 model_ledger.py choose --kind video --deadline 180
+
+Environment:
+    QWEN_MODEL_LEDGER   ledger path (default <openclaw>/.openclaw/model_ledger.db)
+"""
+
+import argparse
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+OPENCLAW_ROOT = os.environ.get("OPENCLAW_HOME", os.path.dirname(os.path.dirname(os.path.dirname(SCRIPT_DIR))))
+LEDGER_PATH = os.environ.get("QWEN_MODEL_LEDGER", os.path.join(OPENCLAW_ROOT, ".openclaw", "model_ledger.db"))
+
+# Best first
+QUALITY_ORDER = {
+    "image": ["qwen-image-max", "qwen-image-plus-2026-01-09", "qwen-image-turbo"],
+    "video": ["wan2.6-i2v", "wan2.6-i2v-flash", "wan2.5-i2v-preview", "wan2.2-i2v-plus"],
+}
+# Seconds; used until a model has MIN_SAMPLES recorded runs
+PRIOR_P95 = {
+    "qwen-image-max": 60.0,
+    "qwen-image-plus-2026-01-09": 45.0,
+    "qwen-image-turbo": 20.0,
+    "wan2.6-i2v": 420.0,
+    "wan2.6-i2v-flash": 180.0,
+    "wan2.5-i2v-preview": 360.0,
+    "wan2.2-i2v-plus": 300.0,
+}
+WINDOW_SAMPLES = 50
+WINDOW_SECONDS = 7 * 24 * 3600
+MIN_SAMPLES = 5
+MAX_FAILURE_RATE = 0.5
+RETENTION_SECONDS = 30 * 24 * 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id       INTEGER PRIMARY KEY AUTOINCREMENT,
+    model        TEXT NOT NULL,
+    kind         TEXT NOT NULL,
+    status       TEXT NOT NULL,
+    latency_s    REAL,
+    queue_s      REAL,
+    output_bytes INTEGER,
+    url          TEXT,
+    error        TEXT,
+    created_at   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_model ON runs (model, created_at);
+CREATE INDEX IF NOT EXISTS runs_url ON runs (url);
+"""
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list (None if empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def task_queue_seconds(output):
+    """Queue time of a finished async task from its submit_time / scheduled_time, or None."""
+    try:
+        submitted = datetime.strptime(output["submit_time"], "%Y-%m-%d %H:%M:%S.%f")
+        scheduled = datetime.strptime(output["scheduled_time"], "%Y-%m-%d %H:%M:%S.%f")
+    except (KeyError, TypeError, ValueError):
+        return None
+    return max(0.0, (scheduled - submitted).total_seconds())
+
+
+class ModelLedger:
+    def __init__(self, path=LEDGER_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.db.execute("DELETE FROM runs WHERE created_at < ?", (time.time() - RETENTION_SECONDS,))
+        # Batch mode records from several threads over this one connection.
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.db.close()
+
+    # ----- writes -----
+
+    def record(self, model, kind, status, latency_s=None, queue_s=None, url=None, error=None):
+        """Record one generation; `status` is ok, failed or timeout."""
+        with self._lock:
+            self.db.execute(
+                "INSERT INTO runs (model, kind, status, latency_s, queue_s, url, error, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (model, kind, status, latency_s, queue_s, url, error, time.time()))
+
+    def record_task(self, result):
+        """Record a finished TaskScheduler result dict."""
+        status = {"SUCCEEDED": "ok", "TIMEOUT": "timeout"}.get(result["status"], "failed")
+        self.record(result["model"], result["kind"], status, result["elapsed_s"],
+                    task_queue_seconds(result["output"] or {}), url=result["url"], error=result["error"])
+
+    def record_output(self, url, output_bytes):
+        """Attach the downloaded file size to the run that produced `url`."""
+        if not url:
+            return
+        with self._lock:
+            self.db.execute("UPDATE runs SET output_bytes = ? WHERE url = ?", (output_bytes, url))
+
+    # ----- reads -----
+
+    def summary(self, model):
+        """Recent-window statistics for one model."""
+        with self._lock:
+            rows = self.db.execute(
+                "SELECT status, latency_s, queue_s, output_bytes FROM runs WHERE model = ? AND created_at >= ? "
+                "ORDER BY run_id DESC LIMIT ?",
+                (model, time.time() - WINDOW_SECONDS, WINDOW_SAMPLES)).fetchall()
+        # Timeouts missed any deadline shorter than they ran: they count as latency samples.
+        latencies = [r["latency_s"] for r in rows if r["status"] in ("ok", "timeout") and r["latency_s"] is not None]
+        queues = [r["queue_s"] for r in rows if r["queue_s"] is not None]
+        sizes = [r["output_bytes"] for r in rows if r["output_bytes"]]
+        failures = sum(1 for r in rows if r["status"] != "ok")
+        return {
+            "model": model,
+            "samples": len(rows),
+            "failures": failures,
+            "failure_rate": round(failures / len(rows), 3) if rows else None,
+            "p50_s": percentile(latencies, 50),
+            "p95_s": percentile(latencies, 95),
+            "queue_p50_s": percentile(queues, 50),
+            "mean_output_bytes": int(sum(sizes) / len(sizes)) if sizes else None,
+        }
+
+    def expected_p95(self, model, summary=None):
+        """(p95 seconds, "ledger" | "prior") for a model."""
+        summary = summary or self.summary(model)
+        if summary["samples"] >= MIN_SAMPLES and summary["p95_s"] is not None:
+            return summary["p95_s"], "ledger"
+        return PRIOR_P95.get(model), "prior"
+
+    def choose(self, kind, deadline=None, candidates=None):
+        """Highest-quality model expected to finish within `deadline` seconds.
+
+        Returns {"model", "p95_s", "source", "samples", "meets_deadline"}.
+        """
+        options = []
+        for model in candidates or QUALITY_ORDER[kind]:
+            summary = self.summary(model)
+            if summary["samples"] >= MIN_SAMPLES and summary["failure_rate"] > MAX_FAILURE_RATE:
+                continue
+            p95, source = self.expected_p95(model, summary)
+            choice = {"model": model, "p95_s": p95, "source": source, "samples": summary["samples"],
+                      "meets_deadline": deadline is None or (p95 is not None and p95 <= deadline)}
+            if choice["meets_deadline"]:
+                return choice
+            options.append(choice)
+        if not options:
+            # Every model is failing: fall back to the best one rather than refusing.
+            model = (candidates or QUALITY_ORDER[kind])[0]
+            return {"model": model, "p95_s": None, "source": "fallback", "samples": 0, "meets_deadline": False}
+        return min(options, key=lambda c: c["p95_s"] if c["p95_s"] is not None else float("inf"))
+
+    def estimates(self, kind):
+        """{(kind, model): median seconds} for TaskScheduler(estimates=...)."""
+        result = {}
+        for model in QUALITY_ORDER[kind]:
+            summary = self.summary(model)
+            if summary["samples"] >= MIN_SAMPLES and summary["p50_s"]:
+                result[(kind, model)] = summary["p50_s"]
+        return result
+
+
+def describe_choice(choice, deadline):
+    """One line for the scripts' output."""
+    basis = (f"p95 {choice['p95_s']:.0f}s over {choice['samples']} recent runs" if choice["source"] == "ledger"
+             else f"estimated p95 {choice['p95_s']:.0f}s, not enough recorded runs" if choice["p95_s"]
+             else "no usable data")
+    if deadline is None:
+        return f"Auto-selected model: {choice['model']} ({basis})"
+    verdict = "fits" if choice["meets_deadline"] else "no model fits; fastest available for"
+    return f"Auto-selected model: {choice['model']} ({basis}; {verdict} the {deadline:.0f}s deadline)"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DashScope model telemetry ledger")
+    parser.add_argument("command", choices=["stats", "choose"])
+    parser.add_argument("--kind", choices=["image", "video"], help="Limit to image or video models")
+    parser.add_argument("--deadline", type=float, help="choose: seconds the generation must finish within")
+    args = parser.parse_args()
+
+    ledger = ModelLedger()
+    if args.command == "choose":
+        if not args.kind:
+            parser.error("choose needs --kind")
+        choice = ledger.choose(args.kind, args.deadline)
+        print(describe_choice(choice, args.deadline))
+        print(json.dumps(choice))
+        return
+
+    kinds = [args.kind] if args.kind else list(QUALITY_ORDER)
+    print(f"{'model':<28}{'runs':>6}{'fail%':>7}{'p50 s':>8}{'p95 s':>8}{'queue s':>9}{'avg MB':>8}")
+    for kind in kinds:
+        for model in QUALITY_ORDER[kind]:
+            s = ledger.summary(model)
+            fmt = lambda v, spec: format(v, spec) if v is not None else "-"
+            print(f"{model:<28}{s['samples']:>6}"
+                  f"{fmt(s['failure_rate'] * 100 if s['failure_rate'] is not None else None, '.0f'):>7}"
+                  f"{fmt(s['p50_s'], '.1f'):>8}{fmt(s['p95_s'], '.1f'):>8}{fmt(s['queue_p50_s'], '.1f'):>9}"
+                  f"{fmt(s['mean_output_bytes'] / 1e6 if s['mean_output_bytes'] else None, '.2f'):>8}")
+
+
+if __name__ == "__main__":
+    main()
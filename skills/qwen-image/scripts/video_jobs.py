@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Persistent journal of DashScope video tasks (SQLite), so a paid generation
+survives the process that submitted it.
+
+Every job is written to the journal *before* it is submitted (state NEW) and
+gets its task ID the moment DashScope returns one (SUBMITTED). Pollers move it
+to SUCCEEDED (video URL known), then DOWNLOADED once the file is on disk, or
+to FAILED. A job that is not final can be re-attached by any later process:
+`generate_video.py resume` / `collect` poll all of them together through one
+TaskScheduler and download the finished videos. A NEW row whose process died
+before the task ID came back is reported as ORPHANED by collectors rather than
+resubmitted, because DashScope may already be running (and billing) it; rerunning
+the same request (generate_video.py or image_to_video.py, both via open_job)
+claims such a row and submits it.
+
+Ownership: a job is owned by the pid that last claimed it. Collectors skip
+jobs whose owner is still alive, so a foreground generate_video.py and a
+background collector never poll or download the same task twice.
+
+Environment:
+    QWEN_VIDEO_JOURNAL   journal path (default <openclaw>/.openclaw/video_jobs.db)
+"""
+
+import json
+import os
+import sqlite3
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+OPENCLAW_ROOT = os.environ.get("OPENCLAW_HOME", os.path.dirname(os.path.dirname(os.path.dirname(SCRIPT_DIR))))
+JOURNAL_PATH = os.environ.get("QWEN_VIDEO_JOURNAL", os.path.join(OPENCLAW_ROOT, ".openclaw", "video_jobs.db"))
+
+ACTIVE_STATES = ("NEW", "SUBMITTED", "RUNNING", "SUCCEEDED")
+FINAL_STATES = ("DOWNLOADED", "FAILED", "ORPHANED")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id       INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_id      TEXT UNIQUE,
+    model        TEXT NOT NULL,
+    params       TEXT NOT NULL,
+    out_path     TEXT,
+    state        TEXT NOT NULL,
+    video_url    TEXT,
+    error        TEXT,
+    owner_pid    INTEGER,
+    created_at   REAL NOT NULL,
+    submitted_at REAL,
+    updated_at   REAL NOT NULL,
+    finished_at  REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state);
+"""
+
+
+def _pid_alive(pid):
+    if not pid:
+        return False
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    try:
+        # A killed process can linger as a zombie until its parent reaps it.
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except (OSError, IndexError):
+        return True
+
+
+class VideoJournal:
+    def __init__(self, path=JOURNAL_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    # ----- writes -----
+
+    def create(self, model, params, out_path):
+        """Journal a job before submitting it; returns its job_id."""
+        now = time.time()
+        cur = self.db.execute(
+            "INSERT INTO jobs (model, params, out_path, state, owner_pid, created_at, updated_at) "
+            "VALUES (?, ?, ?, 'NEW', ?, ?, ?)",
+            (model, json.dumps(params, sort_keys=True, ensure_ascii=False),
+             os.path.abspath(out_path) if out_path else None, os.getpid(), now, now))
+        return cur.lastrowid
+
+    def submitted(self, job_id, task_id):
+        now = time.time()
+        self.db.execute("UPDATE jobs SET task_id = ?, state = 'SUBMITTED', submitted_at = ?, updated_at = ? "
+                        "WHERE job_id = ?", (task_id, now, now, job_id))
+
+    def update(self, job_id, state, video_url=None, error=None):
+        now = time.time()
+        finished = now if state in FINAL_STATES else None
+        self.db.execute(
+            "UPDATE jobs SET state = ?, video_url = COALESCE(?, video_url), error = ?, updated_at = ?, "
+            "finished_at = COALESCE(?, finished_at) WHERE job_id = ?",
+            (state, video_url, error, now, finished, job_id))
+
+    def claim(self, job_id):
+        """Take ownership of an active job unless a live process already owns it."""
+        with self.db:
+            self.db.execute("BEGIN IMMEDIATE")
+            row = self.db.execute("SELECT owner_pid FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None or (row["owner_pid"] != os.getpid() and _pid_alive(row["owner_pid"])):
+                return False
+            self.db.execute("UPDATE jobs SET owner_pid = ?, updated_at = ? WHERE job_id = ?",
+                            (os.getpid(), time.time(), job_id))
+            return True
+
+    def open_job(self, model, params, out_path, fresh=False):
+        """
+        The job to run a request under, as (job, how):
+            "new"       no unfinished job for it (or fresh=True): a NEW row was created, submit it
+            "resubmit"  a NEW row whose process died before submitting: claimed, submit it
+            "reattach"  a submitted job whose owner is gone: claimed, poll job["task_id"]
+            "busy"      a live process (job["owner_pid"]) is handling it already
+        """
+        existing = None if fresh else self.find_active(params, out_path)
+        if existing is None:
+            return self.get(self.create(model, params, out_path)), "new"
+        if not self.claim(existing["job_id"]):
+            return existing, "busy"
+        return existing, "resubmit" if existing["state"] == "NEW" else "reattach"
+
+    def release(self, job_id):
+        self.db.execute("UPDATE jobs SET owner_pid = NULL WHERE job_id = ? AND owner_pid = ?",
+                        (job_id, os.getpid()))
+
+    # ----- reads -----
+
+    def get(self, job_id=None, task_id=None):
+        if task_id is not None:
+            row = self.db.execute("SELECT * FROM jobs WHERE task_id = ?", (task_id,)).fetchone()
+        else:
+            row = self.db.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def find_active(self, params, out_path):
+        """An unfinished (or finished-but-not-downloaded) job for the same request and output."""
+        row = self.db.execute(
+            f"SELECT * FROM jobs WHERE params = ? AND out_path IS ? AND state IN ({','.join('?' * len(ACTIVE_STATES))}) "
+            "ORDER BY job_id DESC LIMIT 1",
+            (json.dumps(params, sort_keys=True, ensure_ascii=False),
+             os.path.abspath(out_path) if out_path else None, *ACTIVE_STATES)).fetchone()
+        return dict(row) if row else None
+
+    def unfinished(self):
+        """Active jobs not owned by a live process. NEW rows of dead owners become ORPHANED."""
+        rows = self.db.execute(
+            f"SELECT * FROM jobs WHERE state IN ({','.join('?' * len(ACTIVE_STATES))}) ORDER BY job_id",
+            ACTIVE_STATES).fetchall()
+        jobs = []
+        for row in rows:
+            job = dict(row)
+            if job["owner_pid"] != os.getpid() and _pid_alive(job["owner_pid"]):
+                continue
+            if job["state"] == "NEW":
+                self.update(job["job_id"], "ORPHANED",
+                            error="process died before DashScope returned a task ID; not resubmitted")
+                continue
+            jobs.append(job)
+        return jobs
+
+    def recent(self, limit=20):
+        rows = self.db.execute("SELECT * FROM jobs ORDER BY job_id DESC LIMIT ?", (limit,)).fetchall()
+        return [dict(row) for row in rows]
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark of the qwen-image client code against mock_dashscope.py.
+
+Measures, without API credit:
+  1. batch throughput: generate_image.py's batch mode at several concurrency
+     levels (images/s, wall time);
+  2. polling overhead: TaskScheduler vs. the old one-thread-per-task fixed 5 s
+     poller: status requests per task and the lag between a task finishing on
+     the server and the client noticing;
+  3. download speed: requests.get().content vs. media_download with one stream
+     and with parallel ranges, under a per-connection bandwidth cap (MB/s and
+     peak Python memory).
+
+All DashScope latencies (and the client poll intervals) are multiplied by
+--time-scale, so the default run replays ~minutes of traffic in seconds.
+
+Usage:
+    python3 bench_media.py
+    python3 bench_media.py --time-scale 0.05 --images 48 --videos 40 --json
+"""
+
+import argparse
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.join(os.path.dirname(TEST_DIR), "scripts")
+sys.path.insert(0, SCRIPTS_DIR)
+sys.path.insert(0, TEST_DIR)
+
+LEGACY_POLL_INTERVAL = 5.0   # generate_video.py before the TaskScheduler
+
+
+# ========== 1. Batch throughput ==========
+
+def bench_batch(gi, count, levels, tmp):
+    rows = []
+    for concurrency in levels:
+        items = [{"index": i, "id": f"c{concurrency}-{i}", "prompt": f"bench {concurrency} {i}",
+                  "model": "qwen-image-max", "size": "1024*1024", "negative_prompt": "",
+                  "prompt_extend": False, "watermark": False,
+                  "filename": os.path.join(tmp, f"batch-{concurrency}", f"{i:03d}.png")}
+                 for i in range(count)]
+        cache = gi.GenerationCache(os.path.join(tmp, f"cache-{concurrency}"))
+        started = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            failed = gi.run_batch(items, "mock", concurrency, True, cache)
+        elapsed = time.perf_counter() - started
+        rows.append({"concurrency": concurrency, "images": count, "failed": failed,
+                     "wall_s": round(elapsed, 3), "images_per_s": round(count / elapsed, 2)})
+    return rows
+
+
+# ========== 2. Polling overhead ==========
+
+def _lags(server, finished_at):
+    with server.state.lock:
+        ends = {task_id: task["end"] for task_id, task in server.state.tasks.items()}
+    return [finished_at[t] - ends[t] for t in finished_at if t in ends]
+
+
+def _poll_stats(name, server, submitted, finished_at, polls_before):
+    polls = server.state.stats["polls"] - polls_before
+    lags = _lags(server, finished_at)
+    return {"poller": name, "tasks": len(submitted), "status_requests": polls,
+            "requests_per_task": round(polls / max(1, len(submitted)), 2),
+            "lag_mean_s": round(statistics.mean(lags), 3) if lags else None,
+            "lag_max_s": round(max(lags), 3) if lags else None}
+
+
+def bench_polling(dt, server, count, scale):
+    rows = []
+    session = dt.create_session(pool_size=32)
+
+    # Legacy: one blocking loop per task, fixed interval.
+    polls_before = server.state.stats["polls"]
+    submitted = [dt.submit_video_task(session, "mock", f"legacy {i}") for i in range(count)]
+    finished_at = {}
+
+    def legacy(task_id):
+        while True:
+            time.sleep(LEGACY_POLL_INTERVAL * scale)
+            if dt.fetch_task(session, "mock", task_id).get("task_status") in dt.FINAL_STATUSES:
+                finished_at[task_id] = time.monotonic()
+                return
+
+    threads = [threading.Thread(target=legacy, args=(t,)) for t in submitted]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    rows.append(_poll_stats("fixed 5 s per task", server, submitted, finished_at, polls_before))
+
+    # TaskScheduler, cold (default prior) and after learning from the first run.
+    scheduler = dt.TaskScheduler("mock", session=session, poll_workers=8,
+                                 min_interval=dt.MIN_POLL_INTERVAL * scale,
+                                 max_interval=dt.MAX_POLL_INTERVAL * scale,
+                                 estimates={("video", "wan2.6-i2v-flash"): dt.INITIAL_ESTIMATE["video"] * scale})
+    for label in ("scheduler (cold)", "scheduler (learned)"):
+        polls_before = server.state.stats["polls"]
+        submitted = [dt.submit_video_task(session, "mock", f"{label} {i}") for i in range(count)]
+        for task_id in submitted:
+            scheduler.add(task_id, kind="video", model="wan2.6-i2v-flash")
+        finished_at = {}
+        for result in scheduler.as_completed():
+            finished_at[result["task_id"]] = time.monotonic()
+        rows.append(_poll_stats(label, server, submitted, finished_at, polls_before))
+    scheduler.close()
+    return rows
+
+
+# ========== 3. Downloads ==========
+
+def bench_download(md, base_url, tmp):
+    import requests
+
+    url = f"{base_url}/media/bench-download.mp4"
+    rows = []
+
+    def naive(dest):
+        with open(dest, "wb") as f:
+            f.write(requests.get(url, timeout=60).content)
+
+    cases = [
+        ("requests.get().content", naive),
+        ("media_download 1 stream", lambda dest: md.download(url, dest, segments=1)),
+        ("media_download 4 ranges", lambda dest: md.download(url, dest, segments=4)),
+    ]
+    for name, fetch in cases:
+        dest = os.path.join(tmp, name.replace(" ", "_").replace("()", "").replace(".", "_") + ".mp4")
+        tracemalloc.start()
+        started = time.perf_counter()
+        fetch(dest)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        size = os.path.getsize(dest)
+        rows.append({"method": name, "bytes": size, "wall_s": round(elapsed, 3),
+                     "mb_per_s": round(size / elapsed / 1e6, 2), "peak_alloc_mb": round(peak / 1e6, 2)})
+    return rows
+
+
+# ========== Main ==========
+
+def print_tables(report):
+    print("1. Batch image generation")
+    print(f"   {'concurrency':>11}{'images':>8}{'failed':>8}{'wall s':>9}{'img/s':>8}")
+    for r in report["batch"]:
+        print(f"   {r['concurrency']:>11}{r['images']:>8}{r['failed']:>8}{r['wall_s']:>9.2f}{r['images_per_s']:>8.2f}")
+    print("2. Video task polling")
+    print(f"   {'poller':<22}{'tasks':>6}{'requests':>10}{'per task':>10}{'lag mean':>10}{'lag max':>9}")
+    for r in report["polling"]:
+        print(f"   {r['poller']:<22}{r['tasks']:>6}{r['status_requests']:>10}{r['requests_per_task']:>10.2f}"
+              f"{r['lag_mean_s']:>10.3f}{r['lag_max_s']:>9.3f}")
+    print(f"3. Downloads ({report['config']['video_mb']} MB, {report['config']['bandwidth']} MB/s per connection)")
+    print(f"   {'method':<26}{'wall s':>8}{'MB/s':>8}{'peak MB':>9}")
+    for r in report["download"]:
+        print(f"   {r['method']:<26}{r['wall_s']:>8.2f}{r['mb_per_s']:>8.2f}{r['peak_alloc_mb']:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="qwen-image client benchmark against the mock DashScope server")
+    parser.add_argument("--time-scale", type=float, default=0.02, help="latency multiplier (default 0.02)")
+    parser.add_argument("--images", type=int, default=24, help="images per batch run (default 24)")
+    parser.add_argument("--levels", default="1,4,8", help="batch concurrency levels (default 1,4,8)")
+    parser.add_argument("--videos", type=int, default=20, help="video tasks per polling run (default 20)")
+    parser.add_argument("--video-mb", type=float, default=24, help="download size in MB (default 24)")
+    parser.add_argument("--bandwidth", type=float, default=40, help="MB/s per media connection (default 40)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="JSON output")
+    args = parser.parse_args()
+
+    from mock_dashscope import offline_env, start_mock_server
+
+    with tempfile.TemporaryDirectory(prefix="bench_media_") as tmp:
+        server, base_url = start_mock_server(time_scale=args.time_scale, seed=args.seed,
+                                             video_bytes=int(args.video_mb * 1e6), bandwidth=args.bandwidth)
+        # The scripts read these at import time: keep the benchmark off the real
+        # shared ledgers and out from under the production DashScope rate limit.
+        os.environ.update(offline_env(os.path.join(tmp, "state")), DASHSCOPE_BASE_URL=base_url)
+        import dashscope_tasks as dt
+        import generate_image as gi
+        import media_download as md
+
+        print(f"🧪 Mock DashScope: {base_url} (time scale {args.time_scale})", file=sys.stderr)
+        try:
+            report = {
+                "config": {"time_scale": args.time_scale, "seed": args.seed,
+                           "video_mb": args.video_mb, "bandwidth": args.bandwidth},
+                "batch": bench_batch(gi, args.images, [int(v) for v in args.levels.split(",")], tmp),
+                "polling": bench_polling(dt, server, args.videos, args.time_scale),
+                "download": bench_download(md, base_url, tmp),
+                "server": dict(server.state.stats),
+            }
+        finally:
+            server.shutdown()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_tables(report)
+
+
+if __name__ == "__main__":
+    main()
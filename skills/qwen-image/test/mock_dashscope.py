@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the DashScope endpoints used by the qwen-image scripts.
+
+Serves, with no API key or credit needed:
+    POST /api/v1/services/aigc/multimodal-generation/generation   sync image (generate_image.py)
+    POST /api/v1/services/aigc/text2image/image-synthesis          async image task
+    POST /api/v1/services/aigc/video-generation/video-synthesis    async video task
+    GET  /api/v1/tasks/{task_id}                                   PENDING → RUNNING → SUCCEEDED / FAILED
+    GET  /media/{name}                                             fake PNG / MP4 (Range, ETag, throttling)
+    GET  /_stats                                                   request / poll / 429 / byte counters
+
+Point the scripts at it with DASHSCOPE_BASE_URL=http://127.0.0.1:PORT (any
+API key is accepted). On start it prints an `export` line that also moves the
+scripts' ledgers, journal and cache to a temp directory (see offline_env), so
+test runs never throttle or pollute real generations on the same host.
+
+Latencies are drawn from distributions given as "kind:args" (seconds):
+    fixed:2   uniform:1,3   normal:20,5   lognormal:3.0,0.4 (mu, sigma of ln s)   exp:10
+and all of them are multiplied by --time-scale, so a benchmark can replay
+minutes of DashScope behaviour in seconds. Async tasks wait in the queue for
+--queue-latency, then run for --image-latency / --video-latency; --fail-rate
+of them end FAILED. Submissions beyond --rps per second (token bucket) or
+beyond --max-running unfinished tasks get a 429 with Retry-After, like
+DashScope's Throttling responses. --bandwidth caps each media connection's
+throughput (MB/s), so range-parallel downloads show their benefit.
+
+Usage:
+    python3 mock_dashscope.py --port 8790 --time-scale 0.1 --video-latency lognormal:4.4,0.3
+
+In code:
+    server, base_url = start_mock_server(time_scale=0.05, rps=20)
+    ...
+    server.shutdown()
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import shlex
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+DEFAULTS = {
+    "time_scale": 1.0,
+    "sync_latency": "lognormal:2.3,0.3",      # ~10 s multimodal-generation
+    "queue_latency": "exp:2",
+    "image_latency": "lognormal:2.5,0.3",     # ~12 s
+    "video_latency": "lognormal:4.4,0.3",     # ~80 s
+    "fail_rate": 0.0,
+    "rps": 0.0,                               # 0 = unlimited
+    "max_running": 0,                         # 0 = unlimited
+    "image_bytes": 1_500_000,
+    "video_bytes": 12_000_000,
+    "bandwidth": 0.0,                         # MB/s per connection, 0 = unlimited
+    "seed": None,
+}
+CHUNK = 64 * 1024
+
+
+def parse_distribution(spec):
+    """'lognormal:3.0,0.4' → zero-argument sampler returning seconds."""
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v]
+    samplers = {
+        "fixed": lambda rng: values[0],
+        "uniform": lambda rng: rng.uniform(values[0], values[1]),
+        "normal": lambda rng: max(0.0, rng.gauss(values[0], values[1])),
+        "lognormal": lambda rng: rng.lognormvariate(values[0], values[1]),
+        "exp": lambda rng: rng.expovariate(1 / values[0]) if values[0] > 0 else 0.0,
+    }
+    if kind not in samplers:
+        raise ValueError(f"unknown distribution: {spec}")
+    return samplers[kind]
+
+
+class MockState:
+    def __init__(self, **config):
+        self.config = {**DEFAULTS, **{k: v for k, v in config.items() if v is not None}}
+        self.rng = random.Random(self.config["seed"])
+        self.lock = threading.Lock()
+        self.samplers = {name: parse_distribution(self.config[name])
+                         for name in ("sync_latency", "queue_latency", "image_latency", "video_latency")}
+        self.tasks = {}
+        self.stats = {"submits": 0, "sync_generations": 0, "polls": 0, "throttled": 0,
+                      "media_requests": 0, "media_bytes": 0}
+        self.tokens = self.config["rps"]
+        self.refilled = time.monotonic()
+
+    def sample(self, name):
+        with self.lock:
+            return self.samplers[name](self.rng) * self.config["time_scale"]
+
+    def count(self, key, n=1):
+        with self.lock:
+            self.stats[key] += n
+
+    def admit(self):
+        """Token bucket + running-task cap; returns None or the Retry-After seconds."""
+        rps, cap = self.config["rps"], self.config["max_running"]
+        with self.lock:
+            now = time.monotonic()
+            if cap:
+                running = sum(1 for t in self.tasks.values() if t["end"] > now)
+                if running >= cap:
+                    self.stats["throttled"] += 1
+                    return 1
+            if rps:
+                self.tokens = min(rps, self.tokens + (now - self.refilled) * rps)
+                self.refilled = now
+                if self.tokens < 1:
+                    self.stats["throttled"] += 1
+                    return max(1, math.ceil((1 - self.tokens) / rps))
+                self.tokens -= 1
+        return None
+
+    def create_task(self, kind, model):
+        queued = self.sample("queue_latency")
+        running = self.sample(f"{kind}_latency")
+        now = time.monotonic()
+        with self.lock:
+            failed = self.rng.random() < self.config["fail_rate"]
+            task_id = str(uuid.UUID(int=self.rng.getrandbits(128)))
+            self.tasks[task_id] = {"kind": kind, "model": model, "submitted": now,
+                                   "start": now + queued, "end": now + queued + running, "failed": failed}
+            self.stats["submits"] += 1
+        return task_id
+
+    def task_status(self, task_id):
+        with self.lock:
+            task = self.tasks.get(task_id)
+        if task is None:
+            return None, None
+        now = time.monotonic()
+        if now < task["start"]:
+            return task, "PENDING"
+        if now < task["end"]:
+            return task, "RUNNING"
+        return task, "FAILED" if task["failed"] else "SUCCEEDED"
+
+
+def media_block(name):
+    """Deterministic fake media content for `name`: one CHUNK-sized block, repeated to the file size."""
+    block = hashlib.sha256(name.encode()).digest() * (CHUNK // 32)
+    header = b"\x89PNG\r\n\x1a\n" if name.endswith(".png") else b"\x00\x00\x00\x18ftypmp42"
+    return header + block[len(header):]
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None  # set by start_mock_server
+
+    # ----- helpers -----
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _throttled(self, retry_after):
+        self._send_json(429, {"code": "Throttling.RateQuota", "message": "Requests rate limit exceeded, please try again later.",
+                              "request_id": str(uuid.uuid4())}, {"Retry-After": str(retry_after)})
+
+    @staticmethod
+    def _wall_time(monotonic_time):
+        """DashScope's task timestamp format for a monotonic instant."""
+        wall = time.time() - (time.monotonic() - monotonic_time)
+        return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(wall)) + f".{int(wall * 1000) % 1000:03d}"
+
+    def _media_url(self, task_id, ext):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/media/{task_id}.{ext}"
+
+    # ----- routes -----
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"code": "InvalidParameter", "message": "bad json"})
+            return
+        if not self.headers.get("Authorization", "").startswith("Bearer "):
+            self._send_json(401, {"code": "InvalidApiKey", "message": "No API-key provided."})
+            return
+        model = body.get("model", "")
+        path = self.path.split("?", 1)[0]
+
+        if path.endswith("/multimodal-generation/generation"):
+            retry_after = self.state.admit()
+            if retry_after:
+                self._throttled(retry_after)
+                return
+            time.sleep(self.state.sample("sync_latency"))
+            self.state.count("sync_generations")
+            if self.state.rng.random() < self.state.config["fail_rate"]:
+                self._send_json(200, {"code": "InternalError", "message": "mock generation failed"})
+                return
+            image_id = uuid.uuid4().hex
+            self._send_json(200, {
+                "output": {"choices": [{"finish_reason": "stop", "message": {
+                    "role": "assistant", "content": [{"image": self._media_url(image_id, "png")}]}}]},
+                "usage": {"width": 1664, "height": 928, "image_count": 1},
+                "request_id": str(uuid.uuid4()),
+            })
+            return
+
+        kind = "video" if path.endswith("/video-synthesis") else "image" if path.endswith("/image-synthesis") else None
+        if kind is None:
+            self._send_json(404, {"code": "NotFound", "message": path})
+            return
+        if self.headers.get("X-DashScope-Async") != "enable":
+            self._send_json(403, {"code": "AccessDenied", "message": "current user api does not support synchronous calls"})
+            return
+        retry_after = self.state.admit()
+        if retry_after:
+            self._throttled(retry_after)
+            return
+        task_id = self.state.create_task(kind, model)
+        self._send_json(200, {"output": {"task_id": task_id, "task_status": "PENDING"},
+                              "request_id": str(uuid.uuid4())})
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/_stats":
+            with self.state.lock:
+                self._send_json(200, {**self.state.stats, "tasks": len(self.state.tasks)})
+            return
+
+        match = re.fullmatch(r"/api/v1/tasks/([\w-]+)", path)
+        if match:
+            self.state.count("polls")
+            task, status = self.state.task_status(match.group(1))
+            if task is None:
+                self._send_json(200, {"output": {"task_id": match.group(1), "task_status": "UNKNOWN"}})
+                return
+            output = {"task_id": match.group(1), "task_status": status,
+                      "submit_time": self._wall_time(task["submitted"])}
+            if status != "PENDING":
+                output["scheduled_time"] = self._wall_time(task["start"])
+            if status in ("SUCCEEDED", "FAILED"):
+                output["end_time"] = self._wall_time(task["end"])
+            if status == "SUCCEEDED":
+                if task["kind"] == "video":
+                    output["video_url"] = self._media_url(match.group(1), "mp4")
+                else:
+                    output["results"] = [{"url": self._media_url(match.group(1), "png")}]
+            elif status == "FAILED":
+                output.update(code="InternalError", message="mock task failed")
+            body = {"output": output, "request_id": str(uuid.uuid4())}
+            if status == "SUCCEEDED":
+                body["usage"] = {"video_count": 1} if task["kind"] == "video" else {"image_count": 1}
+            self._send_json(200, body)
+            return
+
+        match = re.fullmatch(r"/media/([\w.-]+)", path)
+        if match:
+            self._serve_media(match.group(1))
+            return
+        self._send_json(404, {"code": "NotFound", "message": path})
+
+    def _serve_media(self, name):
+        size = self.state.config["video_bytes" if name.endswith(".mp4") else "image_bytes"]
+        block = media_block(name)
+        etag = f'"{hashlib.md5(name.encode()).hexdigest()}"'
+        start, end, status = 0, size - 1, 200
+        match = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if match and self.headers.get("If-Range", etag) == etag:
+            start = int(match.group(1))
+            end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            if start >= size:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            status = 206
+        self.state.count("media_requests")
+        self.send_response(status)
+        self.send_header("Content-Type", "video/mp4" if name.endswith(".mp4") else "image/png")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+
+        bandwidth = self.state.config["bandwidth"] * 1e6
+        sent, began = 0, time.monotonic()
+        offset = start
+        try:
+            while offset <= end:
+                within = offset % CHUNK
+                chunk = block[within:within + min(CHUNK - within, end + 1 - offset)]
+                self.wfile.write(chunk)
+                offset += len(chunk)
+                sent += len(chunk)
+                if bandwidth:
+                    ahead = sent / bandwidth - (time.monotonic() - began)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self.state.count("media_bytes", sent)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_mock_server(host="127.0.0.1", port=0, **config):
+    """Start the mock in a background thread; returns (server, base_url)."""
+    state = MockState(**config)
+    handler = type("BoundMockHandler", (MockHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.state = state
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def offline_env(directory):
+    """Environment for scripts run against the mock.
+
+    Points every piece of shared state (API quota ledger, model ledger, video
+    journal, media cache) at `directory`, so mock traffic and simulated 429s
+    never touch the real ledgers under .openclaw/, and lifts the shared
+    DashScope rate limit so the mock's own --rps is the only throttle.
+    """
+    return {
+        "DASHSCOPE_API_KEY": "mock",
+        "API_QUOTA_DB": os.path.join(directory, "api_quota.db"),
+        "API_QUOTA_DASHSCOPE": "rate=100000,burst=100000",
+        "QWEN_MODEL_LEDGER": os.path.join(directory, "model_ledger.db"),
+        "QWEN_VIDEO_JOURNAL": os.path.join(directory, "video_jobs.db"),
+        "QWEN_MEDIA_CACHE_DIR": os.path.join(directory, "media_cache"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock DashScope server for offline tests and benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--time-scale", type=float, default=DEFAULTS["time_scale"], help="multiply every latency (default 1)")
+    parser.add_argument("--sync-latency", default=DEFAULTS["sync_latency"], help="multimodal-generation latency")
+    parser.add_argument("--queue-latency", default=DEFAULTS["queue_latency"], help="async task time in PENDING")
+    parser.add_argument("--image-latency", default=DEFAULTS["image_latency"], help="async image task run time")
+    parser.add_argument("--video-latency", default=DEFAULTS["video_latency"], help="async video task run time")
+    parser.add_argument("--fail-rate", type=float, default=DEFAULTS["fail_rate"], help="fraction of generations that fail")
+    parser.add_argument("--rps", type=float, default=DEFAULTS["rps"], help="submissions per second before 429 (0 = unlimited)")
+    parser.add_argument("--max-running", type=int, default=DEFAULTS["max_running"], help="unfinished tasks before 429 (0 = unlimited)")
+    parser.add_argument("--image-bytes", type=int, default=DEFAULTS["image_bytes"])
+    parser.add_argument("--video-bytes", type=int, default=DEFAULTS["video_bytes"])
+    parser.add_argument("--bandwidth", type=float, default=DEFAULTS["bandwidth"], help="MB/s per media connection (0 = unlimited)")
+    parser.add_argument("--seed", type=int, help="random seed for reproducible latencies")
+    args = parser.parse_args()
+
+    config = {k: v for k, v in vars(args).items() if k not in ("host", "port")}
+    server, base_url = start_mock_server(args.host, args.port, **config)
+    print(f"🧪 Mock DashScope: {base_url}", file=sys.stderr)
+    env = dict(offline_env(tempfile.mkdtemp(prefix="mock_dashscope_")), DASHSCOPE_BASE_URL=base_url)
+    print("   export " + " ".join(f"{k}={shlex.quote(v)}" for k, v in env.items()), file=sys.stderr)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
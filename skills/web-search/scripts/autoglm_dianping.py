@@ -20,6 +20,15 @@ import argparse
 from pathlib import Path
 from typing import Optional
 
+# 共享 API 配额（可选，skills/api-quota）：多个进程共用 ZAI_API_KEY 时按速率排队
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "api-quota", "scripts"))
+try:
+    import api_quota
+except ImportError:
+    api_quota = None
+# 额度不足（等待超时或月度用完）时 acquire 抛出的异常；没有 api_quota 时为空元组，不匹配任何异常
+QUOTA_ERRORS = (api_quota.QuotaExceeded,) if api_quota is not None else ()
+
 # ========== 配置 ==========
 ANDROID_HOME = os.environ.get("ANDROID_HOME", "/Users/linhuasun/Desktop/OPENCLAW/.openclaw/android-sdk")
 ADB = os.path.join(ANDROID_HOME, "platform-tools", "adb")
@@ -128,12 +137,28 @@ class ADBController:
 
 
 # ========== AutoGLM API ==========
+def _zai_urlopen(req, data, timeout):
+    """urlopen 之前先申请 ZAI 额度；遇到 429 按 Retry-After 通知其他进程一起等待"""
+    import urllib.error
+    import urllib.request as ur
+
+    if api_quota is not None:
+        api_quota.acquire("zai")
+    try:
+        return ur.urlopen(req, data, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        if api_quota is not None and e.code == 429:
+            api_quota.penalize("zai", api_quota.retry_after_seconds(e.headers))
+        raise
+
+
 class AutoGLMAgent:
     """AutoGLM 视觉Agent"""
 
     def __init__(self, api_key: str):
         self.api_key = api_key
         self.history = []
+        self.quota_error = None  # ZAI 额度不足时记录原因，调用方据此停止
 
     def analyze_screen(self, screenshot_path: str, instruction: str) -> dict:
         """分析屏幕并获取操作指令"""
@@ -162,13 +187,17 @@ class AutoGLMAgent:
         req.add_header("Content-Type", "application/json")
 
         try:
-            with ur.urlopen(req, payload.encode(), timeout=30) as resp:
+            with _zai_urlopen(req, payload.encode(), timeout=30) as resp:
                 result = json.loads(resp.read())
                 assistant_msg = result["choices"][0]["message"]
                 # 保留历史
                 self.history.append({"role": "user", "content": instruction})
                 self.history.append(assistant_msg)
                 return result
+        except QUOTA_ERRORS as e:
+            self.quota_error = str(e)
+            print(f"❌ AutoGLM API 额度不足: {e}", file=sys.stderr)
+            return {"error": f"quota: {e}"}
         except Exception as e:
             print(f"❌ AutoGLM API 错误: {e}", file=sys.stderr)
             return {"error": str(e)}
@@ -198,9 +227,13 @@ class AutoGLMAgent:
         req.add_header("Content-Type", "application/json")
 
         try:
-            with ur.urlopen(req, payload.encode(), timeout=30) as resp:
+            with _zai_urlopen(req, payload.encode(), timeout=30) as resp:
                 result = json.loads(resp.read())
                 return result["choices"][0]["message"]["content"]
+        except QUOTA_ERRORS as e:
+            self.quota_error = str(e)
+            print(f"❌ 数据提取额度不足: {e}", file=sys.stderr)
+            return ""
         except Exception as e:
             print(f"❌ 数据提取错误: {e}", file=sys.stderr)
             return ""
@@ -268,6 +301,9 @@ def search_dianping(adb: ADBController, agent: AutoGLMAgent, keyword: str,
 只返回 JSON，不要其他文字。"""
 
         data_text = agent.extract_data(screenshot, extract_prompt)
+        if agent.quota_error:
+            print(f"   ⚠️ ZAI 额度不足，停止翻页: {agent.quota_error}", file=sys.stderr)
+            break
         print(f"   提取原文: {data_text[:200]}", file=sys.stderr)
 
         # 解析 JSON
@@ -34,9 +34,40 @@ if "PLAYWRIGHT_BROWSERS_PATH" not in os.environ:
 COOKIE_DIR = os.path.join(OPENCLAW_ROOT, ".openclaw", "cookies")
 os.makedirs(COOKIE_DIR, exist_ok=True)
 
+# 分级抓取：记录每个域名该走 HTTP 还是浏览器
+FETCH_TIER_PATH = os.path.join(OPENCLAW_ROOT, ".openclaw", "fetch_tiers.json")
+FETCH_TIER_TTL = 7 * 24 * 3600   # 域名分级结论的有效期（过期后重新探测）
+HTTP_MIN_CONTENT = 200           # HTTP 正文少于此字符数视为 JS 渲染页
+APP_SHELL_MARKERS = [
+    "enable javascript", "enable js", "javascript is disabled", "javascript is required",
+    "请开启 javascript", "请启用 javascript", "需要启用 javascript", "浏览器不支持 javascript",
+    "you need to enable", "loading...", "加载中...",
+]
+
+# 平台登录状态缓存：已知未登录时直接走搜索引擎兜底
+LOGIN_STATE_PATH = os.path.join(OPENCLAW_ROOT, ".openclaw", "login_state.json")
+LOGIN_STATE_TTL = 30 * 60          # 登录状态记录的有效期
+LOGIN_RECHECK_INTERVAL = 5 * 60    # 已知未登录时，每隔多久在后台重新探测一次
+
+# 渲染结果缓存：同一页面在 TTL 内重复抓取直接返回，不启动 Chromium
+FETCH_CACHE_DIR = os.path.join(OPENCLAW_ROOT, ".openclaw", "fetch_cache")
+FETCH_CACHE_MAX_BYTES = int(os.environ.get("BROWSER_FETCH_CACHE_MB", "64")) * 1024 * 1024
+FETCH_CACHE_TTL = {        # 各平台缓存有效期（秒），None 为通用网页
+    "dianping": 6 * 3600,
+    "xiaohongshu": 3600,
+    "xhs": 3600,
+    "zhihu": 3600,
+    "weibo": 600,
+    "bilibili": 3600,
+    None: 1800,
+}
+
 # Chrome Debug 端口
 CDP_PORT = int(os.environ.get("CDP_PORT", "9222"))
 
+# 页面等待时间倍率（离线基准测试设为 0 以只测量提取本身）
+SETTLE_SCALE = float(os.environ.get("BROWSER_FETCH_SETTLE", "1"))
+
 # Playwright 延迟导入
 sync_playwright = None
 
@@ -47,6 +78,12 @@ def _ensure_playwright():
         sync_playwright = sp
 
 
+def _settle(seconds):
+    """等待页面渲染/懒加载，时长按 SETTLE_SCALE 缩放"""
+    if SETTLE_SCALE > 0:
+        time.sleep(seconds * SETTLE_SCALE)
+
+
 def _check_cdp_port(port=None):
     """检查 Chrome Debug 端口是否可用"""
     port = port or CDP_PORT
@@ -238,7 +275,7 @@ def login_platform(platform):
 def extract_dianping_search(page):
     """大众点评搜索结果提取"""
     results = []
-    time.sleep(2)
+    _settle(2)
     
     # 检查是否需要验证
     title = page.title()
@@ -282,7 +319,7 @@ def extract_dianping_search(page):
 
 def extract_dianping_shop(page):
     """大众点评店铺详情提取"""
-    time.sleep(2)
+    _settle(2)
     info = {}
     
     # 店名
@@ -323,7 +360,7 @@ def extract_dianping_shop(page):
 def extract_xiaohongshu_search(page):
     """小红书搜索结果提取"""
     results = []
-    time.sleep(3)
+    _settle(3)
     
     title = page.title()
     if "登录" in title or "验证" in title:
@@ -369,7 +406,7 @@ def extract_xiaohongshu_search(page):
 
 def extract_xiaohongshu_note(page):
     """小红书笔记详情提取"""
-    time.sleep(3)
+    _settle(3)
     info = {}
     
     title_el = page.query_selector('[class*="title"], h1')
@@ -399,7 +436,7 @@ def extract_xiaohongshu_note(page):
 
 def extract_generic(page):
     """通用网页提取"""
-    time.sleep(2)
+    _settle(2)
     
     # 提取主要文本内容
     for sel in ['article', 'main', '.content', '#content', '.article', '.post']:
@@ -425,7 +462,68 @@ def detect_platform(url):
 
 # ========== 搜索 ==========
 
-def search_platform(query, platform, num=5, context=None, city=None):
+def _login_state_key(platform, session_mode):
+    # xiaohongshu / xhs 共享同一个域名的登录态
+    return f"{PLATFORMS[platform]['domain']}@{session_mode}"
+
+
+def get_login_state(platform, session_mode="cookie"):
+    """返回平台最近一次登录检测记录，过期或 Cookie 已更新时返回 None"""
+    record = _load_json_state(LOGIN_STATE_PATH).get(_login_state_key(platform, session_mode))
+    if not record or time.time() - record.get("checked", 0) > LOGIN_STATE_TTL:
+        return None
+    # 重新 --login 保存过 Cookie，旧的“未登录”结论作废
+    cookie_path = get_cookie_path(platform)
+    if session_mode == "cookie" and os.path.exists(cookie_path) and os.path.getmtime(cookie_path) > record["checked"]:
+        return None
+    return record
+
+
+def record_login_state(platform, state, session_mode="cookie"):
+    """记录登录检测结果：'ok' / 'logged_out'"""
+    data = _load_json_state(LOGIN_STATE_PATH)
+    data[_login_state_key(platform, session_mode)] = {"state": state, "checked": time.time()}
+    _save_json_state(LOGIN_STATE_PATH, data)
+
+
+def is_login_wall(url, text, title=""):
+    """根据跳转地址和页面文字判断是否被登录墙拦截"""
+    return ("login" in url or "pclogin" in url or "passport" in url
+            or "登录后查看" in text or "请登录" in text[:100]
+            or "扫码" in text[:200] and "搜索" not in title)
+
+
+def probe_login_http(platform, url):
+    """用已保存的 Cookie 发一次纯 HTTP 请求探测登录态（不占用浏览器，可在后台线程运行）"""
+    import urllib.request as ur
+    cookie_header = ""
+    cookie_path = get_cookie_path(platform)
+    if os.path.exists(cookie_path):
+        try:
+            with open(cookie_path) as f:
+                cookie_header = "; ".join(f"{c['name']}={c['value']}" for c in json.load(f))
+        except (OSError, ValueError, KeyError):
+            pass
+    req = ur.Request(url, headers={
+        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36",
+        "Accept-Language": "zh-CN,zh;q=0.9",
+        "Cookie": cookie_header,
+    })
+    try:
+        with ur.urlopen(req, timeout=10) as resp:
+            final_url = resp.geturl()
+            text = re.sub(r"<[^>]+>", " ", resp.read(200000).decode("utf-8", errors="ignore"))
+            text = re.sub(r"\s+", " ", text)
+    except Exception as e:
+        print(f"   ⚠️ 登录态探测失败: {e}", file=sys.stderr)
+        return None
+    state = "logged_out" if is_login_wall(final_url, text) else "ok"
+    record_login_state(platform, state)
+    print(f"   🔁 后台登录态探测 ({PLATFORMS[platform]['name']}): {state}", file=sys.stderr)
+    return state
+
+
+def search_platform(query, platform, num=5, context=None, city=None, session_mode="cookie"):
     """在指定平台内搜索，登录失败自动切换到搜索引擎方案"""
     config = PLATFORMS.get(platform)
     if not config:
@@ -446,26 +544,45 @@ def search_platform(query, platform, num=5, context=None, city=None):
     print(f"🔍 在 {config['name']} 搜索: {query}", file=sys.stderr)
     print(f"   URL: {search_url}", file=sys.stderr)
     
+    # 已知未登录：跳过 20 秒的页面加载，直接走搜索引擎；到期时在后台重新探测
+    login_state = get_login_state(platform, session_mode)
+    if login_state and login_state["state"] == "logged_out":
+        age = time.time() - login_state["checked"]
+        recheck = None
+        if age > LOGIN_RECHECK_INTERVAL:
+            if session_mode == "cookie":
+                import threading
+                recheck = threading.Thread(target=probe_login_http, args=(platform, search_url), daemon=True)
+                recheck.start()
+            else:
+                # CDP 模式的登录态在浏览器里，HTTP 探测看不到，只能直接用浏览器重试一次
+                login_state = None
+        if login_state:
+            print(f"⏭️ {config['name']} 已知未登录（{int(age)}s 前检测），直接使用搜索引擎", file=sys.stderr)
+            results = search_via_engine(query, config["domain"], num, context, city)
+            if recheck:
+                recheck.join(timeout=5)
+            return results[:num]
+    
     page = context.new_page()
     results = []
     need_fallback = False
     
     try:
         page.goto(search_url, wait_until="domcontentloaded", timeout=20000)
-        time.sleep(3)
+        _settle(3)
         
         # 检测登录重定向
         current_url = page.url
         page_text = page.inner_text("body")[:500]
-        if ("login" in current_url or "pclogin" in current_url 
-            or "登录后查看" in page_text or "请登录" in page_text[:100]
-            or "扫码" in page_text[:200] and "搜索" not in page.title()):
+        if is_login_wall(current_url, page_text, page.title()):
             print(f"⚠️ 需要登录，自动切换到搜索引擎方案", file=sys.stderr)
+            record_login_state(platform, "logged_out", session_mode)
             need_fallback = True
         else:
             # 滚动页面加载更多内容
             page.evaluate("window.scrollTo(0, document.body.scrollHeight / 2)")
-            time.sleep(1)
+            _settle(1)
             
             if platform in ("dianping",):
                 results = extract_dianping_search(page)
@@ -481,6 +598,9 @@ def search_platform(query, platform, num=5, context=None, city=None):
     finally:
         page.close()
     
+    if results:
+        record_login_state(platform, "ok", session_mode)
+    
     # 无结果或需要登录时，回退到搜索引擎
     if need_fallback or not results:
         print(f"🔄 使用搜索引擎间接搜索 (site:{config['domain']})", file=sys.stderr)
@@ -496,9 +616,14 @@ def search_via_engine(query, site_domain, num=5, context=None, city=None):
     if city:
         search_query += f" {city}"
     
+    # 优先：HTTP 搜索引擎并发竞速（无需开新页面）
+    results = search_via_http_engines(search_query, site_domain, num)
+    if results or context is None:
+        return results[:num]
+    
     encoded_q = urllib.parse.quote(search_query)
     
-    # 优先 DuckDuckGo（无 CAPTCHA），然后 Google
+    # 最后手段：浏览器打开 DuckDuckGo（无 CAPTCHA），然后 Google
     engines = [
         ("DuckDuckGo", f"https://duckduckgo.com/?q={encoded_q}"),
         ("Google", f"https://www.google.com/search?q={encoded_q}"),
@@ -510,11 +635,11 @@ def search_via_engine(query, site_domain, num=5, context=None, city=None):
         page = context.new_page()
         try:
             page.goto(engine_url, wait_until="domcontentloaded", timeout=15000)
-            time.sleep(3)
+            _settle(3)
             
             # 滚动加载更多
             page.evaluate("window.scrollTo(0, document.body.scrollHeight / 2)")
-            time.sleep(1)
+            _settle(1)
             
             results = _extract_search_engine_results(page, engine_name, site_domain)
             
@@ -531,6 +656,68 @@ def search_via_engine(query, site_domain, num=5, context=None, city=None):
     return []
 
 
+def search_via_http_engines(search_query, site_domain, num=5, timeout=20):
+    """用 web_search.py 的 HTTP 引擎并发执行 site: 查询，取最先返回有效结果的引擎；
+    免费引擎都没有结果时才调用 Brave（付费 API，按月限额）"""
+    if SCRIPT_DIR not in sys.path:
+        sys.path.insert(0, SCRIPT_DIR)
+    import web_search
+    
+    deadline = time.time() + timeout
+    engines = {
+        "DuckDuckGo": lambda: web_search.ddg_search(search_query, num * 2),
+        "Google": lambda: web_search.google_search(search_query, num * 2),
+    }
+    print(f"   ⚡ HTTP 引擎竞速 ({'/'.join(engines)}): {search_query}", file=sys.stderr)
+    results = _race_http_engines(engines, site_domain, deadline, timeout)
+    
+    brave_key = os.environ.get("BRAVE_API_KEY", "")
+    if not results and brave_key and time.time() < deadline:
+        print(f"   💰 免费引擎无结果，改用 Brave API: {search_query}", file=sys.stderr)
+        engines = {"Brave": lambda: web_search.brave_search(search_query, brave_key, num * 2)}
+        results = _race_http_engines(engines, site_domain, deadline, timeout)
+    
+    return results[:num]
+
+
+def _race_http_engines(engines, site_domain, deadline, timeout):
+    """并发运行 engines，返回最先给出 site_domain 结果的引擎的结果（都没有则返回 []）"""
+    import queue
+    import threading
+    
+    done = queue.Queue()
+    
+    def run(name, fn):
+        try:
+            done.put((name, fn(), None))
+        except Exception as e:
+            done.put((name, [], e))
+    
+    # daemon 线程：拿到结果后不等待落后的引擎，进程退出时也不会被它们拖住
+    for name, fn in engines.items():
+        threading.Thread(target=run, args=(name, fn), daemon=True).start()
+    
+    for _ in engines:
+        try:
+            name, items, error = done.get(timeout=max(0, deadline - time.time()))
+        except queue.Empty:
+            print(f"   ⚠️ HTTP 引擎 {timeout}s 内均未返回结果", file=sys.stderr)
+            break
+        if error:
+            print(f"   ⚠️ {name} 失败: {error}", file=sys.stderr)
+            continue
+        results = [{
+            "title": item.get("title", ""),
+            "url": item.get("url", ""),
+            "snippet": item.get("snippet", ""),
+            "source": "search_engine",
+        } for item in items if item.get("title") and site_domain in item.get("url", "")]
+        if results:
+            print(f"   ✅ {name} 最先返回 {len(results)} 条结果", file=sys.stderr)
+            return results
+    return []
+
+
 def _extract_search_engine_results(page, engine, site_domain):
     """从搜索引擎结果页提取数据"""
     results = []
@@ -617,8 +804,8 @@ def _extract_search_engine_results(page, engine, site_domain):
 
 # ========== 抓取 URL ==========
 
-def fetch_url(url, context):
-    """用浏览器抓取指定 URL"""
+def fetch_url(url, context, capture_dom=False):
+    """用浏览器抓取指定 URL（capture_dom=True 时附带序列化 DOM，供缓存保存）"""
     platform = detect_platform(url)
     print(f"📖 抓取: {url}", file=sys.stderr)
     
@@ -627,7 +814,7 @@ def fetch_url(url, context):
     
     try:
         page.goto(url, wait_until="domcontentloaded", timeout=20000)
-        time.sleep(2)
+        _settle(2)
         
         result["url"] = url
         result["title"] = page.title()
@@ -638,6 +825,9 @@ def fetch_url(url, context):
             result["data"] = extract_xiaohongshu_note(page)
         else:
             result["data"] = extract_generic(page)
+        
+        if capture_dom:
+            result["dom"] = page.content()
             
     except Exception as e:
         result["error"] = str(e)
@@ -648,6 +838,171 @@ def fetch_url(url, context):
     return result
 
 
+# ========== 抓取结果缓存 ==========
+
+def _cache_path(url, mobile=False):
+    import hashlib
+    key = hashlib.sha256(f"{'mobile' if mobile else 'desktop'}|{url}".encode("utf-8")).hexdigest()
+    return os.path.join(FETCH_CACHE_DIR, f"{key}.json")
+
+
+def cache_get(url, mobile=False, tier="auto"):
+    """读取未过期的缓存结果，命中时刷新 mtime（用于 LRU 淘汰）
+
+    tier="browser" 时不返回 HTTP 层抓到的结果，保证强制浏览器时拿到的是渲染后的页面
+    """
+    path = _cache_path(url, mobile)
+    entry = _load_json_state(path)
+    if not entry or entry.get("url") != url:
+        return None
+    if tier == "browser" and entry["result"].get("tier") == "http":
+        return None
+    ttl = FETCH_CACHE_TTL.get(detect_platform(url), FETCH_CACHE_TTL[None])
+    age = time.time() - entry.get("stored", 0)
+    if age > ttl:
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    print(f"💾 缓存命中（{int(age)}s 前抓取，TTL {ttl}s）", file=sys.stderr)
+    result = dict(entry["result"])
+    result["cached"] = True
+    return result
+
+
+def cache_put(url, result, mobile=False):
+    """保存抓取结果（出错的结果不缓存），超出容量时按最近使用时间淘汰"""
+    if not result or "error" in result:
+        return
+    result = dict(result)
+    entry = {
+        "url": url,
+        "mobile": mobile,
+        "stored": time.time(),
+        "dom": result.pop("dom", None),
+        "result": result,
+    }
+    _save_json_state(_cache_path(url, mobile), entry)
+    _evict_cache()
+
+
+def _evict_cache():
+    try:
+        files = [os.path.join(FETCH_CACHE_DIR, name) for name in os.listdir(FETCH_CACHE_DIR)
+                 if name.endswith(".json")]
+        stats = sorted(((os.path.getmtime(f), os.path.getsize(f), f) for f in files), reverse=True)
+    except OSError:
+        return
+    total = 0
+    for _, size, path in stats:
+        total += size
+        if total > FETCH_CACHE_MAX_BYTES:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+# ========== 分级抓取（HTTP 优先，必要时才启动浏览器）==========
+
+def _load_json_state(path):
+    """读取 JSON 状态文件，损坏或不存在时返回空字典"""
+    try:
+        with open(path) as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_json_state(path, data):
+    """原子写入 JSON 状态文件（多个进程同时写时不会读到半截文件）"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+    except OSError:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _url_domain(url):
+    host = urllib.parse.urlparse(url).hostname or ""
+    return host[4:] if host.startswith("www.") else host
+
+
+def get_domain_tier(url):
+    """返回该域名记住的抓取层级：'http' / 'browser'，未知或过期返回 None"""
+    record = _load_json_state(FETCH_TIER_PATH).get(_url_domain(url))
+    if not record or time.time() - record.get("updated", 0) > FETCH_TIER_TTL:
+        return None
+    return record.get("tier")
+
+
+def remember_domain_tier(url, tier, reason=""):
+    domain = _url_domain(url)
+    if not domain:
+        return
+    state = _load_json_state(FETCH_TIER_PATH)
+    state[domain] = {"tier": tier, "reason": reason, "updated": time.time()}
+    _save_json_state(FETCH_TIER_PATH, state)
+
+
+def looks_js_gated(page):
+    """判断 HTTP 抓取到的正文是否像需要 JS 渲染的页面，返回原因（空字符串表示正常）"""
+    content = page.get("content", "").strip()
+    if not content:
+        return "正文为空"
+    lowered = content[:1000].lower()
+    for marker in APP_SHELL_MARKERS:
+        if marker in lowered and len(content) < HTTP_MIN_CONTENT * 5:
+            return f"App Shell 标记: {marker}"
+    if len(content) < HTTP_MIN_CONTENT:
+        return f"正文过短 ({len(content)} 字符)"
+    return ""
+
+
+def fetch_url_http(url):
+    """第一层：纯 HTTP 抓取（web_search.fetch_page），看起来被 JS 挡住时返回 None"""
+    if SCRIPT_DIR not in sys.path:
+        sys.path.insert(0, SCRIPT_DIR)
+    from web_search import fetch_page
+
+    page = fetch_page(url)
+    if "error" in page:
+        # 超时、网络错误、非文本响应多是偶发的，只让这一次升级到浏览器，不记入域名层级
+        print(f"⬆️ HTTP 抓取失败（{page['error']}），本次改用浏览器", file=sys.stderr)
+        return None
+
+    reason = looks_js_gated(page)
+    if reason:
+        print(f"⬆️ HTTP 抓取不可用（{reason}），升级到浏览器", file=sys.stderr)
+        remember_domain_tier(url, "browser", reason)
+        return None
+
+    remember_domain_tier(url, "http")
+    print(f"⚡ HTTP 直接抓取成功 ({page['length']} 字符)，跳过浏览器", file=sys.stderr)
+    return {
+        "url": url,
+        "title": page.get("title", ""),
+        "data": {"content": page["content"][:5000], "url": url},
+        "tier": "http",
+    }
+
+
+def try_http_tier(url, tier="auto"):
+    """分级抓取入口：平台页面一律走浏览器；通用页面按域名记录决定是否先试 HTTP"""
+    if tier == "browser" or detect_platform(url):
+        return None
+    if tier == "auto" and get_domain_tier(url) == "browser":
+        print(f"🧭 {_url_domain(url)} 已知需要 JS 渲染，直接使用浏览器", file=sys.stderr)
+        return None
+    return fetch_url_http(url)
+
+
 # ========== 输出格式化 ==========
 
 def print_results(data, as_json=False):
@@ -738,6 +1093,10 @@ def main():
     parser.add_argument("--num", "-n", type=int, default=5, help="结果数量 (默认 5)")
     parser.add_argument("--json", action="store_true", help="JSON 输出")
     parser.add_argument("--mobile", action="store_true", help="模拟手机访问")
+    parser.add_argument("--no-cache", action="store_true", help="跳过抓取结果缓存，强制重新抓取")
+    parser.add_argument("--cache-dom", action="store_true", help="同时缓存页面序列化 DOM")
+    parser.add_argument("--tier", choices=["auto", "http", "browser"], default="auto",
+                        help="抓取层级: auto=HTTP 优先按需升级浏览器 (默认) / http=总是先试 HTTP / browser=直接用浏览器")
     parser.add_argument("--login", metavar="PLATFORM", choices=list(PLATFORMS.keys()),
                         help="登录平台保存 Cookie（首次使用）")
     
@@ -752,6 +1111,21 @@ def main():
         parser.print_help()
         return
     
+    if args.url and not args.search:
+        # 缓存命中直接返回，毫秒级
+        if not args.no_cache:
+            result = cache_get(args.url, args.mobile, args.tier)
+            if result:
+                print_results(result, args.json)
+                return
+        
+        # 通用网页先尝试纯 HTTP 抓取，成功则无需启动浏览器
+        result = try_http_tier(args.url, args.tier)
+        if result:
+            cache_put(args.url, result, args.mobile)
+            print_results(result, args.json)
+            return
+    
     _ensure_playwright()
     
     # 自动检测 CDP 模式
@@ -774,7 +1148,8 @@ def main():
         try:
             if args.search and args.site:
                 # 模式1: 平台站内搜索
-                results = search_platform(args.search, args.site, args.num, ctx, args.city)
+                results = search_platform(args.search, args.site, args.num, ctx, args.city,
+                                          session_mode="cdp" if cdp_available else "cookie")
                 print_results(results, args.json)
                 
             elif args.search:
@@ -784,7 +1159,9 @@ def main():
                 
             elif args.url:
                 # 模式2: 直接抓取 URL
-                result = fetch_url(args.url, ctx)
+                result = fetch_url(args.url, ctx, capture_dom=args.cache_dom)
+                cache_put(args.url, result, args.mobile)
+                result.pop("dom", None)
                 print_results(result, args.json)
                 
         finally:
@@ -21,6 +21,14 @@ import urllib.parse
 import re
 import random
 
+# ========== 共享 API 配额（可选，skills/api-quota）==========
+# 多个进程共用同一个 BRAVE_API_KEY：调用前先向共享账本申请额度，避免 429 / 月度额度被瞬间耗尽
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "api-quota", "scripts"))
+try:
+    import api_quota
+except ImportError:
+    api_quota = None
+
 
 # ========== SSL 上下文（解决 macOS 自签名证书问题）==========
 def _ssl_ctx():
@@ -166,6 +174,13 @@ def brave_search(query, api_key, num_results=5):
         "X-Subscription-Token": api_key
     })
 
+    if api_quota is not None:
+        try:
+            api_quota.acquire("brave", timeout=30)
+        except api_quota.QuotaExceeded as e:
+            print(f"⚠️ Brave 额度不足，跳过: {e}", file=sys.stderr)
+            return []
+
     try:
         with urllib.request.urlopen(req, timeout=15, context=_ssl_ctx()) as resp:
             raw = resp.read()
@@ -174,6 +189,9 @@ def brave_search(query, api_key, num_results=5):
                 raw = gzip.decompress(raw)
             data = json.loads(raw.decode("utf-8"))
     except Exception as e:
+        if api_quota is not None and getattr(e, "code", None) == 429:
+            # 限流：按 Retry-After 让所有进程一起等待
+            api_quota.penalize("brave", api_quota.retry_after_seconds(e.headers))
         print(f"⚠️ Brave 搜索失败: {e}", file=sys.stderr)
         return []
 
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+browser_fetch.py 提取器离线基准测试
+
+用本地快照服务器（fixture_server.py）代替真实站点，headless Chromium 逐个运行提取器，
+报告每个页面的加载耗时、提取耗时、与浏览器进程的 IPC 往返次数，以及提取结果是否正确。
+
+用法:
+  python3 bench_extractors.py                  # 每个页面跑 5 轮
+  python3 bench_extractors.py --repeat 20 --json
+  python3 bench_extractors.py --settle 1       # 保留提取器中的真实等待时间
+
+IPC 往返次数 = 提取过程中对 Page / ElementHandle 方法的调用次数（每次调用都是一次
+Python ↔ 浏览器驱动的同步往返），是优化选择器批量化的主要指标。
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.join(os.path.dirname(TEST_DIR), "scripts")
+sys.path.insert(0, SCRIPTS_DIR)
+sys.path.insert(0, TEST_DIR)
+
+
+# ========== IPC 计数代理 ==========
+
+class CallCounter:
+    def __init__(self):
+        self.calls = 0
+
+
+class CountingProxy:
+    """包装 Page / ElementHandle：每次方法调用计一次 IPC 往返，返回的元素继续被包装"""
+
+    def __init__(self, target, counter):
+        self._target = target
+        self._counter = counter
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            self._counter.calls += 1
+            return self._wrap(attr(*args, **kwargs))
+        return call
+
+    def _wrap(self, value):
+        if isinstance(value, list):
+            return [self._wrap(v) for v in value]
+        if type(value).__name__ == "ElementHandle":
+            return CountingProxy(value, self._counter)
+        return value
+
+
+# ========== 用例 ==========
+
+def _names(results, key):
+    return [r.get(key, "") for r in results]
+
+
+def build_cases(bf):
+    """(名称, 路由, 提取函数, 正确性检查)"""
+    return [
+        ("dianping/search", "/dianping/search", bf.extract_dianping_search,
+         lambda r: _names(r, "name") == ["老吉士酒家", "M on the Bund 米氏西餐厅", "小杨生煎(四川中路店)"]
+         and r[0]["rating"] == "4.7" and r[0]["category"] == "本帮江浙菜"
+         and r[0]["url"] == "https://www.dianping.com/shop/H1aB2cD3"),
+        ("dianping/shop", "/dianping/shop", bf.extract_dianping_shop,
+         lambda r: r["name"] == "老吉士酒家" and r["address"] == "徐汇区天平路41号"
+         and r["recommended_dishes"] == ["红烧肉", "油爆虾", "蟹粉豆腐"] and len(r["comments"]) == 2),
+        ("xiaohongshu/search", "/xiaohongshu/search", bf.extract_xiaohongshu_search,
+         lambda r: len(r) == 3 and r[0]["title"] == "上海本帮菜天花板｜这几家闭眼冲"
+         and r[0]["author"] == "吃货阿May" and r[0]["likes"] == "2.3万"
+         and r[0]["url"].endswith("/explore/65a1b2c3d4e5f6a7b8c9d0e1")),
+        ("xiaohongshu/note", "/xiaohongshu/note", bf.extract_xiaohongshu_note,
+         lambda r: r["title"] == "上海本帮菜天花板｜这几家闭眼冲" and r["author"] == "吃货阿May"
+         and r["content"].startswith("整理了最近吃过的本帮菜") and len(r["comments"]) == 3),
+        ("xhs/search", "/xhs/search", bf.extract_xiaohongshu_search,
+         lambda r: len(r) == 3),
+        ("zhihu/search", "/zhihu/search", bf.extract_generic,
+         lambda r: "独立咖啡馆" in r["content"]),
+        ("weibo/search", "/weibo/search", bf.extract_generic,
+         lambda r: "外滩灯光秀" in r["content"]),
+        ("bilibili/search", "/bilibili/search", bf.extract_generic,
+         lambda r: "上海48小时vlog" in r["content"]),
+        ("generic/article", "/generic/article", bf.extract_generic,
+         lambda r: r["content"].startswith("浏览器抓取基准测试文章") and "版权所有" not in r["content"]),
+        ("engine/duckduckgo", "/engines/duckduckgo",
+         lambda page: bf._extract_search_engine_results(page, "DuckDuckGo", "zhihu.com"),
+         lambda r: len(r) == 2 and all(x["source"] == "search_engine" and x["snippet"] for x in r)),
+        ("engine/google", "/engines/google",
+         lambda page: bf._extract_search_engine_results(page, "Google", "zhihu.com"),
+         lambda r: len(r) == 2 and r[1]["url"] == "https://zhuanlan.zhihu.com/p/16180339"),
+    ]
+
+
+# ========== 基准测试 ==========
+
+def _check(check, result):
+    try:
+        return bool(check(result))
+    except (KeyError, IndexError, TypeError):
+        return False
+
+
+def bench_browser(bf, base_url, repeat):
+    rows = []
+    with bf.sync_playwright() as p:
+        browser, ctx = bf.create_browser_context(p, headless=True)
+        try:
+            for name, route, extractor, check in build_cases(bf):
+                nav_ms, extract_ms, ipc, correct = [], [], 0, True
+                for _ in range(repeat):
+                    page = ctx.new_page()
+                    try:
+                        t0 = time.perf_counter()
+                        page.goto(base_url + route, wait_until="domcontentloaded")
+                        t1 = time.perf_counter()
+                        counter = CallCounter()
+                        result = extractor(CountingProxy(page, counter))
+                        t2 = time.perf_counter()
+                    finally:
+                        page.close()
+                    nav_ms.append((t1 - t0) * 1000)
+                    extract_ms.append((t2 - t1) * 1000)
+                    ipc = counter.calls
+                    correct = correct and _check(check, result)
+                rows.append(_row(name, "browser", nav_ms, extract_ms, ipc, correct))
+        finally:
+            ctx.close()
+            browser.close()
+    return rows
+
+
+def bench_http(base_url, repeat):
+    """对照组：分级抓取的 HTTP 层（web_search.fetch_page）提取通用文章"""
+    from web_search import fetch_page
+    fetch_ms, correct = [], True
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        page = fetch_page(base_url + "/generic/article")
+        fetch_ms.append((time.perf_counter() - t0) * 1000)
+        correct = correct and "error" not in page and "性能优化需要可重复的测量" in page.get("content", "")
+    return [_row("generic/article", "http", fetch_ms, [0.0] * repeat, 0, correct)]
+
+
+def _row(name, tier, nav_ms, extract_ms, ipc, correct):
+    total = [a + b for a, b in zip(nav_ms, extract_ms)]
+    return {
+        "case": name,
+        "tier": tier,
+        "nav_ms_p50": round(statistics.median(nav_ms), 2),
+        "extract_ms_p50": round(statistics.median(extract_ms), 2),
+        "total_ms_p50": round(statistics.median(total), 2),
+        "total_ms_max": round(max(total), 2),
+        "ipc_round_trips": ipc,
+        "correct": correct,
+    }
+
+
+def print_table(rows):
+    print(f"{'页面':<22}{'层级':<9}{'加载p50':>10}{'提取p50':>10}{'总计p50':>10}{'总计max':>10}{'IPC':>7}  正确")
+    for r in rows:
+        print(f"{r['case']:<22}{r['tier']:<9}{r['nav_ms_p50']:>10.1f}{r['extract_ms_p50']:>10.1f}"
+              f"{r['total_ms_p50']:>10.1f}{r['total_ms_max']:>10.1f}{r['ipc_round_trips']:>7}  "
+              f"{'✅' if r['correct'] else '❌'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="browser_fetch 提取器离线基准测试")
+    parser.add_argument("--repeat", "-r", type=int, default=5, help="每个页面运行轮数 (默认 5)")
+    parser.add_argument("--settle", type=float, default=0.0,
+                        help="提取器等待时间倍率 (默认 0，只测提取本身；1 = 线上真实等待)")
+    parser.add_argument("--json", action="store_true", help="JSON 输出")
+    args = parser.parse_args()
+
+    os.environ["BROWSER_FETCH_SETTLE"] = str(args.settle)
+    import browser_fetch as bf
+    from fixture_server import start_fixture_server
+
+    bf._ensure_playwright()
+    server, base_url = start_fixture_server()
+    print(f"📦 快照服务器: {base_url}", file=sys.stderr)
+    try:
+        rows = bench_browser(bf, base_url, args.repeat) + bench_http(base_url, args.repeat)
+    finally:
+        server.shutdown()
+
+    if args.json:
+        print(json.dumps({"repeat": args.repeat, "settle": args.settle, "results": rows},
+                         ensure_ascii=False, indent=2))
+    else:
+        print_table(rows)
+
+    sys.exit(0 if all(r["correct"] for r in rows) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+离线页面快照服务器 — 为 browser_fetch.py 的提取器提供本地测试页面
+
+每个 PLATFORMS 平台和搜索引擎结果页都对应 fixtures/ 下的一份 HTML 快照，
+无需联网即可测试、测量提取器。
+
+用法:
+  python3 fixture_server.py                 # 随机端口
+  python3 fixture_server.py --port 8765     # 指定端口
+
+  在代码中:
+    server, base_url = start_fixture_server()
+    ...  # 访问 f"{base_url}/dianping/search"
+    server.shutdown()
+"""
+
+import argparse
+import os
+import sys
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# 路由 → 快照文件（xhs 是 xiaohongshu 的别名，共用同一份快照）
+ROUTES = {
+    "/dianping/search": "dianping_search.html",
+    "/dianping/shop": "dianping_shop.html",
+    "/xiaohongshu/search": "xiaohongshu_search.html",
+    "/xiaohongshu/note": "xiaohongshu_note.html",
+    "/xhs/search": "xiaohongshu_search.html",
+    "/xhs/note": "xiaohongshu_note.html",
+    "/zhihu/search": "zhihu_search.html",
+    "/weibo/search": "weibo_search.html",
+    "/bilibili/search": "bilibili_search.html",
+    "/generic/article": "generic_article.html",
+    "/engines/duckduckgo": "duckduckgo_results.html",
+    "/engines/google": "google_results.html",
+}
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    cache = {}
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0].rstrip("/")
+        name = ROUTES.get(path)
+        if not name:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body = self.cache.get(name)
+        if body is None:
+            with open(os.path.join(FIXTURE_DIR, name), "rb") as f:
+                body = self.cache[name] = f.read()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fixture_server(host="127.0.0.1", port=0):
+    """在后台线程启动快照服务器，返回 (server, base_url)"""
+    server = ThreadingHTTPServer((host, port), FixtureHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="browser_fetch 离线页面快照服务器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0, help="监听端口 (默认随机)")
+    args = parser.parse_args()
+
+    server, base_url = start_fixture_server(args.host, args.port)
+    print(f"📦 快照服务器: {base_url}", file=sys.stderr)
+    for route, name in ROUTES.items():
+        print(f"   {base_url}{route}  →  {name}", file=sys.stderr)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()